@@ -0,0 +1,73 @@
+"""Compares fixed concurrency with AdaptiveConcurrency when fetching many Drive files from a local stub server that
+enforces a quota of requests per second.
+
+Run with `python -m benchmarks.bench_adaptive_concurrency`. No network access is needed.
+"""
+import argparse
+import threading
+import time
+import warnings
+from datetime import timedelta
+
+from google.oauth2.credentials import Credentials
+
+from pysuite.auth import Authentication, _utcnow
+from pysuite.concurrency import AdaptiveConcurrency
+from pysuite.drive import Drive
+from tests.stub_server import StubGoogleApi
+
+FIXED_LIMITS = [2, 8, 32, 64]
+
+
+def _run(stub: StubGoogleApi, concurrency: AdaptiveConcurrency, requests: int, interval: float = 0.5) -> dict:
+    credential = Credentials(token="benchmark_token", expiry=_utcnow() + timedelta(hours=1))
+    drive = Drive(Authentication(credential=credential, connections_per_host=64), api_endpoint=stub.drive_endpoint)
+    ids = [f"id_{i % 100}" for i in range(requests)]
+    limits = []
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(interval):
+            limits.append(concurrency.limit)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    throttled = stub.throttled_count
+    start = time.perf_counter()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        concurrency.map(drive.get_name, ids)
+    elapsed = time.perf_counter() - start
+    done.set()
+    sampler.join()
+    return {"elapsed": elapsed, "throttled": stub.throttled_count - throttled, "limits": limits,
+            "throughput": requests / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=1000, help="number of requests in each run.")
+    parser.add_argument("--quota", type=int, default=200, help="requests per second allowed by the stub server.")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds each request takes in the stub server.")
+    args = parser.parse_args()
+
+    print(f"quota: {args.quota} requests/s, latency: {args.latency}s, "
+          f"ideal concurrency: {args.quota * args.latency:.0f}")
+    print(f"{'controller':<16}{'time (s)':>10}{'req/s':>10}{'throttled':>11}  limit over time")
+    with StubGoogleApi(latency=args.latency, quota=args.quota) as stub:
+        for i in range(100):
+            stub.add_file(f"id_{i}", f"name_{i}")
+
+        runs = [(f"fixed {limit}", AdaptiveConcurrency(initial_limit=limit, min_limit=limit, max_limit=limit,
+                                                        sleep=0.1))
+                for limit in FIXED_LIMITS]
+        runs.append(("adaptive", AdaptiveConcurrency(initial_limit=4, max_limit=64, sleep=0.1)))
+        for name, concurrency in runs:
+            result = _run(stub, concurrency, args.requests)
+            limits = " ".join(str(limit) for limit in result["limits"][:12])
+            print(f"{name:<16}{result['elapsed']:>10.2f}{result['throughput']:>10.1f}{result['throttled']:>11}  "
+                  f"{limits}")
+
+
+if __name__ == "__main__":
+    main()
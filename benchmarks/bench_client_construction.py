@@ -0,0 +1,55 @@
+"""Measures the time to get the API client of Drive, Sheets and GMail objects with and without the resource registry.
+
+Service objects build their client lazily, so each instance is timed up to its first `_client` access. The first build
+after the registry is cleared ("cold") is reported separately from the remaining instances, which are served by the
+registry ("warm").
+
+Run with `python -m benchmarks.bench_client_construction`. No network access is needed.
+"""
+import argparse
+import time
+from types import SimpleNamespace
+
+from googleapiclient.discovery import build
+from google.oauth2.credentials import Credentials
+
+from pysuite import Drive, Sheets, GMail
+from pysuite.discovery import clear_cache
+
+SERVICES = [
+    (Drive, "drive", "v3", lambda resource: resource),
+    (Sheets, "sheets", "v4", lambda resource: resource.spreadsheets()),
+    (GMail, "gmail", "v1", lambda resource: resource.users().messages()),
+]
+INSTANCE_COUNTS = [1, 10, 100]
+
+
+def _time(func, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--instances", type=int, nargs="+", default=INSTANCE_COUNTS,
+                        help="numbers of instances created for each service.")
+    args = parser.parse_args()
+
+    auth = SimpleNamespace(credential=Credentials(token="benchmark_token"))
+    print(f"{'service':<8}{'instances':>10}{'build() (s)':>14}{'cold (s)':>12}{'warm (s)':>12}{'speedup':>10}")
+    for cls, service, version, get_nested in SERVICES:
+        for n in args.instances:
+            uncached = _time(
+                lambda: get_nested(build(service, version, credentials=auth.credential, static_discovery=True)), n
+            )
+            clear_cache()
+            cold = _time(lambda: cls(auth)._client, 1)
+            warm = _time(lambda: cls(auth)._client, n - 1)
+            print(f"{service:<8}{n:>10}{uncached:>14.4f}{cold:>12.4f}{warm:>12.4f}"
+                  f"{uncached / (cold + warm):>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
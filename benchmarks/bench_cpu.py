@@ -0,0 +1,191 @@
+"""Measures time and peak memory of pysuite code paths that run locally, such as filling rows and converting dataframes
+in Sheets, building messages in GMail and building requests and converting responses in Vision. Calls to Google APIs
+are replaced by in-memory objects, so no network access is needed.
+
+Run with `python -m benchmarks.bench_cpu`. Use `--save` to store results as a baseline and `--compare` to exit with an
+error when time or peak memory of any case exceeds the baseline by more than `--tolerance`, which can be used to guard
+against regressions.
+"""
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, NamedTuple
+
+from google.cloud.vision_v1 import types
+from google.oauth2.credentials import Credentials
+
+from pysuite.auth import Authentication, _utcnow
+from pysuite.gmail import GMail
+from pysuite.sheets import Sheets, get_col_counts_from_range, get_column_number
+from pysuite.vision import Vision
+
+SHEET_ROWS = 100000
+SHEET_COLUMNS = 10
+SHEET_RANGE = "sheet!A1:J"
+ATTACHMENT_SIZE = 25 << 20  # bytes
+IMAGE_COUNT = 1000
+IMAGE_SIZE = 64 << 10  # bytes of each local image
+
+
+class Case(NamedTuple):
+    name: str
+    size: str
+    setup: Callable[[], tuple]  # returns arguments of `func`. it is called before each run and not measured.
+    func: Callable
+
+
+class OfflineSheets(Sheets):
+    """Sheets returning prepared values instead of executing read requests, and dropping write requests."""
+
+    def __init__(self, auth: Authentication, values: list):
+        super().__init__(auth)
+        self.values = values
+
+    def _execute(self, request, operation: str):
+        if operation == "read":
+            return {"values": [list(row) for row in self.values]}
+        return {}
+
+
+class OfflineGMail(GMail):
+    """GMail dropping sent messages."""
+
+    @property
+    def _client(self):
+        return SimpleNamespace(send=lambda userId, body: SimpleNamespace(execute=lambda: {"id": "id"}))
+
+
+def sheet_cases(auth: Authentication, scale: float) -> list:
+    rows = max(1, int(SHEET_ROWS * scale))
+    # every other row has trailing empty cells removed, as the Sheets API returns them.
+    values = [[f"c{j}" for j in range(SHEET_COLUMNS)]] + \
+             [[f"r{i}c{j}" for j in range(SHEET_COLUMNS - (i % 2) * 3)] for i in range(rows)]
+    sheets = OfflineSheets(auth, values)
+    df = sheets.read_sheet("id", SHEET_RANGE)
+    columns = [_column_name(i % 18278 + 1) for i in range(rows)]  # from "A" to "ZZZ"
+    ranges = [f"sheet!{column}1:{column}" for column in columns]
+    return [
+        Case("Sheets._fill_rows", f"{rows} rows", lambda: ([list(row) for row in values], SHEET_COLUMNS),
+             sheets._fill_rows),
+        Case("get_column_number", f"{rows} calls", lambda: (columns,),
+             lambda columns: [get_column_number(column) for column in columns]),
+        Case("get_col_counts_from_range", f"{rows} calls", lambda: (ranges,),
+             lambda ranges: [get_col_counts_from_range(sheet_range) for sheet_range in ranges]),
+        Case("Sheets.read_sheet", f"{rows} rows", lambda: (), lambda: sheets.read_sheet("id", SHEET_RANGE)),
+        Case("Sheets.write_sheet", f"{rows} rows", lambda: (), lambda: sheets.write_sheet(df, "id", SHEET_RANGE)),
+    ]
+
+
+def _column_name(number: int) -> str:
+    name = ""
+    while number > 0:
+        number, remainder = divmod(number - 1, 26)
+        name = chr(65 + remainder) + name
+    return name
+
+
+def gmail_cases(auth: Authentication, scale: float, workdir: Path) -> list:
+    size = max(1, int(ATTACHMENT_SIZE * scale))
+    attachment = workdir / "attachment.bin"
+    attachment.write_bytes(os.urandom(size))
+    gmail = OfflineGMail(auth)
+    compose = lambda: gmail.compose(sender="a@example.com", to=["b@example.com"], body="<p>body</p>",  # noqa: E731
+                                    subject="subject", local_files=[attachment])
+    return [Case("GMail.compose", f"{size >> 10}KB", lambda: (), compose)]
+
+
+def vision_cases(scale: float, workdir: Path) -> list:
+    count = max(1, int(IMAGE_COUNT * scale))
+    images = []
+    for i in range(count):
+        image = workdir / f"image_{i}.jpg"
+        image.write_bytes(os.urandom(IMAGE_SIZE))
+        images.append(image)
+    uris = [f"gs://bucket/image_{i}.jpg" for i in range(count)]
+    methods = ["LABEL_DETECTION", "text_detection"]
+
+    labels = [{"description": f"label_{j}", "score": 0.9, "topicality": 0.9, "mid": f"/m/{j}"} for j in range(10)]
+    response = types.BatchAnnotateImagesResponse(
+        responses=[types.AnnotateImageResponse(label_annotations=labels) for _ in range(count)])
+    return [
+        Case("Vision._create_request", f"{count} files", lambda: (),
+             lambda: [Vision._create_request(image, methods) for image in images]),
+        Case("Vision._create_request", f"{count} uris", lambda: (),
+             lambda: [Vision._create_request(uri, methods) for uri in uris]),
+        Case("Vision.to_json", f"{count} images", lambda: (), lambda: Vision.to_json(response)),
+    ]
+
+
+def run(case: Case, repeat: int) -> dict:
+    durations = []
+    for _ in range(repeat):
+        args = case.setup()
+        gc.collect()
+        start = time.perf_counter()
+        case.func(*args)
+        durations.append(time.perf_counter() - start)
+
+    # peak memory is measured in a separate run, since tracing allocations slows down the code.
+    args = case.setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        case.func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"median_ms": statistics.median(durations) * 1000, "min_ms": min(durations) * 1000,
+            "peak_mb": peak / (1 << 20)}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Lists cases whose median time or peak memory exceeds the baseline by more than the tolerance."""
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        for metric in ("median_ms", "peak_mb"):
+            if result[metric] > baseline[key][metric] * (1 + tolerance):
+                regressions.append(f"{key} {metric}: {result[metric]:.1f} > {baseline[key][metric]:.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5, help="number of timed runs per case.")
+    parser.add_argument("--scale", type=float, default=1, help="fraction of the default sizes, such as 0.1.")
+    parser.add_argument("--save", default=None, help="path of a json file to store results in.")
+    parser.add_argument("--compare", default=None, help="path of a json file of baseline results.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative increase over the baseline.")
+    args = parser.parse_args()
+
+    auth = Authentication(credential=Credentials(token="benchmark_token", expiry=_utcnow() + timedelta(hours=1)))
+    results = {}
+    print(f"{'case':<28}{'size':>14}{'median (ms)':>14}{'min (ms)':>12}{'peak (MB)':>12}")
+    with tempfile.TemporaryDirectory() as workdir:
+        cases = sheet_cases(auth, args.scale) + gmail_cases(auth, args.scale, Path(workdir)) + \
+                vision_cases(args.scale, Path(workdir))
+        for case in cases:
+            result = results[f"{case.name} {case.size}"] = run(case, args.repeat)
+            print(f"{case.name:<28}{case.size:>14}{result['median_ms']:>14.1f}{result['min_ms']:>12.1f}"
+                  f"{result['peak_mb']:>12.1f}")
+
+    if args.save is not None:
+        Path(args.save).write_text(json.dumps(results, indent=2))
+    if args.compare is not None:
+        regressions = compare(results, json.loads(Path(args.compare).read_text()), args.tolerance)
+        if regressions:
+            sys.exit("regressions over the baseline:\n" + "\n".join(regressions))
+
+
+if __name__ == "__main__":
+    main()
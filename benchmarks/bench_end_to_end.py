@@ -0,0 +1,135 @@
+"""Measures throughput and latency of Drive and Sheets operations end to end against a local stub Google API server, so
+that the overhead of pysuite and google-api-python-client can be compared between versions reproducibly.
+
+Run with `python -m benchmarks.bench_end_to_end`. No network access is needed. Use `--latency` to add server latency to
+each request and `--quota` to limit requests per second.
+"""
+import argparse
+import math
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+import pandas as pd
+from google.oauth2.credentials import Credentials
+
+from pysuite.auth import Authentication, _utcnow
+from pysuite.drive import Drive
+from pysuite.hashcache import HashCache
+from pysuite.sheets import Sheets
+from tests.stub_server import StubGoogleApi
+
+FOLDER_SIZES = [100, 1000, 5000]  # number of files listed by Drive.list
+TREE_SIZES = [100, 1000]  # number of folders, each containing 5 files, walked by Drive.walk
+FILE_SIZES = [1 << 10, 1 << 20, 16 << 20]  # bytes downloaded by Drive.download
+PARALLEL_CHUNK_SIZE = 4 << 20  # bytes of each range request of Drive.download_parallel
+TRANSFER_SIZES = [50, 200]  # number of 16KB files, 10 in each folder, of Drive.upload_folder, download_folder and sync
+SHEET_ROWS = [100, 1000, 10000]  # rows of 10 columns for Sheets operations
+SHEET_COLUMNS = 10
+
+
+def percentile(values: list, quantile: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, math.ceil(quantile * len(values)) - 1))]
+
+
+def measure(func, iterations: int) -> list:
+    func()  # warm up caches, such as built API clients.
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def report(operation: str, size: str, durations: list, unit_count: float, unit: str):
+    total = sum(durations)
+    print(f"{operation:<20}{size:>10}{len(durations) / total:>10.1f}{unit_count * len(durations) / total:>14.1f} "
+          f"{unit:<7}{percentile(durations, 0.5) * 1000:>10.1f}{percentile(durations, 0.99) * 1000:>10.1f}")
+
+
+def bench_drive(stub: StubGoogleApi, drive: Drive, iterations: int, workdir: Path):
+    for count in FOLDER_SIZES:
+        folder = f"folder_{count}"
+        stub.add_folder(folder, folder)
+        for i in range(count):
+            stub.add_file(f"{folder}_file_{i}", f"file_{i}", parents=(folder,))
+        report("Drive.list", str(count), measure(lambda: drive.list(folder), iterations), count, "files")
+        durations = measure(lambda: sum(1 for _ in drive.iter_list(folder, fields=["id", "name"])), iterations)
+        report("Drive.iter_list", str(count), durations, count, "files")
+        paths = [f"file_{i}" for i in range(count)]
+        durations = measure(lambda: drive.resolve_paths(paths, root_id=folder), iterations)
+        report("Drive.resolve_paths", str(count), durations, count, "paths")
+
+    for count in TREE_SIZES:
+        root = f"tree_{count}"
+        stub.add_folder(root, root)
+        for i in range(count):
+            # a tree in which each folder contains 5 files and up to 2 folders.
+            parent = f"{root}_folder_{(i - 1) // 2}" if i else root
+            stub.add_folder(f"{root}_folder_{i}", f"folder_{i}", parents=(parent,))
+            for j in range(5):
+                stub.add_file(f"{root}_file_{i}_{j}", f"file_{j}", parents=(f"{root}_folder_{i}",))
+        report("Drive.walk", str(count), measure(lambda: drive.walk(root), iterations), count * 6, "files")
+
+    for size in FILE_SIZES:
+        stub.add_file(f"blob_{size}", f"blob_{size}", content=b"x" * size)
+        to_file = workdir / f"blob_{size}"
+        durations = measure(lambda: drive.download(f"blob_{size}", to_file), iterations)
+        report("Drive.download", f"{size >> 10}KB", durations, size / (1 << 20), "MB")
+        durations = measure(lambda: drive.download_parallel(f"blob_{size}", to_file, chunk_size=PARALLEL_CHUNK_SIZE),
+                            iterations)
+        report("Drive.download_par", f"{size >> 10}KB", durations, size / (1 << 20), "MB")
+
+    for count in TRANSFER_SIZES:
+        local = workdir / f"transfer_{count}"
+        for i in range(count):
+            path = local / f"folder_{i // 10}" / f"file_{i}"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b"x" * (16 << 10))
+        durations = measure(lambda: drive.upload_folder(local, workers=8), iterations)
+        report("Drive.upload_folder", str(count), durations, count, "files")
+        id = drive.upload_folder(local, workers=8)["id"]
+        durations = measure(lambda: drive.download_folder(id, workdir / f"copy_{count}", workers=8), iterations)
+        report("Drive.download_fold", str(count), durations, count, "files")
+        with HashCache() as hashes:
+            # no file differs, so this measures listing and comparing the trees.
+            durations = measure(lambda: drive.sync(local, id, workers=8, hash_cache=hashes), iterations)
+        report("Drive.sync", str(count), durations, count, "files")
+
+
+def bench_sheets(stub: StubGoogleApi, sheets: Sheets, iterations: int):
+    for rows in SHEET_ROWS:
+        values = [[f"c{j}" for j in range(SHEET_COLUMNS)]] + \
+                 [[f"r{i}c{j}" for j in range(SHEET_COLUMNS)] for i in range(rows)]
+        stub.add_spreadsheet(f"sheet_{rows}", {"tab": values})
+        sheet_range = f"tab!A1:{chr(64 + SHEET_COLUMNS)}"
+        durations = measure(lambda: sheets.download(f"sheet_{rows}", sheet_range), iterations)
+        report("Sheets.download", str(rows), durations, rows, "rows")
+        durations = measure(lambda: sheets.read_sheet(f"sheet_{rows}", sheet_range), iterations)
+        report("Sheets.read_sheet", str(rows), durations, rows, "rows")
+
+        df = pd.DataFrame(values[1:], columns=values[0])
+        durations = measure(lambda: sheets.write_sheet(df, f"sheet_{rows}", sheet_range), iterations)
+        report("Sheets.write_sheet", str(rows), durations, rows, "rows")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=10, help="number of calls of each operation and size.")
+    parser.add_argument("--latency", type=float, default=0, help="seconds each request takes in the stub server.")
+    parser.add_argument("--quota", type=int, default=None, help="requests per second allowed by the stub server.")
+    args = parser.parse_args()
+
+    credential = Credentials(token="benchmark_token", expiry=_utcnow() + timedelta(hours=1))
+    auth = Authentication(credential=credential)
+    print(f"{'operation':<20}{'size':>10}{'calls/s':>10}{'throughput':>14} {'':<7}{'p50 (ms)':>10}{'p99 (ms)':>10}")
+    with StubGoogleApi(latency=args.latency, quota=args.quota) as stub, tempfile.TemporaryDirectory() as workdir:
+        bench_drive(stub, Drive(auth, api_endpoint=stub.drive_endpoint), args.iterations, Path(workdir))
+        bench_sheets(stub, Sheets(auth, api_endpoint=stub.sheets_endpoint), args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Measures import time of pysuite entry points with `python -X importtime`.
+
+Run with `python -m benchmarks.bench_import_time`. Pass `--max-ms` to exit with an error when any statement exceeds
+the budget, which can be used to guard against regressions.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+STATEMENTS = [
+    "import pysuite",
+    "from pysuite import Authentication",
+    "from pysuite import Sheets",
+    "from pysuite import Drive",
+    "from pysuite import GMail",
+    "from pysuite import Storage",
+    "from pysuite import Vision",
+]
+
+
+def measure_import_time(statement: str) -> float:
+    """Runs the statement in a fresh interpreter and returns the total import time in milliseconds, which is the sum
+    of the cumulative time of all top level imports.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  ") and cumulative.strip().isdigit():
+            total_us += int(cumulative)
+    return total_us / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5, help="number of runs per statement.")
+    parser.add_argument("--max-ms", type=float, default=None, help="fail if a median exceeds this budget.")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'statement':<40}{'median (ms)':>12}{'min (ms)':>12}")
+    for statement in STATEMENTS:
+        timings = [measure_import_time(statement) for _ in range(args.repeat)]
+        median = statistics.median(timings)
+        print(f"{statement:<40}{median:>12.1f}{min(timings):>12.1f}")
+        if args.max_ms is not None and median > args.max_ms:
+            failed = True
+
+    if failed:
+        sys.exit(f"import time exceeds budget of {args.max_ms} ms")
+
+
+if __name__ == "__main__":
+    main()
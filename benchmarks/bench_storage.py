@@ -0,0 +1,90 @@
+"""Measures transfer rates of Storage methods against a local fake Google Storage server, across a matrix of file counts
+(folders of small files, which are bound by the number of requests) and a matrix of file sizes (single files, which are
+bound by bytes transferred).
+
+Run with `python -m benchmarks.bench_storage`. No network access is needed. Use `--latency` to add server latency to
+each request and `--concurrency` to transfer files of folders concurrently.
+"""
+import argparse
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from google.oauth2.credentials import Credentials
+
+from benchmarks.bench_end_to_end import percentile
+from pysuite.auth import Authentication, _utcnow
+from pysuite.concurrency import AdaptiveConcurrency
+from pysuite.storage import Storage
+from tests.gcs_server import FakeGcsServer
+
+FILE_COUNTS = [10, 100, 500]  # number of files in a folder
+SMALL_FILE_SIZE = 4 << 10  # bytes of each file in a folder
+FILE_SIZES = [1 << 20, 16 << 20, 64 << 20]  # bytes of a single file
+BUCKET = "benchmark"
+
+
+def measure(func, iterations: int, setup=None) -> list:
+    durations = []
+    for _ in range(iterations):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def report(operation: str, size: str, durations: list, object_count: int, byte_count: int):
+    total = sum(durations)
+    print(f"{operation:<18}{size:>10}{object_count * len(durations) / total:>12.1f}"
+          f"{byte_count * len(durations) / total / (1 << 20):>10.1f}{percentile(durations, 0.5) * 1000:>10.1f}"
+          f"{percentile(durations, 0.99) * 1000:>10.1f}")
+
+
+def bench_methods(storage: Storage, local: Path, name: str, size: str, object_count: int, byte_count: int,
+                  iterations: int):
+    source, target = f"gs://{BUCKET}/{name}", f"gs://{BUCKET}/copy_{name}"
+    upload = lambda: storage.upload(local, source)  # noqa: E731
+    report("Storage.upload", size, measure(upload, iterations), object_count, byte_count)
+    downloaded = local.parent / f"downloaded_{name}"
+    report("Storage.download", size, measure(lambda: storage.download(source, downloaded), iterations), object_count,
+           byte_count)
+    report("Storage.copy", size, measure(lambda: storage.copy(source, target), iterations), object_count, byte_count)
+    report("Storage.remove", size, measure(lambda: storage.remove(source), iterations, setup=upload), object_count,
+           byte_count)
+    storage.remove(target)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=5, help="number of calls of each method and size.")
+    parser.add_argument("--latency", type=float, default=0, help="seconds each request takes in the fake server.")
+    parser.add_argument("--concurrency", type=int, default=0,
+                        help="initial limit of concurrent transfers in folders. If 0, files are transferred in turn.")
+    args = parser.parse_args()
+
+    credential = Credentials(token="benchmark_token", expiry=_utcnow() + timedelta(hours=1))
+    concurrency = AdaptiveConcurrency(initial_limit=args.concurrency) if args.concurrency else None
+    print(f"{'operation':<18}{'size':>10}{'objects/s':>12}{'MB/s':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}")
+    with FakeGcsServer(latency=args.latency) as server, tempfile.TemporaryDirectory() as workdir:
+        server.add_bucket(BUCKET)
+        storage = Storage(Authentication(credential=credential), concurrency=concurrency, api_endpoint=server.endpoint)
+        storage.get_bucket(BUCKET)  # warm up the client.
+        for count in FILE_COUNTS:
+            folder = Path(workdir) / f"folder_{count}"
+            folder.mkdir()
+            for i in range(count):
+                (folder / f"file_{i}").write_bytes(b"x" * SMALL_FILE_SIZE)
+            bench_methods(storage, folder, folder.name, f"{count} files", count, count * SMALL_FILE_SIZE,
+                          args.iterations)
+
+        for size in FILE_SIZES:
+            file = Path(workdir) / f"file_{size}"
+            file.write_bytes(b"x" * size)
+            bench_methods(storage, file, file.name, f"{size >> 20}MB", 1, size, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,37 @@
-from .auth import Authentication
-from .drive import Drive
-from .sheets import Sheets
-from .gmail import GMail
-from .vision import Vision
-from .storage import Storage
+"""Top level names are imported lazily, so that `import pysuite` or `from pysuite import Sheets` does not load
+client libraries of unused services, such as google.cloud.vision and google.cloud.storage.
+"""
+import importlib
+import sys
+
+_LAZY_NAMES = {
+    "Authentication": "pysuite.auth",
+    "Drive": "pysuite.drive",
+    "Sheets": "pysuite.sheets",
+    "GMail": "pysuite.gmail",
+    "Vision": "pysuite.vision",
+    "Storage": "pysuite.storage",
+}
+
+__all__ = list(_LAZY_NAMES)
 
 __version__ = "0.4.0"
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_NAMES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(_LAZY_NAMES[name]), name)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_NAMES))
+
+
+if sys.version_info < (3, 7):  # pragma: no cover
+    # module level __getattr__ requires python 3.7 (PEP 562).
+    for _name in _LAZY_NAMES:
+        __getattr__(_name)
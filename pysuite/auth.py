@@ -2,12 +2,19 @@
 """
 import json
 import logging
+import threading
+import weakref
+from datetime import datetime, timezone
 from pathlib import PosixPath
 from typing import Union, Optional, List
-from google.auth.transport.requests import Request
 from google.auth.exceptions import RefreshError
-from google_auth_oauthlib.flow import Flow
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp, Request
+
+from pysuite.instrumentation import instrument
+from pysuite.token_cache import TokenCache
+from pysuite.transport import PooledHttp
+from pysuite.utilities import register_after_fork
 
 
 SCOPES = {
@@ -20,6 +27,8 @@ SCOPES = {
 
 CLOUD_SERVICES = {"vision", "storage"}
 
+_AUTHENTICATIONS = weakref.WeakSet()
+
 DEFAULT_VERSIONS = {
     "drive": "v3",
     "sheets": "v4",
@@ -44,6 +53,7 @@ def get_token_from_secrets_file(secret_file, scopes: Optional[List[str]] = None,
     if scopes is None:
         scopes = [SCOPES[service] for service in services]
 
+    from google_auth_oauthlib.flow import Flow
     flow = Flow.from_client_secrets_file(secret_file, scopes=scopes, **kwargs)
     flow.redirect_uri = "https://console.developers.google.com/apis/credentials"
     authorization_url, state = flow.authorization_url(
@@ -73,37 +83,260 @@ def load_oauth(credential) -> Credentials:
 
     if isinstance(credential, str) or isinstance(credential, PosixPath):
         with open(credential, 'r') as fp:
-            return Credentials(**json.load(fp))
+            credential = json.load(fp)
 
     if isinstance(credential, dict):
+        credential = dict(credential)
+        if isinstance(credential.get("expiry"), str):
+            credential["expiry"] = _parse_expiry(credential["expiry"])
         return Credentials(**credential)
 
     raise TypeError(f"Expecting str, PosixPath, dict or Credentials. Got {type(credential)}.")
 
 
+def _parse_expiry(expiry: str) -> datetime:
+    """Converts expiry string in credential json, such as "2022-12-31T00:00:00.000000Z", to a naive UTC datetime
+    which is expected by Credentials.
+    """
+    return datetime.strptime(expiry.rstrip("Z").split(".")[0], "%Y-%m-%dT%H:%M:%S")
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _get_token_cache(token_cache: Union[bool, str, PosixPath, TokenCache],
+                     credential: Union[PosixPath, str, Credentials, dict]) -> Optional[TokenCache]:
+    if token_cache is False or token_cache is None:
+        return None
+
+    if isinstance(token_cache, TokenCache):
+        return token_cache
+
+    if token_cache is True:
+        if not isinstance(credential, (str, PosixPath)):
+            raise ValueError("token_cache=True requires credential to be a path to the credential file.")
+        return TokenCache.for_credential_file(credential)
+
+    return TokenCache(token_cache)
+
+
+class _AuthorizedHttp(AuthorizedHttp):
+    """Makes sure the token of the owning Authentication is valid before each request, so that concurrent requests
+    trigger only one refresh.
+    """
+
+    def __init__(self, auth: "Authentication", http):
+        super().__init__(auth.credential, http=http)
+        self._auth = auth
+
+    def request(self, *args, **kwargs):
+        self._auth.ensure_valid()
+        return super().request(*args, **kwargs)
+
+
 class Authentication:
     """Accepts various types of credentials and authenticate with Google service for requested services.
 
     You can pass a list of services or one service.
+
+    Authentication objects can be pickled, for example to be sent to a ProcessPoolExecutor. Only the credential and
+    settings are pickled. The http transport is recreated in the receiving process. In a child process created by
+    `os.fork()`, locks are recreated and the background renewer is restarted if it was running.
     """
-    def __init__(self, credential: Union[PosixPath, str, Credentials, dict], project_id: Optional[str] = None):
+    def __init__(self, credential: Union[PosixPath, str, Credentials, dict], project_id: Optional[str] = None,
+                 connections_per_host: Optional[int] = None, refresh_margin: int = 300, background_refresh: bool = False,
+                 token_cache: Union[bool, str, PosixPath, TokenCache] = False):
         """Instantiates an Authentication object.
 
+        The token is only refreshed when it is expired, about to expire or has no known expiry. Requests made through
+        clients created from this object refresh the token on demand.
+
         :param credential: path to the credential json file, or pre-generated Credentials object, or a dictionary
           containing OAuth credentials.
         :param project_id: Project id for the provided credentials. You can get it from Google Cloud Console. This is
           needed if "storage" service is requested.
+        :param connections_per_host: max number of keep-alive connections to each host in the http transport shared by
+          Drive, Sheets and GMail clients created from this object. If None, the default of the current process is
+          used. See `pysuite.transport.get_default_connections_per_host`.
+        :param refresh_margin: number of seconds before expiry when the token is considered about to expire.
+        :param background_refresh: if True, start a background thread that refreshes the token before it is about to
+          expire, so that requests never wait for a refresh. See `start_renewer`.
+        :param token_cache: if True, share refreshed token with other processes through a cache file next to the
+          credential file, which must be a path in this case. It can also be a path to the cache file or a TokenCache
+          object. When the cached token is still valid, it is used instead of refreshing. See `TokenCache`.
         """
+        self.token_cache = _get_token_cache(token_cache, credential)
         self.credential = load_oauth(credential)
         self.project_id = project_id
-        self.refresh()
+        self.refresh_margin = refresh_margin
+        self._setup(connections_per_host)
+        if self.credential.expiry is None:
+            self._refresh_or_load()
+        else:
+            self.ensure_valid()
+        if background_refresh:
+            self.start_renewer()
+
+    def __getstate__(self) -> dict:
+        return {
+            "credential": self.credential,
+            "project_id": self.project_id,
+            "refresh_margin": self.refresh_margin,
+            "token_cache": self.token_cache,
+            "connections_per_host": self._connections_per_host,
+            "background_refresh": self._renewer is not None,
+        }
+
+    def __setstate__(self, state: dict):
+        state = dict(state)
+        connections_per_host = state.pop("connections_per_host")
+        background_refresh = state.pop("background_refresh")
+        self.__dict__.update(state)
+        self._setup(connections_per_host)
+        if background_refresh:
+            self.start_renewer()
 
+    @instrument()
     def refresh(self):
-        """Refreshes token if not valid or has expired.
+        """Refreshes token regardless of its expiry. If token cache is enabled, the new token is written to it.
+        """
+        request = Request(self.transport)
+        with self._refresh_lock:
+            try:
+                self.credential.refresh(request)
+            except RefreshError:
+                logging.critical('Unable to refresh oauth credentials. You may need to manually update oauth file.')
+                raise
+
+            if self.token_cache is not None:
+                self.token_cache.save(self.credential.token, self.credential.expiry, self.credential.refresh_token)
+
+    def needs_refresh(self, margin: Optional[float] = None) -> bool:
+        """Checks whether the token is missing, expired or going to expire within `margin` seconds. A token without
+        expiry never expires.
+
+        :param margin: number of seconds before expiry. If None, `refresh_margin` is used.
+        :return: True if token needs refresh.
+        """
+        if not self.credential.token:
+            return True
+
+        remaining = self._seconds_to_expiry()
+        if remaining is None:
+            return False
+
+        return remaining <= (self.refresh_margin if margin is None else margin)
+
+    def ensure_valid(self):
+        """Refreshes token only if it needs refresh. If multiple threads call this at the same time, only one refresh
+        is made.
+
+        :return: None
+        """
+        if not self.needs_refresh():
+            return
+
+        with self._refresh_lock:
+            # another thread may have refreshed the token while waiting for the lock.
+            if self.needs_refresh():
+                self._refresh_or_load()
+
+    def start_renewer(self):
+        """Starts a daemon thread that refreshes the token ahead of the refresh margin. It does nothing if the renewer
+        is already running.
+
+        :return: None
         """
-        request = Request()
-        try:
-            self.credential.refresh(request)
-        except RefreshError:
-            logging.critical('Unable to refresh oauth credentials. You may need to manually update oauth file.')
-            raise
+        with self._refresh_lock:
+            if self._renewer is not None and self._renewer.is_alive():
+                return
+
+            self._renewer_stopped = threading.Event()
+            self._renewer = threading.Thread(target=self._renew, args=(self._renewer_stopped,),
+                                             name="pysuite-token-renewer", daemon=True)
+            self._renewer.start()
+
+    def stop_renewer(self):
+        """Stops the background renewer started by `start_renewer`.
+
+        :return: None
+        """
+        with self._refresh_lock:
+            renewer, self._renewer = self._renewer, None
+            if renewer is None:
+                return
+
+            self._renewer_stopped.set()
+
+        renewer.join()
+
+    def _renew(self, stopped: threading.Event):
+        # refresh when twice the refresh margin is left, so that requests see a valid token before `ensure_valid`
+        # would refresh it.
+        renew_margin = 2*self.refresh_margin
+        while True:
+            remaining = self._seconds_to_expiry()
+            # a token without expiry does not need renewal until an expiry is set by a refresh.
+            delay = self.refresh_margin if remaining is None else max(remaining - renew_margin, 0)
+            if stopped.wait(delay):
+                return
+
+            try:
+                with self._refresh_lock:
+                    if self.needs_refresh(margin=renew_margin):
+                        self._refresh_or_load(margin=renew_margin)
+            except Exception:
+                logging.exception("Background token refresh failed. Retrying in 30 seconds.")
+                if stopped.wait(30):
+                    return
+
+    def _setup(self, connections_per_host: Optional[int]):
+        self._connections_per_host = connections_per_host
+        self.transport = PooledHttp(connections_per_host=connections_per_host)
+        self.http = _AuthorizedHttp(self, http=self.transport)
+        self._refresh_lock = threading.RLock()
+        self._renewer = None
+        self._renewer_stopped = None
+        _AUTHENTICATIONS.add(self)
+
+    def _reset_after_fork(self):
+        # threads are not copied to the child process, and the lock may be held by a thread of the parent process.
+        self._refresh_lock = threading.RLock()
+        if self._renewer is not None:
+            self._renewer = None
+            self.start_renewer()
+
+    def _refresh_or_load(self, margin: Optional[float] = None):
+        """Refreshes token. If token cache is enabled, reuses the cached token instead when it does not need refresh.
+        The cache is locked so that only one process refreshes while the others wait for its result.
+        """
+        if self.token_cache is None:
+            self.refresh()
+            return
+
+        with self._refresh_lock, self.token_cache.lock():
+            cached = self.token_cache.load(self.credential.refresh_token)
+            if cached is not None:
+                token, expiry = cached
+                margin = self.refresh_margin if margin is None else margin
+                if expiry is not None and (expiry - _utcnow()).total_seconds() > margin:
+                    self.credential.token = token
+                    self.credential.expiry = expiry
+                    return
+
+            self.refresh()
+
+    def _seconds_to_expiry(self) -> Optional[float]:
+        if self.credential.expiry is None:
+            return None
+
+        return (self.credential.expiry - _utcnow()).total_seconds()
+
+
+def _reset_after_fork():
+    for auth in list(_AUTHENTICATIONS):
+        auth._reset_after_fork()
+
+
+register_after_fork(_reset_after_fork)
@@ -0,0 +1,142 @@
+"""Implements an in-memory cache of Google Drive metadata.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Optional, Tuple
+
+
+class MetadataCache:
+    """Caches results of lookups, such as the id of a name in a folder or the name of an id, for `ttl` seconds. When
+    more than `max_size` entries are cached, the least recently used ones are evicted.
+
+    The cache is thread-safe. Pass it to `Drive` to enable caching. Drive methods that write, such as `upload` and
+    `delete`, invalidate affected entries, but changes made by other clients are only seen after entries expire. Cached
+    entries are not pickled, so a Drive object sent to another process starts with an empty cache.
+
+    :example:
+
+    >>> drive = Drive(auth, cache=MetadataCache(ttl=600))
+    >>> drive.get_id("reports", parent_id=folder_id)  # sends a request.
+    >>> drive.get_id("reports", parent_id=folder_id)  # served from the cache.
+    >>> drive.cache.stats
+    {'hits': 1, 'misses': 1, 'evictions': 0, 'size': 1}
+
+    :param ttl: number of seconds an entry is valid after it is set.
+    :param max_size: max number of entries.
+    :param clock: a function returning the current time in seconds. Default is `time.monotonic`.
+    """
+
+    def __init__(self, ttl: float = 300, max_size: int = 10000, clock: Callable[[], float] = time.monotonic):
+        if ttl <= 0:
+            raise ValueError(f"ttl must be positive. Got {ttl}")
+        if max_size < 1:
+            raise ValueError(f"max_size must be at least 1. Got {max_size}")
+
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self._reset()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        for key in ("_lock", "_entries", "_stats"):
+            del state[key]
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._reset()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    @property
+    def stats(self) -> dict:
+        """Counters of lookups in this cache.
+
+        :return: a dictionary containing number of 'hits', 'misses', 'evictions' (entries removed to keep `max_size`)
+          and current 'size'.
+        """
+        with self._lock:
+            return dict(self._stats, size=len(self._entries))
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Gets the value of the key, counting a hit or a miss.
+
+        :param key: a hashable key.
+        :param default: value returned if the key is not cached or has expired.
+        :return: the cached value or `default`.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        """Caches the value of the key for `ttl` seconds, replacing the previous value.
+
+        :param key: a hashable key.
+        :param value: any value.
+        :return: None
+        """
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def update(self, key: Hashable, value: dict):
+        """Merges the dictionary into the cached dictionary of the key, if it has not expired. Otherwise the dictionary
+        is cached as is.
+
+        :param key: a hashable key.
+        :param value: a dictionary, such as fields of a file.
+        :return: None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            cached = entry[1] if entry is not None and entry[0] > self.clock() else {}
+        self.set(key, {**cached, **value})
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """Lists the entries that have not expired, without counting hits or misses.
+
+        :return: a list of (key, value) tuples, least recently used first.
+        """
+        with self._lock:
+            now = self.clock()
+            return [(key, entry[1]) for key, entry in self._entries.items() if entry[0] > now]
+
+    def invalidate(self, key: Optional[Hashable] = None, predicate: Optional[Callable[[Hashable, Any], bool]] = None):
+        """Removes the entry of the key and entries matching the predicate. If neither is provided, all entries are
+        removed.
+
+        :param key: a hashable key.
+        :param predicate: a function that takes a key and its value and returns whether the entry is removed.
+        :return: None
+        """
+        with self._lock:
+            if key is None and predicate is None:
+                self._entries.clear()
+                return
+
+            self._entries.pop(key, None)
+            if predicate is not None:
+                for matched in [k for k, (_, v) in self._entries.items() if predicate(k, v)]:
+                    del self._entries[matched]
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expiry, value), least recently used first.
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
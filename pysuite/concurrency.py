@@ -0,0 +1,203 @@
+"""Implements an adaptive concurrency controller for bulk operations.
+"""
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional
+
+from pysuite.utilities import RetryPolicy, is_quota_error, register_after_fork
+
+MAX_RETRY_SLEEP = 32
+
+_CONTROLLERS = weakref.WeakSet()
+
+
+class AdaptiveConcurrency:
+    """Controls the number of in-flight calls of bulk operations with additive increase and multiplicative decrease
+    (AIMD). The limit grows by `increase` after about `limit` successful calls and is multiplied by `decrease` when a
+    call fails with a quota error, so that it converges near the highest concurrency the quota allows.
+
+    Only one decrease is applied per round of throttled calls. Errors of calls started before the last decrease are
+    ignored because those calls were sent under the old limit. `map` retries throttled calls after a backoff.
+
+    :example:
+
+    >>> concurrency = AdaptiveConcurrency(max_limit=32)
+    >>> names = concurrency.map(drive.get_name, ids)
+    >>> concurrency.limit, concurrency.throughput
+
+    :param initial_limit: number of in-flight calls allowed at the beginning.
+    :param min_limit: min number of in-flight calls allowed.
+    :param max_limit: max number of in-flight calls allowed. `map` uses at most this number of threads.
+    :param increase: increase of the limit after about `limit` successful calls.
+    :param decrease: factor, between 0 and 1, by which the limit is multiplied on a quota error.
+    :param max_retry: max number of retries of a throttled call in `map`.
+    :param sleep: base number of seconds to wait before retrying a throttled call in `map`.
+    :param window: number of seconds over which `throughput` is measured.
+    :param classifier: a function that takes an exception and returns whether it is a quota error. Default is
+      `pysuite.utilities.is_quota_error`.
+    """
+
+    def __init__(self, initial_limit: int = 4, min_limit: int = 1, max_limit: int = 64, increase: float = 1,
+                 decrease: float = 0.5, max_retry: int = 10, sleep: float = 1, window: float = 10,
+                 classifier: Callable[[Exception], bool] = is_quota_error):
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError(f"Expecting 1 <= min_limit <= initial_limit <= max_limit. Got {min_limit}, "
+                             f"{initial_limit} and {max_limit}")
+        if not 0 < decrease < 1:
+            raise ValueError(f"decrease must be between 0 and 1. Got {decrease}")
+
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.max_retry = max_retry
+        self.sleep = sleep
+        self.window = window
+        self.classifier = classifier
+        self._limit = float(initial_limit)
+        self._reset()
+        _CONTROLLERS.add(self)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        for key in ("_condition", "_in_flight", "_epoch", "_started", "_completed", "_stats"):
+            del state[key]
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._reset()
+        _CONTROLLERS.add(self)
+
+    @property
+    def limit(self) -> int:
+        """Current max number of in-flight calls."""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        """Current number of in-flight calls."""
+        with self._condition:
+            return self._in_flight
+
+    @property
+    def throughput(self) -> float:
+        """Number of successful calls per second over the last `window` seconds."""
+        with self._condition:
+            now = time.monotonic()
+            self._trim(now)
+            elapsed = min(self.window, now - self._started) if self._started is not None else 0
+            return len(self._completed) / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def stats(self) -> dict:
+        """Current state of the controller.
+
+        :return: a dictionary containing current 'limit', 'in_flight' and 'throughput', and number of 'successes',
+          'throttles' (calls failed with quota errors) and 'decreases' of the limit.
+        """
+        throughput = self.throughput
+        with self._condition:
+            return dict(self._stats, limit=self.limit, in_flight=self._in_flight, throughput=throughput)
+
+    def call(self, func: Callable, *args, **kwargs):
+        """Calls the function when the number of in-flight calls is below the limit, and adjusts the limit by the
+        outcome. Errors are raised without retry.
+
+        :param func: function to be called.
+        :param args: positional arguments of the function.
+        :param kwargs: keyword arguments of the function.
+        :return: the returned value of the function.
+        """
+        epoch = self._acquire()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self._release(epoch, succeeded=False, throttled=self.classifier(e))
+            raise
+
+        self._release(epoch, succeeded=True, throttled=False)
+        return result
+
+    def map(self, func: Callable, items: Iterable, max_workers: Optional[int] = None) -> list:
+        """Calls the function on each item concurrently under the limit. Calls failed with quota errors are retried
+        with exponential backoff, up to `max_retry` times.
+
+        :param func: function taking one item.
+        :param items: items to be processed.
+        :param max_workers: number of threads. If None, `max_limit` is used.
+        :return: a list of returned values in the order of `items`.
+        """
+        items = list(items)
+        if not items:
+            return []
+
+        policy = RetryPolicy(max_retry=self.max_retry, sleep=self.sleep, max_sleep=MAX_RETRY_SLEEP,
+                             classifier=self.classifier)
+        workers = min(max_workers if max_workers is not None else self.max_limit, len(items))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda item: policy.call(self.call, func, item), items))
+
+    def _acquire(self) -> int:
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+
+            self._in_flight += 1
+            if self._started is None:
+                self._started = time.monotonic()
+            return self._epoch
+
+    def _release(self, epoch: int, succeeded: bool, throttled: bool):
+        with self._condition:
+            self._in_flight -= 1
+            if succeeded:
+                self._stats["successes"] += 1
+                now = time.monotonic()
+                self._completed.append(now)
+                self._trim(now)  # keeps only the calls in the window, even if `throughput` is never read.
+                self._limit = min(self.max_limit, self._limit + self.increase / self._limit)
+            elif throttled:
+                self._stats["throttles"] += 1
+                if epoch == self._epoch:
+                    self._epoch += 1
+                    self._stats["decreases"] += 1
+                    self._limit = max(self.min_limit, self._limit * self.decrease)
+            self._condition.notify_all()
+
+    def _trim(self, now: float):
+        while self._completed and self._completed[0] < now - self.window:
+            self._completed.popleft()
+
+    def _reset(self):
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._epoch = 0
+        self._started = None
+        self._completed = deque()
+        self._stats = {"successes": 0, "throttles": 0, "decreases": 0}
+
+
+def bulk_map(func: Callable, items: Iterable, concurrency: Optional[AdaptiveConcurrency] = None) -> list:
+    """Calls the function on each item, concurrently if a controller is provided.
+
+    :param func: function taking one item.
+    :param items: items to be processed.
+    :param concurrency: an AdaptiveConcurrency object. If None, items are processed sequentially in the current thread.
+    :return: a list of returned values in the order of `items`.
+    """
+    if concurrency is None:
+        return [func(item) for item in items]
+
+    return concurrency.map(func, items)
+
+
+def _reset_after_fork():
+    for controller in list(_CONTROLLERS):
+        controller._reset()
+
+
+register_after_fork(_reset_after_fork)
@@ -0,0 +1,115 @@
+"""Caches discovery documents and built API resources so that creating service clients is cheap.
+"""
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document, Resource
+
+from pysuite.utilities import register_after_fork
+
+MAX_RESOURCES = 256  # max number of cached resources. The least recently used ones are evicted.
+
+_DOCUMENTS = {}
+_RESOURCES = OrderedDict()
+_LOCK = threading.RLock()
+
+
+def get_discovery_document(service: str, version: str) -> str:
+    """Gets the discovery document of the requested API from the static documents bundled with
+    google-api-python-client. The document is read once per process and never fetched from network.
+
+    :param service: name of the API, such as "drive".
+    :param version: version of the API, such as "v3".
+    :return: the discovery document as a json string.
+    """
+    key = (service, version)
+    with _LOCK:
+        document = _DOCUMENTS.get(key)
+        if document is None:
+            document = discovery_cache.get_static_doc(service, version)
+            if document is None:
+                raise ValueError(f"No bundled discovery document found for {service} {version}.")
+
+            _DOCUMENTS[key] = document
+
+    return document
+
+
+def get_resource(service: str, version: str, auth, *path: str, api_endpoint: Optional[str] = None) -> Resource:
+    """Gets a built API resource for the requested service, version and credential.
+
+    Resources are built from the cached discovery document and reused by all callers with the same credential in the
+    current process. If `auth` provides a shared `http` transport, the resource is built on it and shared by all
+    threads. Otherwise a httplib2 transport is created from the credential. Since that is not thread-safe, each thread
+    gets its own resource. At most `MAX_RESOURCES` resources are cached, so resources of credentials or threads no
+    longer used are eventually evicted.
+
+    :example:
+
+    >>> get_resource("gmail", "v1", auth, "users", "messages")  # same as build("gmail", "v1", ...).users().messages()
+
+    :param service: name of the API, such as "drive".
+    :param version: version of the API, such as "v3".
+    :param auth: a pysuite Authentication object.
+    :param path: names of nested resources. Building nested resources is expensive, so they are cached as well.
+    :param api_endpoint: base url of the API, overriding the one in the discovery document. This is useful to send
+      requests to a local stub server. If None, the default endpoint is used.
+    :return: a Resource object for interacting with the API.
+    """
+    http = getattr(auth, "http", None)
+    if http is None:
+        owner, thread = auth.credential, threading.get_ident()
+    else:
+        owner, thread = http, None
+
+    # owners are compared by identity. A thread id may be reused after its thread ends, which is safe since the
+    # resource of the ended thread is no longer used.
+    key = (service, version, owner, thread, api_endpoint, path)
+    with _LOCK:
+        resource = _RESOURCES.get(key)
+        if resource is not None:
+            _RESOURCES.move_to_end(key)
+        else:
+            if path:
+                parent = get_resource(service, version, auth, *path[:-1], api_endpoint=api_endpoint)
+                resource = getattr(parent, path[-1])()
+            else:
+                document = get_discovery_document(service, version)
+                client_options = None if api_endpoint is None else {"api_endpoint": api_endpoint}
+                if http is None:
+                    resource = build_from_document(document, credentials=auth.credential,
+                                                   client_options=client_options)
+                else:
+                    resource = build_from_document(document, http=http, client_options=client_options)
+            _RESOURCES[key] = resource
+            while len(_RESOURCES) > MAX_RESOURCES:
+                _RESOURCES.popitem(last=False)
+
+    return resource
+
+
+def clear_cache(service: Optional[str] = None):
+    """Removes cached resources. Cached discovery documents are kept.
+
+    :param service: name of the API whose resources should be removed. If None, all resources are removed.
+    :return: None
+    """
+    with _LOCK:
+        if service is None:
+            _RESOURCES.clear()
+            return
+
+        for key in [key for key in _RESOURCES if key[0] == service]:
+            del _RESOURCES[key]
+
+
+def _reset_after_fork():
+    # resources built in the parent process hold its connections, and the lock may be held by a parent thread.
+    global _LOCK
+    _LOCK = threading.RLock()
+    _RESOURCES.clear()
+
+
+register_after_fork(_reset_after_fork)
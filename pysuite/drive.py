@@ -1,20 +1,289 @@
 """implement api to access google drive
 """
+import io
+import itertools
+import json
 import logging
+import mmap
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
 from pathlib import PosixPath, Path
-from typing import Union, Optional, List
+from typing import BinaryIO, Callable, Iterable, Iterator, Union, Optional, List, Tuple
 import re
+from urllib.parse import urlsplit, urlunsplit
 
-from googleapiclient.discovery import build
 from googleapiclient.discovery import Resource
-from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
+from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload, MediaUpload
 
+from pysuite import query as queries
 from pysuite.auth import Authentication
-from pysuite.utilities import retry_on_out_of_quota, MAX_RETRY_ATTRIBUTE, SLEEP_ATTRIBUTE
+from pysuite.cache import MetadataCache
+from pysuite.concurrency import AdaptiveConcurrency, bulk_map
+from pysuite.discovery import get_resource
+from pysuite.hashcache import HashCache, file_md5
+from pysuite.instrumentation import set_payload_size
+from pysuite.journal import UploadJournal
+from pysuite.query import Query
+from pysuite.ratelimit import RateLimiter, user_key
+from pysuite.utilities import atomic_write, retry_on_out_of_quota, get_retry_policy, RetryPolicy, \
+    MAX_RETRY_ATTRIBUTE, SLEEP_ATTRIBUTE
 
 
-def _get_client(auth: Authentication, version: str) -> Resource:
-    return build("drive", version, credentials=auth.credential)
+PAGE_SIZE = 1000  # max number of files in a page of files.list
+LIST_FIELDS = ["id", "name", "parents"]
+FOLDER_MIME_TYPE = queries.FOLDER_MIME_TYPE
+MAX_PARENTS_PER_QUERY = 50  # number of folders listed by one files.list query when walking a folder tree
+MAX_NAMES_PER_QUERY = 100  # number of names in folders looked up by one files.list query when resolving paths
+ROOT_ID = "root"  # alias of the root folder of the user's drive
+DOWNLOAD_CHUNK_SIZE = 32 << 20  # bytes of each range request of `download_parallel`
+DOWNLOAD_STATE_INTERVAL = 1  # min seconds between saves of the state file of `download_parallel`
+UPLOAD_CHUNK_SIZE = 32 << 20  # bytes of each request of `upload` and `update`. a multiple of 256KB.
+STREAM_CHUNK_SIZE = 8 << 20  # bytes of each request of `open_read` and `upload_stream`. a multiple of 256KB.
+
+
+def _get_client(auth: Authentication, version: str, *path: str, api_endpoint: Optional[str] = None) -> Resource:
+    return get_resource("drive", version, auth, *path, api_endpoint=api_endpoint)
+
+
+def _children_query(ids: List[str]) -> str:
+    return (queries.any_of(*(queries.in_parents(id) for id in ids)) & queries.trashed(False)).server
+
+
+def _names_query(lookups: List[Tuple[str, str]]) -> str:
+    names = {}  # parent id -> names looked up in it
+    for parent, name in lookups:
+        names.setdefault(parent, []).append(name)
+    query = queries.any_of(*(queries.in_parents(parent) & queries.any_of(*map(queries.name, parent_names))
+                             for parent, parent_names in names.items()))
+    return (query & queries.trashed(False)).server
+
+
+class _RangeReader(io.RawIOBase):
+    """Reads a google drive file with a range request per read."""
+
+    def __init__(self, drive: "Drive", id: str, size: int, chunk_size: int):
+        super().__init__()
+        self._drive = drive
+        self._id = id
+        self._size = size
+        self._chunk_size = chunk_size
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        start = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self._size}[whence]
+        self._position = max(start + offset, 0)
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        end = min(self._position + len(buffer), self._size)
+        if end <= self._position:
+            return 0
+        content = self._drive._download_range(self._id, self._position, end - 1)
+        buffer[:len(content)] = content
+        self._position = end
+        return len(content)
+
+    def readall(self) -> bytes:
+        # the rest of the file is requested in ranges of `chunk_size` bytes, not `io.DEFAULT_BUFFER_SIZE` bytes.
+        chunks = []
+        while self._position < self._size:
+            end = min(self._position + self._chunk_size, self._size)
+            chunks.append(self._drive._download_range(self._id, self._position, end - 1))
+            self._position = end
+        return b"".join(chunks)
+
+
+class _StreamUpload(MediaUpload):
+    """Media of unknown size read once from a stream, keeping only the chunk being uploaded in memory.
+
+    One buffer of `chunk_size` bytes is allocated and reused by every chunk, and `getbytes` returns a view of it. The
+    buffer is only reallocated if a chunk longer than the buffer is requested.
+    """
+
+    def __init__(self, stream: Union[BinaryIO, Iterable[bytes], bytes], mimetype: str, chunk_size: int):
+        if isinstance(stream, (bytes, bytearray, memoryview)):
+            stream = io.BytesIO(stream)
+        self._read = stream.read if hasattr(stream, "read") else _iterator_reader(iter(stream))
+        self._mimetype = mimetype
+        self._chunk_size = chunk_size
+        self._buffer = bytearray(chunk_size)
+        self._length = 0  # number of bytes in the buffer, read from the stream from `_start`.
+        self._start = 0
+
+    @property
+    def position(self) -> int:
+        """Number of bytes read from the stream."""
+        return self._start + self._length
+
+    def chunksize(self) -> int:
+        return self._chunk_size
+
+    def mimetype(self) -> str:
+        return self._mimetype
+
+    def resumable(self) -> bool:
+        return True
+
+    def getbytes(self, begin: int, length: int) -> memoryview:
+        if begin < self._start:
+            raise ValueError(f"Bytes from {begin} were uploaded and cannot be read again from the stream")
+        # bytes not received by the server yet are moved to the front of the buffer, in place.
+        received = min(begin - self._start, self._length)
+        self._buffer[:self._length - received] = self._buffer[received:self._length]
+        self._length -= received
+        self._start = begin
+        if length > len(self._buffer):
+            self._buffer = self._buffer[:self._length] + bytearray(length - self._length)
+        while self._length < length:
+            content = self._read(length - self._length)
+            if not content:
+                break
+            self._buffer[self._length:self._length + len(content)] = content
+            self._length += len(content)
+        return memoryview(self._buffer)[:min(length, self._length)]
+
+    def to_json(self):
+        """Stream uploads cannot be serialized, because the stream is read once and bytes sent before are not kept. For
+        the same reason, they are not recorded in an upload journal and cannot be resumed by another process.
+        """
+        raise TypeError("Stream uploads cannot be serialized, because the stream cannot be read again")
+
+
+def _iterator_reader(chunks: Iterator[bytes]) -> Callable[[int], bytes]:
+    leftover = b""
+
+    def read(size: int) -> bytes:
+        nonlocal leftover
+        content = leftover or next((chunk for chunk in chunks if chunk), b"")
+        leftover = content[size:]
+        return content[:size]
+
+    return read
+
+
+def _load_state(path: Path) -> Optional[dict]:
+    try:
+        with open(path, "r") as fp:
+            return json.load(fp)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _save_state(path: Path, state: dict):
+    # the state is replaced atomically, so that a crash never leaves a partial state file.
+    atomic_write(path, json.dumps(state))
+
+
+class _TransferProgress:
+    """Counts files and bytes transferred by a folder transfer and reports them to a callback."""
+
+    def __init__(self, total_files: int, total_bytes: int, callback: Optional[Callable[[dict], None]]):
+        self.callback = callback
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._stats = {"files": 0, "failed": 0, "bytes": 0, "total_files": total_files, "total_bytes": total_bytes}
+
+    @property
+    def report(self) -> dict:
+        with self._lock:
+            elapsed = time.monotonic() - self._started
+            return dict(self._stats, seconds=elapsed, throughput=self._stats["bytes"] / elapsed if elapsed > 0 else 0.0)
+
+    def add(self, size: int, failed: bool = False):
+        with self._lock:
+            self._stats["failed" if failed else "files"] += 1
+            if not failed:
+                self._stats["bytes"] += size
+        if self.callback is not None:
+            self.callback(self.report)
+
+
+def _split_path(path: str) -> Tuple[str, ...]:
+    parts = tuple(part for part in path.split("/") if part not in ("", "."))
+    if ".." in parts:
+        raise ValueError(f"path cannot contain '..'. Got {path}")
+    return parts
+
+
+def _parent_paths(path: str) -> List[str]:
+    parts = path.split("/")
+    return ["/".join(parts[:i]) for i in range(1, len(parts))]
+
+
+def _local_tree(local_dir: Path) -> Tuple[List[str], dict]:
+    # relative paths, such as "folder/file.txt", of folders and of files mapped to their stats.
+    folders = []
+    files = {}
+    for root, dirnames, filenames in os.walk(str(local_dir)):
+        relative = os.path.relpath(root, str(local_dir))
+        prefix = "" if relative == "." else Path(relative).as_posix() + "/"
+        folders.extend(prefix + dirname for dirname in sorted(dirnames))
+        for filename in sorted(filenames):
+            files[prefix + filename] = os.stat(os.path.join(root, filename))
+    return folders, files
+
+
+def _remote_tree(files: List[dict]) -> Tuple[dict, dict, List[str]]:
+    # folders and files with binary content listed by `walk`, mapped by their paths, and paths of skipped files: Google
+    # Docs files, files whose names cannot be local file names, files in those folders and files of a duplicate path.
+    folders = {}
+    binaries = {}
+    skipped = []
+    invalid = set()  # ids of skipped folders, whose content is skipped too.
+    for file in files:
+        if file["name"] in ("", ".", "..") or "/" in file["name"] or invalid.intersection(file.get("parents", [])):
+            invalid.add(file["id"])
+            skipped.append(file["path"])
+        elif file["mimeType"] == FOLDER_MIME_TYPE:
+            folders[file["path"]] = file["id"]
+        elif "size" not in file or file["path"] in binaries:
+            skipped.append(file["path"])
+        else:
+            binaries[file["path"]] = file
+    return folders, binaries, skipped
+
+
+def _make_dirs(local_dir: Path, paths: Iterable[str], errors: dict) -> set:
+    # directories are created parents first. a directory that cannot be created fails the directories in it too.
+    made = {""}
+    for path in sorted(paths, key=lambda path: path.count("/")):
+        parent = path.rpartition("/")[0]
+        if parent not in made:
+            errors[path] = errors[parent]
+            continue
+        try:
+            (local_dir / path).mkdir(exist_ok=True)
+            made.add(path)
+        except OSError as e:
+            errors[path] = e
+    return made
+
+
+def _pending(paths: List[str], folders: Union[dict, set], errors: dict, tracker: Optional[_TransferProgress] = None,
+             sizes: Optional[dict] = None) -> List[str]:
+    # paths whose parent folder does not exist fail with the error of their parent folder.
+    pending = []
+    for path in paths:
+        parent = path.rpartition("/")[0]
+        if parent in folders:
+            pending.append(path)
+            continue
+        errors[path] = errors[parent]
+        if tracker is not None:
+            tracker.add(sizes[path], failed=True)
+    return pending
 
 
 class Drive:
@@ -23,12 +292,71 @@ class Drive:
     :param auth: an authorized Google Drive service client.
     :param max_retry: max number of retry on quota exceeded error. if 0 or less, no retry will be attempted.
     :param sleep: base number of seconds between retries. the sleep time is exponentially increased after each retry.
+    :param api_endpoint: base url of Google Drive API, such as "http://localhost:8080/drive/v3/". If None, the
+      default Google endpoint is used.
+    :param retry_policy: a RetryPolicy object deciding which errors are retried and how long to wait. If provided,
+      `max_retry` and `sleep` are ignored. Its `stats` shows retries made by this object. If None, a policy is built
+      from `max_retry` and `sleep`, which can be changed later. See `pysuite.utilities.get_retry_policy`. Calls that
+      create objects, such as `create_folder`, are only retried on quota errors, so that they never create duplicates.
+    :param rate_limiter: a RateLimiter object pacing requests under the per user quota of Google Drive API, such as
+      `pysuite.ratelimit.get_rate_limiter()` shared by the whole process. If None, requests are not rate limited. Chunks
+      of media transfers are charged to the "media" operation class, which has no default quota.
+    :param concurrency: an AdaptiveConcurrency object running bulk operations, such as recursive `list`, concurrently
+      under a limit adapted to quota errors. If None, bulk operations run sequentially.
+    :param cache: a MetadataCache object caching results of `get_id` and `get_name`. Entries affected by `upload`,
+      `update`, `copy`, `delete` and `create_folder` of this object are invalidated. If None, nothing is cached.
+    :param upload_journal: an UploadJournal object recording sessions of `upload` and `update`, so that an upload of the
+      same file started again after a crash continues from the bytes committed by the server. Retries of this object
+      continue the same way. If None, uploads start over.
+
+    Drive objects are thread-safe. One object can be shared by many threads, which send requests through the pooled
+    transport of `auth` concurrently. Drive objects can also be pickled and used after `os.fork()`. The API client is
+    rebuilt lazily in the new process.
     """
 
-    def __init__(self, auth: Authentication, version: str = "v3", max_retry: int = 0, sleep: int = 5):
-        self._client = _get_client(auth, version)
+    def __init__(self, auth: Authentication, version: str = "v3", max_retry: int = 0, sleep: int = 5,
+                 api_endpoint: Optional[str] = None, retry_policy: Optional[RetryPolicy] = None,
+                 rate_limiter: Optional[RateLimiter] = None, concurrency: Optional[AdaptiveConcurrency] = None,
+                 cache: Optional[MetadataCache] = None, upload_journal: Optional[UploadJournal] = None):
+        self._auth = auth
+        self._version = version
+        self._api_endpoint = api_endpoint
         setattr(self, MAX_RETRY_ATTRIBUTE, max_retry)
         setattr(self, SLEEP_ATTRIBUTE, sleep)
+        self.retry_policy = retry_policy
+        self.rate_limiter = rate_limiter
+        self.concurrency = concurrency
+        self.cache = cache
+        self.upload_journal = upload_journal
+        self._root_id = None
+
+    @property
+    def _client(self) -> Resource:
+        # resources are cached per process by pysuite.discovery, so this is cheap and safe after fork or unpickling.
+        return _get_client(self._auth, self._version, api_endpoint=self._api_endpoint)
+
+    @property
+    def _files(self) -> Resource:
+        return _get_client(self._auth, self._version, "files", api_endpoint=self._api_endpoint)
+
+    @property
+    def _permissions(self) -> Resource:
+        return _get_client(self._auth, self._version, "permissions", api_endpoint=self._api_endpoint)
+
+    def _limit(self, cost: int = 1, operation: str = "query"):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire("drive", user_key(self._auth), operation, cost=cost)
+
+    def _execute(self, request):
+        self._limit()
+        return request.execute()
+
+    def _with_media_endpoint(self, request):
+        # googleapiclient replaces only the host of media upload urls with the one of `api_endpoint`, not the scheme.
+        if self._api_endpoint is not None:
+            endpoint = urlsplit(self._api_endpoint)
+            request.uri = urlunsplit(urlsplit(request.uri)._replace(scheme=endpoint.scheme, netloc=endpoint.netloc))
+        return request
 
     @retry_on_out_of_quota()
     def download(self, id: str, to_file: Union[str, PosixPath]):
@@ -38,17 +366,218 @@ class Drive:
         :param to_file: local file path.
         :return: None
         """
-        request = self._client.files().get_media(fileId=id)
+        request = self._files.get_media(fileId=id)
         with open(to_file, 'wb') as fh:
             downloader = MediaIoBaseDownload(fh, request)
             done = False
             while not done:
+                self._limit(operation="media")
                 status, done = downloader.next_chunk()
-                logging.info(f"Download {status.progress()*100}%")
+                logging.debug(f"Download {status.progress()*100}%")
+            set_payload_size(fh.tell())
+
+    def download_parallel(self, id: str, to_file: Union[str, PosixPath], chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+                          workers: int = 4, memory_map: bool = False, verify: bool = True):
+        """Downloads the google drive file with concurrent range requests of `chunk_size` bytes, which is faster than
+        `download` for large files.
+
+        The local file is allocated to the full size first, and each chunk is written at its offset. Completed chunks
+        are recorded in a state file next to the local file, "<to_file>.download", at most every
+        `DOWNLOAD_STATE_INTERVAL` seconds and when the download fails, so that calling this method again after a failure
+        only downloads the remaining chunks, as long as the remote file has not changed. Each chunk is retried on its
+        own according to the retry policy. Once a chunk fails, chunks not started are cancelled. The state file is
+        removed once the download is complete. If the checksum does not match, the local file is removed as well.
+
+        :param id: id of the google drive file. Google Docs files, which have no binary content, cannot be downloaded.
+        :param to_file: local file path.
+        :param chunk_size: number of bytes of each range request. At most `chunk_size * workers` bytes are kept in
+          memory.
+        :param workers: number of concurrent range requests.
+        :param memory_map: if True, chunks are copied into a memory map of the local file instead of written to it.
+        :param verify: if True, the md5 checksum of the local file is compared to the one of the google drive file.
+        :return: None
+        """
+        if chunk_size < 1 or workers < 1:
+            raise ValueError(f"chunk_size and workers must be positive. Got {chunk_size} and {workers}")
+
+        to_file = Path(to_file)
+        state_file = to_file.with_name(to_file.name + ".download")
+        metadata = self._get_metadata(id, ["size", "md5Checksum"])
+        if "size" not in metadata:
+            raise ValueError(f"File {id} has no binary content. Google Docs files need to be exported.")
+
+        size = int(metadata["size"])
+        state = {"id": id, "size": size, "md5Checksum": metadata.get("md5Checksum"), "chunk_size": chunk_size}
+        saved = _load_state(state_file)
+        completed = set()
+        if saved is not None and all(saved.get(key) == value for key, value in state.items()) and \
+                to_file.exists() and to_file.stat().st_size == size:
+            completed = set(saved["completed"])
+        else:
+            with open(to_file, "wb") as fp:
+                fp.truncate(size)
+
+        offsets = [offset for offset in range(0, size, chunk_size) if offset not in completed]
+        lock = threading.Lock()
+        saved_at = time.monotonic()
+        with open(to_file, "r+b") as fp:
+            view = mmap.mmap(fp.fileno(), size) if memory_map and size else None
+
+            def save():
+                # chunks are flushed to the file before they are recorded as completed.
+                if view is not None:
+                    view.flush()
+                else:
+                    fp.flush()
+                _save_state(state_file, dict(state, completed=sorted(completed)))
+
+            def download_chunk(offset: int):
+                nonlocal saved_at
+                content = self._download_range(id, offset, min(offset + chunk_size, size) - 1)
+                with lock:
+                    if view is not None:
+                        view[offset:offset + len(content)] = content
+                    else:
+                        fp.seek(offset)
+                        fp.write(content)
+                    completed.add(offset)
+                    if time.monotonic() - saved_at >= DOWNLOAD_STATE_INTERVAL:
+                        save()
+                        saved_at = time.monotonic()
+
+            try:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    futures = [executor.submit(download_chunk, offset) for offset in offsets]
+                    done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+                    failed = [future for future in futures if future in done and future.exception() is not None]
+                    if failed:
+                        # chunks not started are cancelled, so that only the chunks in progress are waited for.
+                        for future in futures:
+                            future.cancel()
+                        failed[0].result()
+            except BaseException:
+                save()
+                raise
+            finally:
+                if view is not None:
+                    view.close()
+
+        if verify and state["md5Checksum"] is not None and file_md5(to_file) != state["md5Checksum"]:
+            for path in (state_file, to_file):
+                if path.exists():
+                    os.unlink(str(path))
+            raise RuntimeError(f"md5 checksum of {to_file} does not match the one of file {id}.")
+        if state_file.exists():
+            os.unlink(str(state_file))
+        set_payload_size(size)
+
+    def open_read(self, id: str, chunk_size: int = STREAM_CHUNK_SIZE) -> io.BufferedReader:
+        """Opens the google drive file for reading, without writing it to a local file. Content is requested in range
+        requests of `chunk_size` bytes as it is read, so at most one chunk is kept in memory, and the reader can seek.
+
+        :example:
+
+        >>> with drive.open_read(id) as fp:
+        ...     df = pd.read_csv(fp)
+
+        :param id: id of the google drive file. Google Docs files, which have no binary content, cannot be read.
+        :param chunk_size: number of bytes of each range request, which is the size of the buffer of the reader.
+        :return: a buffered binary reader.
+        """
+        return io.BufferedReader(self._open_range_reader(id, chunk_size), buffer_size=chunk_size)
+
+    def iter_download(self, id: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+        """Iterates over the content of the google drive file in chunks of up to `chunk_size` bytes.
+
+        :param id: id of the google drive file.
+        :param chunk_size: number of bytes of each chunk.
+        :return: an iterator of bytes.
+        """
+        with self._open_range_reader(id, chunk_size) as raw:
+            yield from iter(lambda: raw.read(chunk_size), b"")
+
+    def _open_range_reader(self, id: str, chunk_size: int) -> "_RangeReader":
+        metadata = self._get_metadata(id, ["size"])
+        if "size" not in metadata:
+            raise ValueError(f"File {id} has no binary content. Google Docs files need to be exported.")
+        return _RangeReader(self, id, int(metadata["size"]), chunk_size)
+
+    @retry_on_out_of_quota(idempotent=False)
+    def upload_stream(self, stream: Union[BinaryIO, Iterable[bytes], bytes], name: str,
+                      mimetype: str = "application/octet-stream", parent_id: Optional[str] = None,
+                      chunk_size: int = STREAM_CHUNK_SIZE) -> str:
+        """Uploads the content of a binary stream, such as a file-like object, an iterator of bytes or bytes, to Google
+        Drive with a resumable upload of `chunk_size` bytes per request. The stream is read once, so it need not be
+        seekable and its size need not be known, and at most one chunk is kept in memory.
+
+        A failed chunk is retried within the same session. The upload is only retried as a whole by the retry policy if
+        it fails before the stream is read. Unlike `upload`, stream uploads are not recorded in `upload_journal`, since
+        bytes read from the stream before a crash cannot be read again to resume the session.
+
+        :example:
+
+        >>> drive.upload_stream(df.to_csv(index=False).encode(), name="data.csv", mimetype="text/csv")
+
+        :param stream: an object with a `read` method, an iterable of bytes or bytes.
+        :param name: name of google drive file.
+        :param mimetype: Mime-type of the file.
+        :param parent_id: id of the folder you want to upload the file to. If None, it will be uploaded to root of
+          Google drive.
+        :param chunk_size: number of bytes of each request. It must be a multiple of 256KB.
+        :return: id of the uploaded file.
+        """
+        file_metadata = {"name": name}
+        if parent_id is not None:
+            file_metadata["parents"] = parent_id
+        media = _StreamUpload(stream, mimetype, chunk_size)
+        file = self._upload_chunks(self._files.create(body=file_metadata, media_body=media, fields="id"), media)
+        self._cache_created(file.get("id"), name)
+        return file.get("id")
+
+    @retry_on_out_of_quota(idempotent=False)  # the stream cannot be read again after a transient error.
+    def update_stream(self, id: str, stream: Union[BinaryIO, Iterable[bytes], bytes],
+                      mimetype: str = "application/octet-stream", chunk_size: int = STREAM_CHUNK_SIZE):
+        """Updates the Google drive file with the content of a binary stream. See `upload_stream`.
+
+        :param id: id of the Google drive file to be updated.
+        :param stream: an object with a `read` method, an iterable of bytes or bytes.
+        :param mimetype: Mime-type of the file.
+        :param chunk_size: number of bytes of each request. It must be a multiple of 256KB.
+        :return: None
+        """
+        media = _StreamUpload(stream, mimetype, chunk_size)
+        self._upload_chunks(self._files.update(body=dict(), fileId=id, media_body=media), media)
+        if self.cache is not None:
+            self.cache.invalidate(("file", id))
+
+    def _upload_chunks(self, request, media: "_StreamUpload") -> dict:
+        # the stream cannot be read again, so chunks are retried by googleapiclient instead of the retry policy.
+        request = self._with_media_endpoint(request)
+        response = None
+        while response is None:
+            # the first request starts the upload session. The others send chunks.
+            self._limit(operation="query" if request.resumable_uri is None else "media")
+            _, response = request.next_chunk(num_retries=get_retry_policy(self).max_retry)
+        set_payload_size(media.position)
+        return response
 
     @retry_on_out_of_quota()
+    def _download_range(self, id: str, start: int, end: int) -> bytes:
+        request = self._files.get_media(fileId=id)
+        request.headers["range"] = f"bytes={start}-{end}"
+        self._limit(operation="media")
+        content = request.execute()
+        if len(content) != end - start + 1:
+            raise ConnectionError(f"Expecting {end - start + 1} bytes from {start} of file {id}. Got {len(content)}")
+        return content
+
+    @retry_on_out_of_quota()
+    def _get_metadata(self, id: str, fields: List[str]) -> dict:
+        return self._execute(self._files.get(fileId=id, fields=",".join(fields)))
+
+    @retry_on_out_of_quota(idempotent=False)
     def upload(self, from_file: Union[str, PosixPath], name: Optional[str] = None, mimetype: Optional[str] = None,
-               parent_id: Optional[str] = None) -> str:
+               parent_id: Optional[str] = None, chunk_size: int = UPLOAD_CHUNK_SIZE) -> str:
         """Uploads local file to Google Drive.
 
         :param from_file: path to local file.
@@ -56,6 +585,8 @@ class Drive:
         :param mimetype: Mime-type of the file. If None then a mime-type will be guessed from the file extension.
         :param parent_id: id of the folder you want to upload the file to. If None, it will be uploaded to
           root of Google drive.
+        :param chunk_size: number of bytes of each request, a multiple of 256KB. Larger chunks take fewer requests,
+          while smaller chunks lose less progress on failure.
         :return: id of the uploaded file.
         """
         file_metadata = {'name': name if name is not None else Path(from_file).name}
@@ -65,25 +596,354 @@ class Drive:
 
         media = MediaFileUpload(str(from_file),
                                 mimetype=mimetype,
+                                chunksize=chunk_size,
                                 resumable=True)
+        set_payload_size(media.size())
 
-        file = self._client.files().create(body=file_metadata,
-                                           media_body=media,
-                                           fields='id').execute()
+        key = json.dumps(["create", str(Path(from_file).resolve()), file_metadata["name"], parent_id])
+        file = self._upload_file(self._files.create(body=file_metadata, media_body=media, fields='id'), from_file,
+                                 key)
+        self._cache_created(file.get("id"), file_metadata["name"])
         return file.get("id")
 
     @retry_on_out_of_quota()
-    def update(self, id: str, from_file: Union[str, PosixPath]):
+    def update(self, id: str, from_file: Union[str, PosixPath], chunk_size: int = UPLOAD_CHUNK_SIZE):
         """Updates the Google drive with a local file.
 
         :param id: id of the Google drive file to be updated.
         :param from_file: path to the local file.
+        :param chunk_size: number of bytes of each request, a multiple of 256KB. See `upload`.
         :return: None
         """
         media = MediaFileUpload(str(from_file),
+                                chunksize=chunk_size,
                                 resumable=True)
+        set_payload_size(media.size())
+
+        key = json.dumps(["update", str(Path(from_file).resolve()), id])
+        self._upload_file(self._files.update(body=dict(), fileId=id, media_body=media), from_file, key)
+        if self.cache is not None:
+            self.cache.invalidate(("file", id))
+
+    def _upload_file(self, request, from_file: Union[str, PosixPath], key: str) -> dict:
+        request = self._with_media_endpoint(request)
+        journal = self.upload_journal
+        if journal is not None:
+            session = journal.get(key, from_file)
+            if session is not None:
+                response = self._resume_session(request, session["uri"], request.resumable.size())
+                if response is not None:
+                    journal.remove(key)
+                    return response
+
+        # chunks are sent to the same session, so they are safely retried even if the upload creates a file.
+        response = None
+        while response is None:
+            self._limit(operation="query" if request.resumable_uri is None else "media")
+            _, response = request.next_chunk(num_retries=get_retry_policy(self).max_retry)
+            if journal is not None and response is None:
+                journal.save(key, from_file, request.resumable_uri, request.resumable_progress)
+        if journal is not None:
+            journal.remove(key)
+        return response
+
+    def _resume_session(self, request, uri: str, size: int) -> Optional[dict]:
+        # the server tells how many bytes it has committed in response to an empty request.
+        self._limit()
+        response, content = request.http.request(uri, "PUT", headers={"Content-Range": f"bytes */{size}",
+                                                                      "Content-Length": "0"})
+        if response.status in (200, 201):
+            return request.postproc(response, content)
+        if response.status == 308:
+            committed = response.get("range")
+            request.resumable_uri = uri
+            request.resumable_progress = int(committed.rsplit("-", 1)[1]) + 1 if committed else 0
+            logging.info(f"Resume upload from byte {request.resumable_progress} of {size}")
+        # otherwise the session has expired, and a new one is started.
+        return None
+
+    def upload_folder(self, local_dir: Union[str, PosixPath], parent_id: Optional[str] = None,
+                      name: Optional[str] = None, workers: int = 4,
+                      progress: Optional[Callable[[dict], None]] = None) -> dict:
+        """Uploads the local directory and everything under it to a new Google Drive folder.
+
+        Folders are created level by level, the folders of a level concurrently, and then files are uploaded by a pool
+        of `workers` threads. Each file is retried on its own according to the retry policy. A file that still fails, or
+        whose folder could not be created, is reported in "errors" without stopping the transfer of other files.
 
-        self._client.files().update(body=dict(), fileId=id, media_body=media).execute()
+        :example:
+
+        >>> result = drive.upload_folder("reports", parent_id=folder_id, workers=8,
+        ...                              progress=lambda p: print(f"{p['files']}/{p['total_files']} files"))
+        >>> result["errors"]
+        {}
+
+        :param local_dir: path to the local directory.
+        :param parent_id: id of the folder the new folder is created in. If None, it is created in the root of Google
+          drive.
+        :param name: name of the new folder. If None, the name of the local directory is used.
+        :param workers: max number of concurrent requests.
+        :param progress: a function called after each file with a dictionary of progress, containing the counters of
+          the returned dictionary.
+        :return: a dictionary containing "id" of the new folder, "uploaded" mapping relative paths of uploaded files,
+          such as "folder/file.txt", to their ids, "errors" mapping relative paths of failed files and folders to
+          exceptions, and number of "files" uploaded, files "failed", "bytes" uploaded, "total_files", "total_bytes",
+          "seconds" elapsed and "throughput" in bytes per second.
+        """
+        local_dir = Path(local_dir)
+        if not local_dir.is_dir():
+            raise NotADirectoryError(f"{local_dir} is not a directory")
+        if workers < 1:
+            raise ValueError(f"workers must be positive. Got {workers}")
+
+        local_folders, local_files = _local_tree(local_dir)
+        folders = {"": self.create_folder(name if name is not None else local_dir.name,
+                                          [parent_id] if parent_id is not None else None)}
+        errors = {}
+        self._create_folders(local_folders, folders, errors, workers)
+        uploaded, report = self._send_files(local_dir, local_files, folders, {}, errors, workers, progress)
+
+        logging.info(f"Uploaded {report['files']} files, {report['bytes']} bytes in {report['seconds']:.1f} seconds "
+                     f"from {local_dir}. {report['failed']} files failed.")
+        return dict(report, id=folders[""], uploaded=uploaded, errors=errors)
+
+    def download_folder(self, folder_id: str, local_dir: Union[str, PosixPath], workers: int = 4,
+                        progress: Optional[Callable[[dict], None]] = None) -> dict:
+        """Downloads the google drive folder and everything under it to the local directory, which is created if it does
+        not exist. Existing local files of the same paths are overwritten.
+
+        The folder tree is listed level by level by `walk` and local directories are created, and then files are
+        downloaded by a pool of `workers` threads. Each file is retried on its own according to the retry policy. A file
+        that still fails is reported in "errors" without stopping the transfer of other files, and the local file of
+        the same path, if any, is kept.
+
+        :param folder_id: id of the google drive folder.
+        :param local_dir: path to the local directory.
+        :param workers: max number of concurrent requests.
+        :param progress: a function called after each file with a dictionary of progress. See `upload_folder`.
+        :return: a dictionary containing "downloaded" mapping relative paths of downloaded files to their ids, "errors"
+          mapping relative paths to exceptions, "skipped" relative paths of Google Docs files, which have no binary
+          content, and of files whose names cannot be local file names, and the counters returned by `upload_folder`.
+        """
+        if workers < 1:
+            raise ValueError(f"workers must be positive. Got {workers}")
+
+        local_dir = Path(local_dir)
+        local_dir.mkdir(parents=True, exist_ok=True)
+        remote_folders, remote_files, skipped = _remote_tree(self.walk(folder_id, fields=["size"]))
+        errors = {}
+        made = _make_dirs(local_dir, remote_folders, errors)
+        downloaded, report = self._receive_files(local_dir, remote_files, made, errors, workers, progress)
+
+        logging.info(f"Downloaded {report['files']} files, {report['bytes']} bytes in {report['seconds']:.1f} seconds "
+                     f"to {local_dir}. {report['failed']} files failed.")
+        return dict(report, downloaded=downloaded, errors=errors, skipped=skipped)
+
+    def sync(self, local_dir: Union[str, PosixPath], folder_id: str, direction: str = "upload", delete: bool = False,
+             dry_run: bool = False, workers: int = 4, hash_cache: Optional[HashCache] = None,
+             progress: Optional[Callable[[dict], None]] = None) -> dict:
+        """Makes the google drive folder a copy of the local directory if `direction` is "upload", or the local
+        directory a copy of the google drive folder if it is "download", transferring only files that differ.
+
+        A file differs if it is missing at the destination, or its size or md5 checksum differs from the `size` and
+        `md5Checksum` of the google drive file. Local files are only hashed if their sizes are the same, and checksums
+        are kept in `hash_cache` by path, size and modification time, so that unchanged files are not hashed again by
+        later calls. A google drive file without checksum differs if the source is modified later than the destination,
+        by its `modifiedTime`. Google Docs files are ignored. A path that is a file on one side and a folder on the
+        other is a conflict. It is reported in "errors" and left as is, with everything in it.
+
+        :example:
+
+        >>> hashes = HashCache("/tmp/report_hashes.sqlite")
+        >>> plan = drive.sync("reports", folder_id, delete=True, dry_run=True, hash_cache=hashes)
+        >>> plan["create"], plan["update"], plan["delete"]
+        >>> result = drive.sync("reports", folder_id, delete=True, hash_cache=hashes)
+
+        :param local_dir: path to the local directory.
+        :param folder_id: id of the google drive folder.
+        :param direction: "upload" to copy the local directory to google drive, or "download" to copy the google drive
+          folder to local.
+        :param delete: if True, files and folders at the destination that are not at the source are deleted. Google
+          drive files are deleted permanently, not moved to trash.
+        :param dry_run: if True, nothing is transferred or deleted, and only the plan is returned.
+        :param workers: max number of concurrent requests and hashed files.
+        :param hash_cache: a HashCache object keeping checksums of local files, such as one of a database file used by
+          every call. If None, local files are hashed in each call.
+        :param progress: a function called after each file with a dictionary of progress. See `upload_folder`.
+        :return: a dictionary of the plan, containing relative paths of files to "create" and "update" at the
+          destination, files and folders to "delete", of which only the top folder of a deleted tree is listed,
+          "folders" to create, files "unchanged" and "conflicts". Unless `dry_run` is True, it also contains "errors"
+          and the counters returned by `upload_folder`.
+        """
+        if direction not in ("upload", "download"):
+            raise ValueError(f"direction must be 'upload' or 'download'. Got {direction}")
+        if workers < 1:
+            raise ValueError(f"workers must be positive. Got {workers}")
+
+        local_dir = Path(local_dir)
+        if direction == "upload" and not local_dir.is_dir():
+            raise NotADirectoryError(f"{local_dir} is not a directory")
+
+        local_folders, local_files = _local_tree(local_dir) if local_dir.is_dir() else ([], {})
+        remote_folders, remote_files, _ = _remote_tree(
+            self.walk(folder_id, fields=["size", "md5Checksum", "modifiedTime"]))
+        if direction == "upload":
+            source_folders, source_files, target_folders, target_files = \
+                local_folders, local_files, remote_folders, remote_files
+        else:
+            source_folders, source_files, target_folders, target_files = \
+                remote_folders, remote_files, local_folders, local_files
+
+        cache = hash_cache if hash_cache is not None else HashCache()
+
+        def differs(path: str) -> bool:
+            stat, file = local_files[path], remote_files[path]
+            if stat.st_size != int(file["size"]):
+                return True
+            if file.get("md5Checksum"):
+                return cache.md5(local_dir / path) != file["md5Checksum"]
+            remote_time = queries.parse_time(file["modifiedTime"]).timestamp()
+            return stat.st_mtime > remote_time if direction == "upload" else remote_time > stat.st_mtime
+
+        # conflicting paths, and paths under them, are neither transferred nor deleted.
+        conflicts = {path for path in source_files if path in target_folders} | \
+            {path for path in source_folders if path in target_files}
+        if conflicts:
+            def syncable(path: str) -> bool:
+                return path not in conflicts and not any(parent in conflicts for parent in _parent_paths(path))
+
+            source_folders = [path for path in source_folders if syncable(path)]
+            target_folders = [path for path in target_folders if syncable(path)]
+            source_files = {path: file for path, file in source_files.items() if syncable(path)}
+            target_files = {path: file for path, file in target_files.items() if syncable(path)}
+
+        common = sorted(path for path in source_files if path in target_files)
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                changed = {path for path, flag in zip(common, executor.map(differs, common)) if flag}
+        finally:
+            if hash_cache is None:
+                cache.close()
+
+        deleted = []
+        if delete:
+            # a deleted folder takes everything in it, so only the top folder of a deleted tree is listed.
+            extraneous = {path for path in target_folders if path not in source_folders}
+            for path in sorted(extraneous | {path for path in target_files if path not in source_files}):
+                if not any(parent in extraneous for parent in _parent_paths(path)):
+                    deleted.append(path)
+        plan = {"create": sorted(path for path in source_files if path not in target_files),
+                "update": [path for path in common if path in changed],
+                "delete": deleted,
+                "folders": sorted(path for path in source_folders if path not in target_folders),
+                "unchanged": [path for path in common if path not in changed],
+                "conflicts": sorted(conflicts)}
+        if dry_run:
+            return plan
+
+        errors = {path: FileExistsError(f"{path} is a {'file' if path in local_files else 'folder'} locally and a "
+                                        f"{'file' if path in remote_files else 'folder'} in google drive")
+                  for path in plan["conflicts"]}
+        transferred = plan["create"] + plan["update"]
+        if direction == "upload":
+            folders = dict(remote_folders, **{"": folder_id})
+            self._create_folders(plan["folders"], folders, errors, workers)
+            ids = {path: remote_files[path]["id"] for path in plan["update"]}
+            _, report = self._send_files(local_dir, {path: local_files[path] for path in transferred}, folders, ids,
+                                         errors, workers, progress)
+            deletes = {path: remote_files[path]["id"] if path in remote_files else remote_folders[path]
+                       for path in deleted}
+            _, failed = self._transfer(lambda path: self.delete(deletes[path]), deleted, workers)
+            errors.update(failed)
+        else:
+            local_dir.mkdir(parents=True, exist_ok=True)
+            made = _make_dirs(local_dir, source_folders, errors)
+            _, report = self._receive_files(local_dir, {path: remote_files[path] for path in transferred}, made,
+                                            errors, workers, progress)
+            for path in deleted:
+                try:
+                    if path in local_folders:
+                        shutil.rmtree(str(local_dir / path))
+                    else:
+                        os.unlink(str(local_dir / path))
+                except OSError as e:
+                    errors[path] = e
+
+        logging.info(f"Synced {local_dir} and folder {folder_id}: {len(plan['create'])} created, "
+                     f"{len(plan['update'])} updated, {len(deleted)} deleted and {len(plan['unchanged'])} unchanged. "
+                     f"{len(errors)} failed.")
+        return dict(plan, errors=errors, **report)
+
+    def _create_folders(self, paths: List[str], folders: dict, errors: dict, workers: int):
+        # a folder needs the id of its parent, so folders are created level by level.
+        levels = {}
+        for path in paths:
+            levels.setdefault(path.count("/"), []).append(path)
+        for depth in sorted(levels):
+            created, failed = self._transfer(
+                lambda path: self.create_folder(path.rpartition("/")[2], [folders[path.rpartition("/")[0]]]),
+                _pending(levels[depth], folders, errors), workers)
+            folders.update(created)
+            errors.update(failed)
+
+    def _send_files(self, local_dir: Path, files: dict, folders: dict, ids: dict, errors: dict, workers: int,
+                    progress: Optional[Callable[[dict], None]]) -> Tuple[dict, dict]:
+        # files of `ids` are updated, and the others are uploaded to the folder of their parent path.
+        sizes = {path: stat.st_size for path, stat in files.items()}
+        tracker = _TransferProgress(len(files), sum(sizes.values()), progress)
+
+        def send(path: str) -> str:
+            if path in ids:
+                self.update(ids[path], local_dir / path)
+                return ids[path]
+            return self.upload(local_dir / path, parent_id=folders[path.rpartition("/")[0]])
+
+        sent, failed = self._transfer(send, _pending(list(files), folders, errors, tracker, sizes), workers, tracker,
+                                      sizes)
+        errors.update(failed)
+        return sent, tracker.report
+
+    def _receive_files(self, local_dir: Path, files: dict, folders: set, errors: dict, workers: int,
+                       progress: Optional[Callable[[dict], None]]) -> Tuple[dict, dict]:
+        sizes = {path: int(file["size"]) for path, file in files.items()}
+        tracker = _TransferProgress(len(files), sum(sizes.values()), progress)
+
+        def receive(path: str) -> str:
+            # the file is downloaded next to the local file and then replaces it, which is kept if the download fails.
+            to_file = local_dir / path
+            partial = to_file.with_name(to_file.name + ".partial")
+            try:
+                self.download(files[path]["id"], partial)
+            except Exception:
+                if partial.exists():
+                    os.unlink(str(partial))
+                raise
+            os.replace(str(partial), str(to_file))
+            return files[path]["id"]
+
+        received, failed = self._transfer(receive, _pending(list(files), folders, errors, tracker, sizes), workers,
+                                          tracker, sizes)
+        errors.update(failed)
+        return received, tracker.report
+
+    def _transfer(self, func: Callable[[str], str], paths: List[str], workers: int,
+                  tracker: Optional[_TransferProgress] = None, sizes: Optional[dict] = None) -> Tuple[dict, dict]:
+        # errors are collected instead of raised, so that one failed path does not stop the others.
+        results = {}
+        errors = {}
+
+        def run(path: str):
+            try:
+                results[path] = func(path)
+            except Exception as e:
+                logging.warning(f"Failed to transfer {path}: {e}")
+                errors[path] = e
+            if tracker is not None:
+                tracker.add(sizes[path], failed=path in errors)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(run, paths))
+        return results, errors
 
     @retry_on_out_of_quota()
     def get_id(self, name: str, parent_id: Optional[str] = None):
@@ -95,22 +955,28 @@ class Drive:
         :param parent_id: id of the folder to limit the search. If None, the full Google drive will be searched.
         :return: the id of the file if found. Or None if no such name is found.
         """
-        q = f"name = '{name}' and trashed = false"
-        if parent_id is not None:
-            q += f" and '{parent_id}' in parents"
+        if self.cache is not None:
+            id = self.cache.get(("id", parent_id, name))
+            if id is not None:
+                return id
 
-        response = self._client.files().list(pageSize=10,
-                                             fields=self._get_fields_query_string(),
-                                             q=q).execute()
+        query = queries.name(name) & queries.trashed(False)
+        if parent_id is not None:
+            query &= queries.in_parents(parent_id)
 
-        item = response.get('files', None)
-        if item is None:
+        # two files are enough to know the name is not unique.
+        files = list(itertools.islice(self._search(query, ["id"], self._request_page, prefetch=False), 2))
+        if not files:
             return None
 
-        if len(item) > 1:
+        if len(files) > 1:
             raise RuntimeError(f"More than one file is found. Please rename the file with a unique string.")
 
-        return item[0]['id']
+        id = files[0]['id']
+        if self.cache is not None:
+            self.cache.set(("id", parent_id, name), id)
+            self.cache.update(("file", id), {"name": name})
+        return id
 
     @retry_on_out_of_quota()
     def find(self, name_contains: Optional[str] = None, name_not_contains: Optional[str] = None,
@@ -128,61 +994,302 @@ class Drive:
         :param name_contains: a string contained in the name.
         :param name_not_contains: a string that is not contained in the name.
         :param parent_id: parent folder id.
-        :return: a list of dictionaries containing id and name of found files.
+        :return: a list of dictionaries containing id and name of all found files, over all pages of results.
         """
         if name_contains is None and name_not_contains is None:
             raise ValueError("name_contains and name_not_contains cannot both be None")
 
-        q_name_contains = ""
-        q_name_not_contains = ""
+        query = queries.trashed(False)
         if name_contains is not None:
-            q_name_contains = f"and name contains '{name_contains}'"
+            query &= queries.name_contains(name_contains)
         if name_not_contains is not None:
-            q_name_not_contains = f"and not name contains '{name_not_contains}'"
-        q = f"trashed = false {q_name_contains} {q_name_not_contains}"
-
+            query &= ~queries.name_contains(name_not_contains)
         if parent_id is not None:
-            q += f" and '{parent_id}' in parents"
-        response = self._client.files().list(pageSize=100,
-                                             fields=self._get_fields_query_string(),
-                                             q=q).execute()
-        item = response.get('files', [])
-        return item
+            query &= queries.in_parents(parent_id)
+        return list(self._search(query, ["id", "name"], self._request_page, prefetch=False))
 
     @retry_on_out_of_quota()
     def list(self, id: str, regex: str=None, recursive: bool=False, depth: int=3) -> list:
-        """Lists the content of the folder by the given id.
+        """Lists the content of the folder by the given id. See `iter_list` to iterate over large folders without
+        keeping all files in memory.
 
         :param id: id of the folder to be listed.
-        :param regex: an regular expression used to filter returned file and folders.
-        :param recursive: if True, children of the folder will also be listed.
+        :param regex: an regular expression used to filter returned file and folders. A literal name, such as "^name$",
+          is searched by the API. Other expressions are applied to listed files.
+        :param recursive: if True, children of the folder will also be listed. See `walk`.
         :param depth: number of recursion if recursive is True. This is to prevent cyclic nesting or deep nested
           folders.
         :return: a list of dictionaries containing id, name of the object contained in the target folder and list of
           parent ids.
         """
-        q = f"'{id}' in parents and trashed = false"
-        result = []
-        page_token = ""  # placeholder to start the loop.
-        while page_token is not None:
-            response = self._client.files().list(q=q,
-                                                 spaces='drive',
-                                                 fields=self._get_fields_query_string(["id", "name", "parents"]),
-                                                 pageToken=page_token).execute()
-            result.extend(response.get("files", []))
-            page_token = response.get("nextPageToken", None)
-
-        if recursive and depth > 0:
-            for file in result:
-                children_id = file["id"]
-                result.extend(self.list(id=children_id, recursive=True, depth=depth-1))
+        if not recursive:
+            query = queries.in_parents(id) & queries.trashed(False)
+            if regex is not None:
+                query &= queries.name_matches(regex)
+            return list(self._search(query, LIST_FIELDS, self._request_page, prefetch=False))
 
+        # folders are descended into whatever their names are, so the expression is applied after the walk.
+        files = self._walk(id, depth + 1, LIST_FIELDS, self._request_page)
+        result = [{key: file[key] for key in LIST_FIELDS if key in file} for file in files]
         if regex is not None:
             pattern = re.compile(regex)
             result = [f for f in result if pattern.match(f["name"])]
 
         return result
 
+    def search(self, query: Query, fields: Optional[list] = None, prefetch: bool = True) -> Iterator[dict]:
+        """Iterates over all files matching the query, over all pages of results.
+
+        The part of the query that the Drive API can evaluate is sent as the `q` parameter, and the rest is applied to
+        listed files. See `pysuite.query`.
+
+        :example:
+
+        >>> from pysuite import query
+        >>> drive.search(query.in_parents(folder_id) & query.trashed(False) & query.name_matches(r"report_\\d+\\.csv"))
+
+        :param query: a Query object. Note that files in trash are matched unless the query excludes them by
+          `query.trashed(False)`.
+        :param fields: list of fields returned for each file. If None, id, name and parents are returned.
+        :param prefetch: if True, the next page is requested in a background thread while files of the current page are
+          consumed.
+        :return: an iterator of dictionaries of the requested fields of matching files.
+        """
+        return self._search(query, fields if fields is not None else LIST_FIELDS, self._list_page, prefetch)
+
+    def _search(self, query: Query, fields: list, fetch: Callable[[str, str, Optional[str]], dict],
+                prefetch: bool) -> Iterator[dict]:
+        q, client = query.compile()
+        if client is None:
+            return self._iter_files(q, self._get_fields_query_string(fields), fetch, prefetch)
+
+        # fields required by the client side predicate are listed too, and removed from matching files.
+        listed = list(dict.fromkeys(fields + [field for field in query.fields if field not in fields]))
+        files = filter(client, self._iter_files(q, self._get_fields_query_string(listed), fetch, prefetch))
+        if len(listed) == len(fields):
+            return files
+        return ({key: file[key] for key in fields if key in file} for file in files)
+
+    def iter_list(self, id: str, fields: Optional[list] = None, prefetch: bool = True) -> Iterator[dict]:
+        """Iterates over the content of the folder by the given id, yielding files as pages of up to `PAGE_SIZE` files
+        arrive. Unlike `list`, only one or two pages are kept in memory, however large the folder is.
+
+        Each page is requested and retried separately, so a quota error does not restart the listing.
+
+        :example:
+
+        >>> for file in drive.iter_list(folder_id, fields=["id", "name", "size"]):
+        ...     print(file["name"])
+
+        :param id: id of the folder to be listed.
+        :param fields: list of fields returned for each file, such as ["id", "name", "mimeType"]. If None, id, name and
+          parents are returned.
+        :param prefetch: if True, the next page is requested in a background thread while files of the current page are
+          consumed.
+        :return: an iterator of dictionaries of the requested fields of files in the folder.
+        """
+        return self.search(queries.in_parents(id) & queries.trashed(False), fields, prefetch)
+
+    def walk(self, id: str, max_depth: Optional[int] = None, fields: Optional[list] = None) -> list:
+        """Lists the folder tree under the folder by the given id, breadth first.
+
+        Only folders are descended into, and up to `MAX_PARENTS_PER_QUERY` folders of a level are listed by one query.
+        Queries of a level are sent concurrently if `concurrency` is set. A folder reachable by more than one path is
+        listed once.
+
+        :example:
+
+        >>> for file in drive.walk(folder_id, max_depth=2):
+        ...     print(file["depth"], file["path"])
+
+        :param id: id of the root folder.
+        :param max_depth: max depth of returned files. Files in the root folder have depth 1. If None, the whole tree is
+          listed.
+        :param fields: list of fields returned for each file. id, name, parents and mimeType are always returned. If
+          None, only those are returned.
+        :return: a list of dictionaries of file fields, with "path" of the file relative to the root folder, such as
+          "folder/file.txt", and its "depth".
+        """
+        return self._walk(id, max_depth, fields, self._list_page)
+
+    def _walk(self, id: str, max_depth: Optional[int], fields: Optional[list],
+              fetch: Callable[[str, str, Optional[str]], dict]) -> list:
+        fields_query = self._get_fields_query_string(
+            list(dict.fromkeys(["id", "name", "parents", "mimeType"] + (fields or []))))
+        result = []
+        level = {id: ""}  # id -> path of folders to be listed, ending with "/" except the root.
+        visited = {id}
+        depth = 0
+        while level and (max_depth is None or depth < max_depth):
+            depth += 1
+            ids = list(level)
+            batches = [ids[start:start + MAX_PARENTS_PER_QUERY] for start in range(0, len(ids), MAX_PARENTS_PER_QUERY)]
+            children = bulk_map(lambda batch: list(self._iter_files(_children_query(batch), fields_query, fetch,
+                                                                    prefetch=False)), batches, self.concurrency)
+            next_level = {}
+            for files in children:
+                for file in files:
+                    parent = next((parent for parent in file.get("parents", []) if parent in level), None)
+                    path = level.get(parent, "") + file["name"]
+                    result.append(dict(file, path=path, depth=depth))
+                    if file.get("mimeType") == FOLDER_MIME_TYPE and file["id"] not in visited:
+                        visited.add(file["id"])
+                        next_level[file["id"]] = path + "/"
+            level = next_level
+
+        return result
+
+    @retry_on_out_of_quota()
+    def get_root_id(self) -> str:
+        """Gets the id of the root folder of the user's drive, which is also addressed by the alias "root".
+
+        :return: id of the root folder.
+        """
+        if self._root_id is None:
+            self._root_id = self._execute(self._files.get(fileId=ROOT_ID, fields="id"))["id"]
+        return self._root_id
+
+    def resolve_path(self, path: str, root_id: str = ROOT_ID) -> Optional[str]:
+        """Gets the id of the file at the path. See `resolve_paths`.
+
+        :param path: a POSIX-like path relative to the root folder, such as "reports/2021/summary.csv".
+        :param root_id: id of the folder the path starts from. Default is the root of the user's drive.
+        :return: the id of the file, or None if no file is at the path.
+        """
+        return self.resolve_paths([path], root_id)[path]
+
+    def resolve_paths(self, paths: List[str], root_id: str = ROOT_ID) -> dict:
+        """Gets ids of files at the paths, such as "reports/2021/summary.csv", resolving one level of all paths at a
+        time.
+
+        Paths sharing a prefix resolve it once. Lookups of a level are combined into queries of up to
+        `MAX_NAMES_PER_QUERY` names, which are sent concurrently if `concurrency` is set, so 1000 files in one folder
+        take about 10 requests more than the folder itself. Resolved names are kept in `cache` if it is set, the same
+        way as `get_id`, so later calls skip known prefixes.
+
+        :example:
+
+        >>> drive.resolve_paths([f"reports/2021/{month:02}/summary.csv" for month in range(1, 13)])
+        {"reports/2021/01/summary.csv": "id1", ...}
+
+        :param paths: POSIX-like paths relative to the root folder. Empty parts and "." are ignored. "" is the root.
+        :param root_id: id of the folder the paths start from. Default is the root of the user's drive.
+        :return: a dictionary from each path to the id of its file, or None if no file is at the path. An error is
+          raised if more than one file has the same name in a folder on the way.
+        """
+        parts = {path: _split_path(path) for path in paths}
+        max_depth = max((len(path_parts) for path_parts in parts.values()), default=0)
+        if root_id == ROOT_ID and max_depth > 0:
+            # files list the id of the root folder as their parent, not its alias.
+            root_id = self.get_root_id()
+        resolved = {(): root_id}  # prefix -> id, or None if no file is at the prefix.
+        for depth in range(1, max_depth + 1):
+            lookups = {}  # (parent id, name) -> prefixes looked up
+            for path_parts in parts.values():
+                prefix = path_parts[:depth]
+                if len(prefix) < depth or prefix in resolved or resolved.get(prefix[:-1]) is None:
+                    continue
+                key = (resolved[prefix[:-1]], prefix[-1])
+                cached = self.cache.get(("id",) + key) if self.cache is not None else None
+                if cached is not None:
+                    resolved[prefix] = cached
+                else:
+                    lookups.setdefault(key, set()).add(prefix)
+            if not lookups:
+                continue
+
+            found = self._lookup_names(list(lookups))
+            for key, prefixes in lookups.items():
+                ids = found.get(key, [])
+                if len(ids) > 1:
+                    raise RuntimeError(f"More than one file is found at {'/'.join(next(iter(prefixes)))}. Please "
+                                       f"rename the file with a unique string.")
+                for prefix in prefixes:
+                    resolved[prefix] = ids[0] if ids else None
+                if ids and self.cache is not None:
+                    self.cache.set(("id",) + key, ids[0])
+                    self.cache.update(("file", ids[0]), {"name": key[1]})
+
+        return {path: resolved.get(path_parts) for path, path_parts in parts.items()}
+
+    def _lookup_names(self, lookups: List[Tuple[str, str]]) -> dict:
+        fields_query = self._get_fields_query_string(LIST_FIELDS)
+        batches = [lookups[start:start + MAX_NAMES_PER_QUERY] for start in range(0, len(lookups), MAX_NAMES_PER_QUERY)]
+        pages = bulk_map(lambda batch: list(self._iter_files(_names_query(batch), fields_query, self._list_page,
+                                                             prefetch=False)), batches, self.concurrency)
+        wanted = set(lookups)
+        found = {}  # (parent id, name) -> ids of matching files
+        for files in pages:
+            for file in files:
+                for parent in file.get("parents", []):
+                    if (parent, file["name"]) in wanted:
+                        found.setdefault((parent, file["name"]), []).append(file["id"])
+        return found
+
+    def _iter_files(self, q: Optional[str], fields: str, fetch: Callable[[str, str, Optional[str]], dict],
+                    prefetch: bool) -> Iterator[dict]:
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            response = fetch(q, fields, None)
+            while True:
+                page_token = response.get("nextPageToken")
+                future = executor.submit(fetch, q, fields, page_token) if executor and page_token else None
+                yield from response.get("files", [])
+                if page_token is None:
+                    return
+                response = future.result() if future is not None else fetch(q, fields, page_token)
+        finally:
+            if executor is not None:
+                # a page being prefetched when the iteration is stopped early is left to complete in background.
+                executor.shutdown(wait=False)
+
+    @retry_on_out_of_quota()
+    def _list_page(self, q: Optional[str], fields: str, page_token: Optional[str]) -> dict:
+        return self._request_page(q, fields, page_token)
+
+    def _request_page(self, q: Optional[str], fields: str, page_token: Optional[str]) -> dict:
+        kwargs = {"pageToken": page_token} if page_token is not None else {}
+        if q is not None:
+            kwargs["q"] = q
+        return self._execute(self._files.list(spaces="drive", pageSize=PAGE_SIZE, fields=fields, **kwargs))
+
+    @retry_on_out_of_quota()
+    def get_start_page_token(self) -> str:
+        """Gets the page token of changes made after now, which is the starting point of `list_changes`.
+
+        :return: a page token.
+        """
+        return self._execute(self._client.changes().getStartPageToken())["startPageToken"]
+
+    @retry_on_out_of_quota()
+    def list_changes(self, page_token: str, fields: Optional[list] = None) -> Tuple[list, str]:
+        """Lists changes of files made since the page token was issued, over all pages of changes. Changes of files
+        in trash or removed from the user's drive are included.
+
+        :example:
+
+        >>> token = drive.get_start_page_token()
+        >>> ...  # files are changed.
+        >>> changes, token = drive.list_changes(token)
+
+        :param page_token: a token returned by `get_start_page_token` or by previous `list_changes`.
+        :param fields: list of fields of changed files. id and trashed are always returned. If None, name and parents
+          are returned too.
+        :return: a tuple of (list of changes, token of changes made after them). Each change is a dictionary containing
+          "fileId", "removed" and "file", the requested fields of the file, which is absent if the file is removed.
+        """
+        file_fields = ",".join(dict.fromkeys(["id", "trashed"] + (fields if fields is not None else LIST_FIELDS)))
+        fields_query = f"nextPageToken,newStartPageToken,changes(fileId,removed,file({file_fields}))"
+        changes = []
+        while True:
+            response = self._execute(self._client.changes().list(pageToken=page_token, pageSize=PAGE_SIZE,
+                                                                 spaces="drive", includeRemoved=True,
+                                                                 fields=fields_query))
+            changes.extend(response.get("changes", []))
+            if "newStartPageToken" in response:
+                return changes, response["newStartPageToken"]
+            page_token = response["nextPageToken"]
+
     @retry_on_out_of_quota()
     def delete(self, id: str, recursive: bool = False):
         """Deletes target file from google drive.
@@ -193,9 +1300,11 @@ class Drive:
         :param recursive: if True and target id represents a folder, remove all nested files and folders.
         :return: None
         """
-        self._client.files().delete(fileId=id).execute()
+        self._execute(self._files.delete(fileId=id))
+        if self.cache is not None:
+            self._invalidate_deleted(id)
 
-    @retry_on_out_of_quota()
+    @retry_on_out_of_quota(idempotent=False)
     def create_folder(self, name: str, parent_ids: Optional[list] = None) -> str:
         """Create a folder on google drive by the given name.
 
@@ -205,7 +1314,7 @@ class Drive:
         """
         file_metadata = {
             'name': name,
-            'mimeType': 'application/vnd.google-apps.folder'
+            'mimeType': FOLDER_MIME_TYPE
         }
         if parent_ids is not None:
             if not isinstance(parent_ids, list):
@@ -216,10 +1325,11 @@ class Drive:
 
             file_metadata["parents"] = parent_ids
 
-        folder = self._client.files().create(body=file_metadata, fields='id').execute()
+        folder = self._execute(self._files.create(body=file_metadata, fields='id'))
+        self._cache_created(folder.get("id"), name, mimeType=FOLDER_MIME_TYPE)
         return folder.get("id")
 
-    @retry_on_out_of_quota()
+    @retry_on_out_of_quota(idempotent=False)
     def share(self, id: str, emails: List[str], role: str = "reader", notify: bool = True):  # pragma: no cover
         """Modifies the permission of the target object and share with the provided emails.
 
@@ -239,12 +1349,13 @@ class Drive:
                 "role": role,
                 "emailAddress": email
             }
-            batch.add(self._client.permissions().create(
+            batch.add(self._permissions.create(
                 fileId=id,
                 body=user_permission,
                 fields='id',
                 sendNotification=notify
             ))
+        self._limit(cost=len(emails))
         batch.execute()
         return self.get_name(id)
 
@@ -272,10 +1383,17 @@ class Drive:
         :param id: id of the target Google drive object.
         :return: name of the object.
         """
-        file = self._client.files().get(fileId=id).execute()
+        if self.cache is not None:
+            name = self.cache.get(("file", id), {}).get("name")
+            if name is not None:
+                return name
+
+        file = self._execute(self._files.get(fileId=id, fields="name"))
+        if self.cache is not None:
+            self.cache.update(("file", id), {"name": file["name"]})
         return file['name']
 
-    @retry_on_out_of_quota()
+    @retry_on_out_of_quota(idempotent=False)
     def copy(self, id: str, name: str, parent_id: Optional[str] = None) -> str:
         """Copies target file and give the new file specified name. return the id of the created file.
 
@@ -288,5 +1406,31 @@ class Drive:
         request = {"name": name}
         if parent_id is not None:
             request["parents"] = parent_id
-        file = self._client.files().copy(fileId=id, body=request, fields='id').execute()
+        file = self._execute(self._files.copy(fileId=id, body=request, fields='id'))
+        self._cache_created(file.get("id"), name)
         return file.get("id")
+
+    def _invalidate_deleted(self, id: str):
+        if self.cache.get(("file", id), {}).get("mimeType", FOLDER_MIME_TYPE) != FOLDER_MIME_TYPE:
+            # only names resolved to a file that is not a folder are no longer valid.
+            self.cache.invalidate(("file", id), lambda key, value: key[0] == "id" and value == id)
+            return
+        # files at any depth under a folder may be cached, but their parents may not, so every path lookup is dropped,
+        # as well as names of the files under the folder that are known from lookups.
+        children = {}
+        for key, value in self.cache.items():
+            if key[0] == "id":
+                children.setdefault(key[1], []).append(value)
+        deleted, pending = set(), [id]
+        while pending:
+            parent = pending.pop()
+            deleted.add(parent)
+            pending.extend(child for child in children.get(parent, []) if child not in deleted)
+        self.cache.invalidate(predicate=lambda key, value: key[0] == "id" or key[0] == "file" and key[1] in deleted)
+
+    def _cache_created(self, id: str, name: str, **fields):
+        if self.cache is None:
+            return
+        # a name resolved before may no longer be unique.
+        self.cache.invalidate(predicate=lambda key, value: key[0] == "id" and key[2] == name)
+        self.cache.set(("file", id), dict(fields, name=name))
@@ -0,0 +1,287 @@
+"""Implements a local index of the metadata of a Google Drive folder tree.
+"""
+import sqlite3
+import threading
+from pathlib import PosixPath
+from typing import Iterable, List, Optional, Union
+
+from pysuite.drive import Drive, FOLDER_MIME_TYPE, LIST_FIELDS
+
+INDEX_FIELDS = ["id", "name", "parents", "mimeType", "md5Checksum", "size", "modifiedTime"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    mime_type TEXT,
+    md5_checksum TEXT,
+    size TEXT,
+    modified_time TEXT
+);
+CREATE TABLE IF NOT EXISTS parents (
+    id TEXT NOT NULL,
+    parent_id TEXT NOT NULL,
+    PRIMARY KEY (id, parent_id)
+);
+CREATE INDEX IF NOT EXISTS parents_parent_id ON parents (parent_id);
+CREATE INDEX IF NOT EXISTS files_name ON files (name);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+_COLUMNS = {"name": "name", "mimeType": "mime_type", "md5Checksum": "md5_checksum", "size": "size",
+            "modifiedTime": "modified_time"}
+_SELECT_FILES = "SELECT id, name, mime_type, md5_checksum, size, modified_time, " \
+                "(SELECT group_concat(parent_id) FROM parents WHERE parents.id = files.id) FROM files"
+# ids of files under the root folder, whose id is the first parameter.
+_REACHABLE = "WITH RECURSIVE reachable(id) AS (SELECT id FROM parents WHERE parent_id = ? " \
+             "UNION SELECT parents.id FROM parents JOIN reachable ON parents.parent_id = reachable.id) "
+
+
+class DriveIndex:
+    """Keeps the metadata of files under a Google Drive folder in a SQLite database, so that files can be found without
+    listing the folder tree again.
+
+    `build` lists the whole tree once. `sync` then applies changes made since the last `build` or `sync`, read from the
+    changes feed of the user's drive, which takes one request per 1000 changes instead of one or more per folder. Files
+    moved into the tree are added, and files trashed, removed or moved out of it are deleted from the index. Folders
+    moved into the tree are listed, since the files in them are not changed.
+
+    The database is a file that can be reused by later processes. Lookups, such as `get_id`, `find` and `resolve`, are
+    answered from the database and never send requests, so they are only as current as the last `sync`.
+
+    :example:
+
+    >>> index = DriveIndex(drive, root_id=folder_id, path="/tmp/drive_index.sqlite")
+    >>> index.sync()  # builds the index on the first call.
+    >>> index.resolve("reports/2021/summary.csv")
+
+    :param drive: a Drive object sending requests.
+    :param root_id: id of the root folder of the indexed tree.
+    :param path: path to the database file. ":memory:" keeps the database in memory.
+    """
+
+    def __init__(self, drive: Drive, root_id: str, path: Union[str, PosixPath] = ":memory:"):
+        self.drive = drive
+        self.root_id = root_id
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.executescript(_SCHEMA)
+        indexed_root = self._get_state("root_id")
+        if indexed_root is not None and indexed_root != root_id:
+            raise ValueError(f"{path} is an index of folder {indexed_root}, not {root_id}")
+
+    def close(self):
+        """Closes the database."""
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def page_token(self) -> Optional[str]:
+        """Page token of changes not applied to the index yet, or None if the index has not been built."""
+        return self._get_state("page_token")
+
+    def build(self):
+        """Lists the whole folder tree and replaces the content of the index.
+
+        :return: None
+        """
+        # changes made while the tree is listed are applied again by the next sync, which is harmless.
+        page_token = self.drive.get_start_page_token()
+        files = self.drive.walk(self.root_id, fields=INDEX_FIELDS)
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM files")
+            self._connection.execute("DELETE FROM parents")
+            self._upsert(files)
+            self._set_state(root_id=self.root_id, page_token=page_token)
+
+    def sync(self) -> int:
+        """Applies changes made since the last `build` or `sync`. The index is built if it has not been.
+
+        :return: number of changes read from the changes feed.
+        """
+        page_token = self.page_token
+        if page_token is None:
+            self.build()
+            return 0
+
+        # requests are sent before the database is locked. changes applied again by a concurrent sync are harmless.
+        changes, page_token = self.drive.list_changes(page_token, fields=INDEX_FIELDS)
+        removed = {change["fileId"] for change in changes
+                   if change.get("removed") or "file" not in change or change["file"].get("trashed")}
+        updated = {change["fileId"]: change["file"] for change in changes if change["fileId"] not in removed}
+        with self._lock:
+            known_folders = {row[0] for row in self._connection.execute(
+                "SELECT id FROM files WHERE mime_type = ?", (FOLDER_MIME_TYPE,))}
+
+        # content of folders moved into the tree is not in the changes feed. new folders are usually empty.
+        new_folders = [id for id, file in updated.items() if file.get("mimeType") == FOLDER_MIME_TYPE and
+                       id not in known_folders and self._in_tree(id, updated, removed, known_folders)]
+        listed, files = set(), []
+        for folder in new_folders:
+            if folder in listed:
+                continue  # it is under a folder listed before.
+            walked = self.drive.walk(folder, fields=INDEX_FIELDS)
+            listed.update(file["id"] for file in walked)
+            files.extend(walked)
+
+        # nothing is committed, and the page token is not advanced, unless all changes are applied.
+        with self._lock, self._connection:
+            self._delete(list(removed))
+            self._upsert(updated.values())
+            self._upsert(files)
+            # files moved out of the tree, and files in removed folders, are no longer reachable from the root.
+            self._connection.execute(_REACHABLE + "DELETE FROM files WHERE id NOT IN (SELECT id FROM reachable)",
+                                     (self.root_id,))
+            self._connection.execute("DELETE FROM parents WHERE id NOT IN (SELECT id FROM files)")
+            self._set_state(page_token=page_token)
+        return len(changes)
+
+    def get(self, id: str) -> Optional[dict]:
+        """Gets the indexed fields of the file.
+
+        :param id: id of the file.
+        :return: a dictionary of `INDEX_FIELDS` of the file, or None if the file is not in the index.
+        """
+        files = self._select(" WHERE id = ?", (id,))
+        return files[0] if files else None
+
+    def get_id(self, name: str, parent_id: Optional[str] = None) -> Optional[str]:
+        """Gets the id of the file with specified name, as `Drive.get_id`. If more than one file are found, an error
+        will be raised.
+
+        :param name: name of the file.
+        :param parent_id: id of the folder to limit the search. If None, the whole index will be searched.
+        :return: the id of the file if found. Or None if no such name is found.
+        """
+        if parent_id is None:
+            files = self._select(" WHERE name = ?", (name,))
+        else:
+            files = self._select(" WHERE name = ? AND id IN (SELECT id FROM parents WHERE parent_id = ?)",
+                                 (name, parent_id))
+        if len(files) > 1:
+            raise RuntimeError(f"More than one file is found. Please rename the file with a unique string.")
+        return files[0]["id"] if files else None
+
+    def find(self, name_contains: Optional[str] = None, name_not_contains: Optional[str] = None,
+             parent_id: Optional[str] = None) -> list:
+        """Finds files whose name contains, or does not contain, the strings, ignoring case. Unlike `Drive.find`, which
+        matches prefixes of words, any part of the name can match.
+
+        :param name_contains: a string contained in the name.
+        :param name_not_contains: a string that is not contained in the name.
+        :param parent_id: parent folder id. If None, the whole index will be searched.
+        :return: a list of dictionaries containing id and name of found files.
+        """
+        if name_contains is None and name_not_contains is None:
+            raise ValueError("name_contains and name_not_contains cannot both be None")
+
+        conditions, parameters = [], []
+        if name_contains is not None:
+            conditions.append("instr(lower(name), lower(?)) > 0")
+            parameters.append(name_contains)
+        if name_not_contains is not None:
+            conditions.append("instr(lower(name), lower(?)) = 0")
+            parameters.append(name_not_contains)
+        if parent_id is not None:
+            conditions.append("id IN (SELECT id FROM parents WHERE parent_id = ?)")
+            parameters.append(parent_id)
+        return [{"id": file["id"], "name": file["name"]}
+                for file in self._select(" WHERE " + " AND ".join(conditions), parameters)]
+
+    def list(self, id: str, recursive: bool = False) -> list:
+        """Lists files in the folder, as `Drive.list`.
+
+        :param id: id of the folder.
+        :param recursive: if True, all files under the folder are listed.
+        :return: a list of dictionaries containing id, name and list of parent ids of the files.
+        """
+        if recursive:
+            files = self._select(" WHERE id IN (SELECT id FROM reachable)", (id,), prefix=_REACHABLE)
+        else:
+            files = self._select(" WHERE id IN (SELECT id FROM parents WHERE parent_id = ?)", (id,))
+        return [{key: file[key] for key in LIST_FIELDS} for file in files]
+
+    def resolve(self, path: str) -> Optional[str]:
+        """Gets the id of the file by its path relative to the root folder, such as "folder/file.txt". "" is the root.
+
+        :param path: a path whose parts are separated by "/".
+        :return: the id of the file, or None if no file is at the path. If more than one file has the path, an error
+          will be raised.
+        """
+        id = self.root_id
+        for name in (part for part in path.split("/") if part):
+            id = self.get_id(name, parent_id=id)
+            if id is None:
+                return None
+        return id
+
+    def get_path(self, id: str) -> Optional[str]:
+        """Gets the path of the file relative to the root folder. For a file in more than one folder, one of its paths
+        is returned.
+
+        :param id: id of the file.
+        :return: a path whose parts are separated by "/", or None if the file is not in the index.
+        """
+        names = []
+        while id != self.root_id:
+            file = self.get(id)
+            if file is None:
+                return None
+            names.append(file["name"])
+            id = next((parent for parent in file["parents"] if parent == self.root_id or self.get(parent) is not None),
+                      None)
+            if id is None:
+                return None
+        return "/".join(reversed(names))
+
+    def _in_tree(self, id: str, updated: dict, removed: set, known_folders: set) -> bool:
+        # whether the changed file is under the root once changes are applied. Indexed folders that are not changed are
+        # under the root, since every sync deletes the files that are not.
+        pending, seen = [id], set()
+        while pending:
+            id = pending.pop()
+            seen.add(id)
+            for parent in updated[id].get("parents", []):
+                if parent == self.root_id or (parent in known_folders and parent not in updated and
+                                              parent not in removed):
+                    return True
+                if parent in updated and parent not in seen:
+                    pending.append(parent)
+        return False
+
+    def _select(self, where: str, parameters: Iterable, prefix: str = "") -> List[dict]:
+        with self._lock:
+            rows = self._connection.execute(prefix + _SELECT_FILES + where + " ORDER BY id", tuple(parameters))
+            return [{"id": row[0], "name": row[1], "mimeType": row[2], "md5Checksum": row[3], "size": row[4],
+                     "modifiedTime": row[5], "parents": row[6].split(",") if row[6] else []} for row in rows]
+
+    def _upsert(self, files: Iterable[dict]):
+        for file in files:
+            self._connection.execute(
+                f"INSERT OR REPLACE INTO files (id, {', '.join(_COLUMNS.values())}) VALUES (?, ?, ?, ?, ?, ?)",
+                [file["id"]] + [file.get(key) for key in _COLUMNS])
+            self._connection.execute("DELETE FROM parents WHERE id = ?", (file["id"],))
+            self._connection.executemany("INSERT OR IGNORE INTO parents (id, parent_id) VALUES (?, ?)",
+                                         [(file["id"], parent) for parent in file.get("parents", [])])
+
+    def _delete(self, ids: List[str]):
+        self._connection.executemany("DELETE FROM files WHERE id = ?", [(id,) for id in ids])
+        self._connection.executemany("DELETE FROM parents WHERE id = ?", [(id,) for id in ids])
+
+    def _get_state(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def _set_state(self, **values: str):
+        self._connection.executemany("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", values.items())
@@ -8,14 +8,19 @@ from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from typing import Union, Optional, List
 
-from googleapiclient.discovery import build
 from googleapiclient.discovery import Resource
 
 from pysuite.auth import Authentication
+from pysuite.discovery import get_resource
+from pysuite.instrumentation import instrument, set_payload_size
+from pysuite.ratelimit import RateLimiter, user_key
+
+# number of quota units used by sending one message.
+SEND_QUOTA_UNITS = 100
 
 
 def _get_client(auth: Authentication, version: str) -> Resource:
-    return build("gmail", version, credentials=auth.credential).users().messages()
+    return get_resource("gmail", version, auth, "users", "messages")
 
 
 class GMail:
@@ -23,11 +28,23 @@ class GMail:
 
     :param auth: an authorized GMail service client.
     :param version: version of API used. Default is "v1"
+    :param rate_limiter: a RateLimiter object pacing requests under the per user quota units of GMail API, such as
+      `pysuite.ratelimit.get_rate_limiter()` shared by the whole process. If None, requests are not rate limited.
+
+    GMail objects can be pickled and used after `os.fork()`. The API client is rebuilt lazily in the new process.
     """
 
-    def __init__(self, auth: Authentication, version: str = "v1"):
-        self._client = _get_client(auth, version)
+    def __init__(self, auth: Authentication, version: str = "v1", rate_limiter: Optional[RateLimiter] = None):
+        self._auth = auth
+        self._version = version
+        self.rate_limiter = rate_limiter
+
+    @property
+    def _client(self) -> Resource:
+        # resources are cached per process by pysuite.discovery, so this is cheap and safe after fork or unpickling.
+        return _get_client(self._auth, self._version)
 
+    @instrument()
     def compose(self, sender: str, to: Union[str, list], cc: Optional[Union[str, list]] = None,
                 bcc: Optional[Union[str, list]] = None, body: Optional[str] = None, subject: Optional[str] = None,
                 local_files: Optional[Union[str, PosixPath]] = None,
@@ -142,9 +159,14 @@ class GMail:
         :param msg: A composed MIMEBase object.
         :return: dictionary of response.
         """
-        body = {'raw': urlsafe_b64encode(msg.as_bytes()).decode(),
+        raw = urlsafe_b64encode(msg.as_bytes()).decode()
+        set_payload_size(len(raw))
+        body = {'raw': raw,
                 'payload': {'mimeType': 'text/html'}}
-        response = self._client.send(userId=user_id, body=body).execute()
+        request = self._client.send(userId=user_id, body=body)
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire("gmail", user_key(self._auth), "units", cost=SEND_QUOTA_UNITS)
+        response = request.execute()
         logging.debug(response)
         return response
 
@@ -0,0 +1,104 @@
+"""Implements a local cache of md5 checksums of files.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path, PosixPath
+from typing import Union
+
+RACY_SECONDS = 2  # files modified more recently are not cached, since another change may keep the modification time.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    md5 TEXT NOT NULL
+);
+"""
+
+
+def file_md5(path: Union[str, PosixPath], chunk_size: int = 1 << 20) -> str:
+    """Computes the md5 checksum of the local file, the same as the `md5Checksum` of Google Drive files.
+
+    :param path: path to the local file.
+    :param chunk_size: number of bytes read at a time.
+    :return: hex digest of the md5 checksum.
+    """
+    md5 = hashlib.md5()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(chunk_size), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+class HashCache:
+    """Keeps md5 checksums of local files in a SQLite database by path, size and modification time, so that a file is
+    only hashed again after it changes. Pass it to `Drive.sync` to compare unchanged local files with Google Drive files
+    without reading them.
+
+    The database is a file that can be reused by later processes. A file modified in the last `RACY_SECONDS` seconds is
+    hashed but not cached, since it may be modified again without changing its size and modification time.
+
+    :example:
+
+    >>> with HashCache("/tmp/hashes.sqlite") as hashes:
+    ...     drive.sync("reports", folder_id, hash_cache=hashes)
+    ...     hashes.stats
+    {'hits': 120, 'misses': 3}
+
+    :param path: path to the database file. ":memory:" keeps the database in memory.
+    """
+
+    def __init__(self, path: Union[str, PosixPath] = ":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        """Closes the database."""
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def stats(self) -> dict:
+        """Counters of lookups in this cache.
+
+        :return: a dictionary containing number of 'hits' and 'misses', which are files hashed.
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def md5(self, local_file: Union[str, PosixPath]) -> str:
+        """Gets the md5 checksum of the local file. The file is only read if it has not been hashed, or its size or
+        modification time has changed since.
+
+        :param local_file: path to the local file.
+        :return: hex digest of the md5 checksum.
+        """
+        path = str(Path(local_file).resolve())
+        stat = os.stat(path)
+        with self._lock:
+            row = self._connection.execute("SELECT md5 FROM hashes WHERE path = ? AND size = ? AND mtime_ns = ?",
+                                           (path, stat.st_size, stat.st_mtime_ns)).fetchone()
+            self._stats["hits" if row is not None else "misses"] += 1
+        if row is not None:
+            return row[0]
+
+        checksum = file_md5(path)
+        if time.time() - stat.st_mtime >= RACY_SECONDS:
+            with self._lock, self._connection:
+                self._connection.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)",
+                                         (path, stat.st_size, stat.st_mtime_ns, checksum))
+        return checksum
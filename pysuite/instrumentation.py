@@ -0,0 +1,265 @@
+"""Implements hooks to measure calls to Google APIs.
+"""
+import bisect
+import functools
+import logging
+import threading
+import time
+from typing import Callable, NamedTuple, Optional, Sequence
+
+DEFAULT_BOUNDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_LOCAL = threading.local()
+
+
+class CallEvent(NamedTuple):
+    """Measurement of one attempt of an API call. A retried call emits one event per attempt.
+
+    `bytes_sent`, `bytes_received` and `network_time` cover requests sent through the pooled transport of
+    Authentication, which is used by Drive, Sheets and GMail. They are 0 for Storage and Vision, whose clients use their
+    own transports.
+    """
+    operation: str  # such as "Drive.download"
+    attempt: int  # starting from 1
+    duration: float  # seconds
+    status: str  # "ok" or "error"
+    status_code: Optional[int]  # HTTP status code of the last response or of the raised error, if known
+    error: Optional[str]  # name of the exception class if the attempt failed
+    bytes_sent: int  # bytes of request bodies
+    bytes_received: int  # bytes of response bodies
+    network_time: float  # seconds spent in http requests
+    payload_size: Optional[int]  # bytes of the uploaded or downloaded file or message, if applicable
+
+
+class Instrumentation:
+    """Receives a CallEvent for each attempt of API calls. This class ignores all events and is used by default, so that
+    calls are not measured at all.
+
+    Subclass it and override `emit` to export events to a metrics system. Events are emitted from the thread making the
+    call, so `emit` must be thread-safe and fast.
+
+    :example:
+
+    >>> class StatsdInstrumentation(Instrumentation):
+    ...     def emit(self, event):
+    ...         statsd.timing(event.operation, event.duration * 1000)
+    >>> set_instrumentation(StatsdInstrumentation())
+    """
+    enabled = False
+
+    def emit(self, event: CallEvent):
+        """Handles an event.
+
+        :param event: a CallEvent object.
+        :return: None
+        """
+
+
+class HistogramCollector(Instrumentation):
+    """Keeps histograms of call durations and counters per operation in memory.
+
+    :param bounds: upper bounds in seconds of the histogram buckets. The last bucket has no upper bound.
+    """
+    enabled = True
+
+    def __init__(self, bounds: Sequence[float] = DEFAULT_BOUNDS):
+        self.bounds = tuple(sorted(bounds))
+        self._lock = threading.Lock()
+        self._operations = {}
+
+    def emit(self, event: CallEvent):
+        with self._lock:
+            stats = self._operations.get(event.operation)
+            if stats is None:
+                stats = self._operations[event.operation] = {
+                    "buckets": [0] * (len(self.bounds) + 1), "count": 0, "errors": 0, "retries": 0, "total_time": 0.0,
+                    "max_time": 0.0, "network_time": 0.0, "bytes_sent": 0, "bytes_received": 0,
+                }
+
+            stats["buckets"][bisect.bisect_left(self.bounds, event.duration)] += 1
+            stats["count"] += 1
+            stats["errors"] += event.status != "ok"
+            stats["retries"] += event.attempt > 1
+            stats["total_time"] += event.duration
+            stats["max_time"] = max(stats["max_time"], event.duration)
+            stats["network_time"] += event.network_time
+            stats["bytes_sent"] += event.bytes_sent
+            stats["bytes_received"] += event.bytes_received
+
+    def summary(self) -> dict:
+        """Summarizes collected events.
+
+        :return: a dictionary from operation name to a dictionary containing number of attempts ('count'), failed
+          attempts ('errors') and retry attempts ('retries'), 'total_time', 'max_time', 'network_time', 'bytes_sent',
+          'bytes_received', estimated 'p50', 'p90' and 'p99' durations, and counts in 'buckets' of `bounds`.
+        """
+        with self._lock:
+            operations = {operation: dict(stats, buckets=list(stats["buckets"]))
+                          for operation, stats in self._operations.items()}
+
+        for stats in operations.values():
+            for quantile in (50, 90, 99):
+                stats[f"p{quantile}"] = self._estimate_quantile(stats, quantile / 100)
+        return operations
+
+    def reset(self):
+        """Removes collected events.
+
+        :return: None
+        """
+        with self._lock:
+            self._operations = {}
+
+    def _estimate_quantile(self, stats: dict, quantile: float) -> float:
+        # the upper bound of the bucket containing the quantile, or the max for the last bucket.
+        rank = quantile * stats["count"]
+        cumulative = 0
+        for bound, count in zip(self.bounds, stats["buckets"]):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, stats["max_time"])
+        return stats["max_time"]
+
+
+_INSTRUMENTATION = Instrumentation()
+
+
+def get_instrumentation() -> Instrumentation:
+    """Gets the instrumentation receiving events of the process.
+
+    :return: an Instrumentation object.
+    """
+    return _INSTRUMENTATION
+
+
+def set_instrumentation(instrumentation: Optional[Instrumentation]) -> Instrumentation:
+    """Sets the instrumentation receiving events of all API calls in the process.
+
+    :param instrumentation: an Instrumentation object. If None, the default that ignores all events is used.
+    :return: the previous Instrumentation object.
+    """
+    global _INSTRUMENTATION
+    previous = _INSTRUMENTATION
+    _INSTRUMENTATION = instrumentation if instrumentation is not None else Instrumentation()
+    return previous
+
+
+def is_enabled() -> bool:
+    """Checks whether calls should be measured.
+
+    :return: True if the instrumentation of the process receives events.
+    """
+    return _INSTRUMENTATION.enabled
+
+
+class _Record:
+    __slots__ = ("bytes_sent", "bytes_received", "network_time", "status_code", "payload_size")
+
+    def __init__(self):
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.network_time = 0.0
+        self.status_code = None
+        self.payload_size = None
+
+
+def measure(operation: str, attempt: int, func: Callable, *args, **kwargs):
+    """Calls the function and emits a CallEvent for it.
+
+    :param operation: name of the operation, such as "Drive.download".
+    :param attempt: number of the attempt, starting from 1.
+    :param func: function to be called.
+    :param args: positional arguments of the function.
+    :param kwargs: keyword arguments of the function.
+    :return: the returned value of the function.
+    """
+    instrumentation = _INSTRUMENTATION
+    if not instrumentation.enabled:
+        return func(*args, **kwargs)
+
+    stack = getattr(_LOCAL, "stack", None)
+    if stack is None:
+        stack = _LOCAL.stack = []
+    record = _Record()
+    stack.append(record)
+    error = None
+    start = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        stack.pop()
+        status_code = record.status_code
+        if error is not None:
+            code = getattr(getattr(error, "resp", None), "status", None) or getattr(error, "code", None)
+            status_code = code if isinstance(code, int) else status_code
+        event = CallEvent(operation=operation, attempt=attempt, duration=duration,
+                          status="ok" if error is None else "error", status_code=status_code,
+                          error=None if error is None else type(error).__name__, bytes_sent=record.bytes_sent,
+                          bytes_received=record.bytes_received, network_time=record.network_time,
+                          payload_size=record.payload_size)
+        try:
+            instrumentation.emit(event)
+        except Exception:
+            logging.exception(f"Failed to emit instrumentation event of {operation}")
+
+
+def instrument():
+    """A decorator to emit a CallEvent for each call of wrapped class methods. The operation name is
+    "<class name>.<method name>". Methods decorated by `pysuite.utilities.retry_on_out_of_quota` are already measured per
+    attempt.
+
+    :return: a decorator.
+    """
+    def wrapper(method):
+        @functools.wraps(wrapped=method)
+        def wrapped_function(self, *args, **kwargs):
+            if not _INSTRUMENTATION.enabled:
+                return method(self, *args, **kwargs)
+            return measure(f"{type(self).__name__}.{method.__name__}", 1, method, self, *args, **kwargs)
+
+        return wrapped_function
+
+    return wrapper
+
+
+def record_http(body, content: Optional[bytes], status_code: Optional[int], seconds: float):
+    """Adds an http request to the calls being measured in the current thread.
+
+    :param body: body of the request.
+    :param content: body of the response.
+    :param status_code: status code of the response.
+    :param seconds: number of seconds the request took.
+    :return: None
+    """
+    stack = getattr(_LOCAL, "stack", None)
+    if not stack:
+        return
+
+    if isinstance(body, str):
+        sent = len(body)
+    elif isinstance(body, (bytes, bytearray, memoryview)):
+        sent = memoryview(body).nbytes
+    else:
+        sent = 0
+    received = len(content) if content is not None else 0
+    for record in stack:
+        record.bytes_sent += sent
+        record.bytes_received += received
+        record.network_time += seconds
+        record.status_code = status_code
+
+
+def set_payload_size(size: int):
+    """Sets the payload size of the innermost call being measured in the current thread, such as the size of an
+    uploaded file.
+
+    :param size: number of bytes.
+    :return: None
+    """
+    stack = getattr(_LOCAL, "stack", None)
+    if stack:
+        stack[-1].payload_size = size
@@ -0,0 +1,102 @@
+"""Implements an on-disk journal of resumable upload sessions, so that uploads continue after a crash.
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+from pathlib import Path, PosixPath
+from typing import Optional, Union
+
+from pysuite.utilities import atomic_write, file_lock
+
+SESSION_LIFETIME = 6 * 24 * 3600  # seconds a session is reused. Google expires resumable sessions after a week.
+
+
+class UploadJournal:
+    """Stores the session uri and committed byte offset of each upload in progress in a json file. When an upload of the
+    same local file to the same target is started again, for example by a worker restarted after a crash, the server is
+    asked how many bytes it has committed and the upload continues from there.
+
+    An entry is only reused if the local file has the same size and modification time. Writes are atomic, and a lock
+    file serializes updates of processes sharing the journal on POSIX systems. Session uris allow uploading without
+    credentials, so the journal is written with owner-only permission.
+
+    :example:
+
+    >>> drive = Drive(auth, upload_journal=UploadJournal("/tmp/drive_uploads.json"))
+    >>> drive.upload("/data/large.bin", parent_id=folder_id)  # continues a session interrupted before, if any.
+
+    :param path: path to the journal file.
+    """
+
+    def __init__(self, path: Union[str, PosixPath]):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def get(self, key: str, local_file: Union[str, PosixPath]) -> Optional[dict]:
+        """Gets the session of the upload.
+
+        :param key: a string identifying the upload, such as the local file and the target.
+        :param local_file: path to the uploaded local file.
+        :return: a dictionary containing session "uri" and committed "offset", or None if there is no valid session.
+        """
+        entry = self._read().get(key)
+        if entry is None or entry.get("file") != _file_state(local_file) or \
+                time.time() - entry.get("created", 0) > SESSION_LIFETIME:
+            return None
+        return entry
+
+    def save(self, key: str, local_file: Union[str, PosixPath], uri: str, offset: int):
+        """Records the session of the upload.
+
+        :param key: a string identifying the upload.
+        :param local_file: path to the uploaded local file.
+        :param uri: resumable session uri.
+        :param offset: number of bytes committed by the server.
+        :return: None
+        """
+        with self._update() as entries:
+            created = entries[key].get("created") if entries.get(key, {}).get("uri") == uri else None
+            entries[key] = {"uri": uri, "offset": offset, "file": _file_state(local_file),
+                            "created": created if created is not None else time.time()}
+
+    def remove(self, key: str):
+        """Removes the session of the upload, once it is complete or no longer valid.
+
+        :param key: a string identifying the upload.
+        :return: None
+        """
+        with self._update() as entries:
+            entries.pop(key, None)
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, "r") as fp:
+                return json.load(fp)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    @contextlib.contextmanager
+    def _update(self):
+        with self._lock, file_lock(self.lock_path):
+            # sessions expired long ago are dropped, so that the journal does not grow.
+            entries = {key: entry for key, entry in self._read().items()
+                       if time.time() - entry.get("created", 0) <= SESSION_LIFETIME}
+            yield entries
+            atomic_write(self.path, json.dumps(entries))
+
+
+def _file_state(path: Union[str, PosixPath]) -> list:
+    stat = os.stat(str(path))
+    return [stat.st_size, stat.st_mtime_ns]
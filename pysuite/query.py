@@ -0,0 +1,222 @@
+"""Implements composable queries of Google Drive files.
+"""
+import functools
+import operator
+import re
+from datetime import datetime, timezone
+from typing import Callable, Optional, Pattern, Tuple
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+
+_REGEX_SPECIAL_CHARACTERS = set(".^$*+?{}[]\\|()")
+
+
+class Query:
+    """A predicate of Google Drive files, which compiles to the `q` parameter of files.list with escaped values.
+
+    Queries are built by the functions of this module and combined with `&` (and), `|` (or) and `~` (not). Predicates
+    that the Drive API cannot evaluate, such as `name_matches`, are applied to listed files on the client. The rest of
+    the query is still sent to the API, so that as few files as possible are listed.
+
+    :example:
+
+    >>> query = in_parents("folder_id") & ~is_folder() & modified_after(datetime(2021, 1, 1)) & name_matches(r"a_\\d+")
+    >>> query.compile()  # the regular expression is applied on the client.
+    ("'folder_id' in parents and mimeType != 'application/vnd.google-apps.folder' and "
+     "modifiedTime > '2021-01-01T00:00:00'", <function>)
+
+    :param server: the query string evaluated by the API, or None if the API cannot evaluate the predicate.
+    :param match: a function that takes a dictionary of file fields and returns whether the file matches.
+    :param fields: fields of files required by `match`.
+    :param negated_server: the query string of the negated predicate, or None if the API cannot evaluate it.
+    """
+
+    def __init__(self, server: Optional[str], match: Callable[[dict], bool], fields: Tuple[str, ...] = (),
+                 negated_server: Optional[str] = None):
+        self.server = server
+        self.match = match
+        self.fields = tuple(fields)
+        self.negated_server = negated_server
+        self.operator = None  # "and" or "or" joining the conditions of `server`, or None for one condition.
+        # client side predicate needed in addition to `server`, or None if `server` is exact.
+        self.client = None if server is not None else match
+        # a function returning the negated query. Composite queries are negated by De Morgan's laws.
+        self._negate = None
+        if server is not None and negated_server is not None:
+            self._negate = lambda: Query(negated_server, lambda file: not match(file), fields, negated_server=server)
+
+    def __and__(self, other: "Query") -> "Query":
+        servers = [query for query in (self, other) if query.server is not None]
+        query = Query(" and ".join(_group(server, "and") for server in servers) if servers else None,
+                      lambda file: self.match(file) and other.match(file), self.fields + other.fields)
+        query.operator = "and" if len(servers) == 2 else servers[0].operator if servers else None
+        clients = [query.client for query in (self, other) if query.client is not None]
+        if len(clients) == 2:
+            query.client = lambda file: clients[0](file) and clients[1](file)
+        else:
+            query.client = clients[0] if clients else None
+        query._negate = lambda: ~self | ~other
+        return query
+
+    def __or__(self, other: "Query") -> "Query":
+        match = lambda file: self.match(file) or other.match(file)  # noqa: E731
+        if self.server is None or other.server is None:
+            # no file can be excluded by the API.
+            query = Query(None, match, self.fields + other.fields)
+        else:
+            query = Query(f"{_group(self, 'or')} or {_group(other, 'or')}", match, self.fields + other.fields)
+            query.operator = "or"
+            if self.client is not None or other.client is not None:
+                # the API lists a superset of matching files, which is filtered by the whole predicate.
+                query.client = match
+        query._negate = lambda: ~self & ~other
+        return query
+
+    def __invert__(self) -> "Query":
+        if self._negate is not None:
+            return self._negate()
+        return Query(None, lambda file: not self.match(file), self.fields)
+
+    def compile(self) -> Tuple[Optional[str], Optional[Callable[[dict], bool]]]:
+        """Compiles the query.
+
+        :return: a tuple of (`q` string sent to the API or None if all files are listed, predicate applied to listed
+          files or None if the API evaluates the whole query).
+        """
+        return self.server, self.client
+
+
+def name(value: str) -> Query:
+    """Matches files named exactly `value`."""
+    return Query(f"name = {_quote(value)}", lambda file: file.get("name") == value, ("name",),
+                 negated_server=f"name != {_quote(value)}")
+
+
+def name_contains(value: str) -> Query:
+    """Matches files whose name contains `value` as the API does: the name, or a word of it separated by spaces, starts
+    with `value`, ignoring case and leading punctuation. For example, "a" matches "a", "_a" and "b a", but not "ba" or
+    "b_a". See `Drive.find`."""
+    pattern = word_prefix_pattern(value)
+    return Query(f"name contains {_quote(value)}", lambda file: pattern.search(file.get("name", "")) is not None,
+                 ("name",), negated_server=f"not name contains {_quote(value)}")
+
+
+def name_matches(regex: str) -> Query:
+    """Matches files whose name matches the regular expression from the start, as `re.match`. It is applied on the
+    client, unless the expression is a literal string ending with "$", which is sent to the API as `name`."""
+    literal = _literal(regex)
+    if literal is not None:
+        return name(literal)
+    pattern = re.compile(regex)
+    return Query(None, lambda file: pattern.match(file.get("name", "")) is not None, ("name",))
+
+
+def mime_type(value: str) -> Query:
+    """Matches files of the mime type."""
+    return Query(f"mimeType = {_quote(value)}", lambda file: file.get("mimeType") == value, ("mimeType",),
+                 negated_server=f"mimeType != {_quote(value)}")
+
+
+def is_folder() -> Query:
+    """Matches folders."""
+    return mime_type(FOLDER_MIME_TYPE)
+
+
+def in_parents(id: str) -> Query:
+    """Matches files in the folder by the given id."""
+    return Query(f"{_quote(id)} in parents", lambda file: id in file.get("parents", []), ("parents",),
+                 negated_server=f"not {_quote(id)} in parents")
+
+
+def trashed(value: bool = True) -> Query:
+    """Matches files in trash if `value` is True, otherwise files not in trash."""
+    return Query(f"trashed = {str(value).lower()}", lambda file: file.get("trashed", False) == value, ("trashed",),
+                 negated_server=f"trashed = {str(not value).lower()}")
+
+
+def modified_after(value: datetime) -> Query:
+    """Matches files modified after the time. Times without timezone are in UTC."""
+    return Query(f"modifiedTime > {_quote(_format_time(value))}",
+                 lambda file: parse_time(file["modifiedTime"]) > _utc(value), ("modifiedTime",),
+                 negated_server=f"modifiedTime <= {_quote(_format_time(value))}")
+
+
+def modified_before(value: datetime) -> Query:
+    """Matches files modified before the time. Times without timezone are in UTC."""
+    return Query(f"modifiedTime < {_quote(_format_time(value))}",
+                 lambda file: parse_time(file["modifiedTime"]) < _utc(value), ("modifiedTime",),
+                 negated_server=f"modifiedTime >= {_quote(_format_time(value))}")
+
+
+def has_property(key: str, value: str) -> Query:
+    """Matches files with the custom property, which is visible to all apps."""
+    return Query(f"properties has {{ key={_quote(key)} and value={_quote(value)} }}",
+                 lambda file: file.get("properties", {}).get(key) == value, ("properties",),
+                 negated_server=f"not properties has {{ key={_quote(key)} and value={_quote(value)} }}")
+
+
+def any_of(*queries: Query) -> Query:
+    """Matches files matching any of the queries."""
+    return functools.reduce(operator.or_, queries)
+
+
+def where(predicate: Callable[[dict], bool], fields: Tuple[str, ...] = ()) -> Query:
+    """Matches files by a function applied on the client.
+
+    :param predicate: a function that takes a dictionary of file fields and returns whether the file matches.
+    :param fields: fields of files required by `predicate`.
+    :return: a Query object.
+    """
+    return Query(None, predicate, fields)
+
+
+def parse_time(value: str) -> datetime:
+    """Parses a time of Google Drive, which is in RFC 3339 format in UTC, such as "2021-01-01T12:00:00.000Z".
+
+    :param value: time string, such as `modifiedTime` of a file.
+    :return: a datetime with UTC timezone.
+    """
+    value = value.rstrip("Z")
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f" if "." in value else "%Y-%m-%dT%H:%M:%S") \
+        .replace(tzinfo=timezone.utc)
+
+
+def word_prefix_pattern(value: str) -> Pattern:
+    """Compiles a regular expression searching `value` the way `name contains` of the Drive API matches names: at the
+    start of the name or of a word separated by spaces, ignoring case and punctuation before the word.
+
+    :param value: the string searched.
+    :return: a compiled regular expression.
+    """
+    return re.compile(r"(?:^|\s)[\W_]*?" + re.escape(value), re.IGNORECASE)
+
+
+def _quote(value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace("'", "\\'")
+    return f"'{escaped}'"
+
+
+def _group(query: Query, joined_by: str) -> str:
+    # conditions joined by another operator are grouped, so that "and" and "or" need not be ordered.
+    return f"({query.server})" if query.operator not in (None, joined_by) else query.server
+
+
+def _literal(regex: str) -> Optional[str]:
+    body = regex[1:] if regex.startswith("^") else regex
+    if not body.endswith("$") or body.endswith("\\$"):
+        return None
+    body = body[:-1]
+    if re.search(r"\\[A-Za-z0-9]", body) is not None:
+        return None  # character classes, such as "\d", or back references.
+    if any(character in _REGEX_SPECIAL_CHARACTERS for character in re.sub(r"\\.", "", body)):
+        return None
+    return re.sub(r"\\(.)", r"\1", body)
+
+
+def _utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def _format_time(value: datetime) -> str:
+    return _utc(value).strftime("%Y-%m-%dT%H:%M:%S")
+
@@ -0,0 +1,197 @@
+"""Implements client-side rate limiting to pace requests under Google API quotas.
+"""
+import asyncio
+import threading
+import time
+import weakref
+from typing import Optional
+
+from pysuite.utilities import fingerprint, register_after_fork
+
+# (service, operation class) -> (number of requests or quota units, period in seconds), per user. These follow the
+# published per-user quotas of each API.
+DEFAULT_QUOTAS = {
+    ("sheets", "read"): (60, 60),
+    ("sheets", "write"): (60, 60),
+    ("drive", "query"): (1000, 100),
+    ("gmail", "units"): (250, 1),
+}
+
+_LIMITERS = weakref.WeakSet()
+_DEFAULT_LIMITER = None
+_DEFAULT_LIMITER_LOCK = threading.Lock()
+
+
+class TokenBucket:
+    """A thread-safe token bucket. Tokens are added at a constant `rate` up to `capacity`. A caller takes tokens
+    before each request and waits if there are not enough.
+
+    :param rate: number of tokens added per second.
+    :param capacity: max number of tokens, which is the max burst of requests.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        if rate <= 0 or capacity <= 0:
+            raise ValueError(f"rate and capacity must be positive. Got {rate} and {capacity}")
+
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, cost: float = 1) -> float:
+        """Takes tokens from the bucket, which may go negative, and returns number of seconds the caller has to wait
+        until the tokens would have been available.
+
+        :param cost: number of tokens to take.
+        :return: number of seconds to wait.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= cost
+            return max(-self._tokens / self.rate, 0)
+
+    def acquire(self, cost: float = 1):
+        """Takes tokens from the bucket, blocking until they are available.
+
+        :param cost: number of tokens to take.
+        :return: None
+        """
+        wait = self.reserve(cost)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, cost: float = 1):
+        """Takes tokens from the bucket without blocking the event loop.
+
+        :param cost: number of tokens to take.
+        :return: None
+        """
+        wait = self.reserve(cost)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class RateLimiter:
+    """Paces requests with token buckets keyed by (service, user, operation class).
+
+    Use `get_rate_limiter()` to share one limiter by all service objects in the process.
+
+    :example:
+
+    >>> drive = Drive(auth, rate_limiter=get_rate_limiter())
+    >>> sheets = Sheets(auth, rate_limiter=get_rate_limiter())
+
+    :param quotas: a dictionary from (service, operation class) to (limit, period in seconds). It updates
+      `DEFAULT_QUOTAS`. Operation classes without quota are not limited.
+    """
+
+    def __init__(self, quotas: Optional[dict] = None):
+        self.quotas = dict(DEFAULT_QUOTAS)
+        if quotas is not None:
+            self.quotas.update(quotas)
+
+        self._reset()
+        _LIMITERS.add(self)
+
+    def __getstate__(self) -> dict:
+        return {"quotas": self.quotas}
+
+    def __setstate__(self, state: dict):
+        self.__init__(quotas=state["quotas"])
+
+    def __reduce__(self):
+        # the process-wide limiter is unpickled as the process-wide limiter of the receiving process.
+        if self is _DEFAULT_LIMITER:
+            return get_rate_limiter, ()
+        return super().__reduce__()
+
+    def get_bucket(self, service: str, user: str, operation: str) -> Optional[TokenBucket]:
+        """Gets the token bucket of the quota.
+
+        :param service: name of the API, such as "sheets".
+        :param user: identity of the user. See `user_key`.
+        :param operation: operation class, such as "read" or "write".
+        :return: a TokenBucket object, or None if the operation has no quota.
+        """
+        key = (service, user, operation)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                quota = self.quotas.get((service, operation))
+                if quota is None:
+                    return None
+                limit, period = quota
+                bucket = self._buckets[key] = TokenBucket(rate=limit / period, capacity=limit)
+            return bucket
+
+    def acquire(self, service: str, user: str, operation: str, cost: float = 1):
+        """Blocks until the request is allowed by the quota.
+
+        :param service: name of the API, such as "sheets".
+        :param user: identity of the user. See `user_key`.
+        :param operation: operation class, such as "read" or "write".
+        :param cost: number of requests or quota units the request costs.
+        :return: None
+        """
+        bucket = self.get_bucket(service, user, operation)
+        if bucket is not None:
+            bucket.acquire(cost)
+
+    async def acquire_async(self, service: str, user: str, operation: str, cost: float = 1):
+        """Waits until the request is allowed by the quota without blocking the event loop.
+
+        :param service: name of the API, such as "sheets".
+        :param user: identity of the user. See `user_key`.
+        :param operation: operation class, such as "read" or "write".
+        :param cost: number of requests or quota units the request costs.
+        :return: None
+        """
+        bucket = self.get_bucket(service, user, operation)
+        if bucket is not None:
+            await bucket.acquire_async(cost)
+
+    def _reset(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Gets the rate limiter shared by the whole process, using `DEFAULT_QUOTAS`.
+
+    :return: a RateLimiter object.
+    """
+    global _DEFAULT_LIMITER
+    if _DEFAULT_LIMITER is None:
+        with _DEFAULT_LIMITER_LOCK:
+            if _DEFAULT_LIMITER is None:
+                _DEFAULT_LIMITER = RateLimiter()
+    return _DEFAULT_LIMITER
+
+
+def user_key(auth) -> str:
+    """Gets a string identifying the user of an Authentication object. Objects loaded from the same credential share
+    the same key.
+
+    :param auth: a pysuite Authentication object.
+    :return: a string identifying the user.
+    """
+    credential = auth.credential
+    refresh_token = getattr(credential, "refresh_token", None)
+    if refresh_token is not None:
+        return fingerprint(refresh_token)
+    return f"credential-{id(credential)}"
+
+
+def _reset_after_fork():
+    # the lock may be held by a thread of the parent process.
+    global _DEFAULT_LIMITER_LOCK
+    _DEFAULT_LIMITER_LOCK = threading.Lock()
+    for limiter in list(_LIMITERS):
+        limiter._reset()
+
+
+register_after_fork(_reset_after_fork)
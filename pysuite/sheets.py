@@ -1,20 +1,22 @@
 """Implements api to access google sheet.
 """
 import logging
-from typing import Optional, List
+from typing import Optional, List, Tuple
 import re
 
-from googleapiclient.discovery import build
 from googleapiclient.discovery import Resource
 
 from pysuite.auth import Authentication
-from pysuite.utilities import retry_on_out_of_quota, MAX_RETRY_ATTRIBUTE, SLEEP_ATTRIBUTE
+from pysuite.concurrency import AdaptiveConcurrency, bulk_map
+from pysuite.discovery import get_resource
+from pysuite.ratelimit import RateLimiter, user_key
+from pysuite.utilities import retry_on_out_of_quota, RetryPolicy, MAX_RETRY_ATTRIBUTE, SLEEP_ATTRIBUTE
 
 VALID_DIMENSION = {"COLUMNS", "ROWS"}
 
 
-def _get_client(auth: Authentication, version: str) -> Resource:
-    return build("sheets", version, credentials=auth.credential).spreadsheets()
+def _get_client(auth: Authentication, version: str, *path: str, api_endpoint: Optional[str] = None) -> Resource:
+    return get_resource("sheets", version, auth, "spreadsheets", *path, api_endpoint=api_endpoint)
 
 
 class Sheets:
@@ -23,12 +25,49 @@ class Sheets:
     :param auth: an authorized Google Spreadsheet service client.
     :param max_retry: max number of retry on quota exceeded error. if 0 or less, no retry will be attempted.
     :param sleep: base number of seconds between retries. the sleep time is exponentially increased after each retry.
+    :param api_endpoint: base url of Google Sheets API, such as "http://localhost:8080/". If None, the default Google
+      endpoint is used.
+    :param retry_policy: a RetryPolicy object deciding which errors are retried and how long to wait. If provided,
+      `max_retry` and `sleep` are ignored. Its `stats` shows retries made by this object. If None, a policy is built
+      from `max_retry` and `sleep`, which can be changed later. See `pysuite.utilities.get_retry_policy`. Calls that
+      are not idempotent, `create_spreadsheet` and `batch_update`, are only retried on quota errors, so that they are
+      never applied twice.
+    :param rate_limiter: a RateLimiter object pacing read and write requests under the per user quotas of Google Sheets
+      API, such as `pysuite.ratelimit.get_rate_limiter()` shared by the whole process. If None, requests are not rate
+      limited.
+    :param concurrency: an AdaptiveConcurrency object running bulk operations, such as `download_many`, concurrently
+      under a limit adapted to quota errors. If None, bulk operations run sequentially.
+
+    Sheets objects are thread-safe. One object can be shared by many threads, which send requests through the pooled
+    transport of `auth` concurrently. Sheets objects can also be pickled and used after `os.fork()`. The API client is
+    rebuilt lazily in the new process.
     """
 
-    def __init__(self, auth: Authentication, version: str = "v4", max_retry: int = 0, sleep: int = 5):
-        self._client = _get_client(auth, version)
+    def __init__(self, auth: Authentication, version: str = "v4", max_retry: int = 0, sleep: int = 5,
+                 api_endpoint: Optional[str] = None, retry_policy: Optional[RetryPolicy] = None,
+                 rate_limiter: Optional[RateLimiter] = None, concurrency: Optional[AdaptiveConcurrency] = None):
+        self._auth = auth
+        self._version = version
+        self._api_endpoint = api_endpoint
         setattr(self, MAX_RETRY_ATTRIBUTE, max_retry)
         setattr(self, SLEEP_ATTRIBUTE, sleep)
+        self.retry_policy = retry_policy
+        self.rate_limiter = rate_limiter
+        self.concurrency = concurrency
+
+    @property
+    def _client(self) -> Resource:
+        # resources are cached per process by pysuite.discovery, so this is cheap and safe after fork or unpickling.
+        return _get_client(self._auth, self._version, api_endpoint=self._api_endpoint)
+
+    @property
+    def _values(self) -> Resource:
+        return _get_client(self._auth, self._version, "values", api_endpoint=self._api_endpoint)
+
+    def _execute(self, request, operation: str):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire("sheets", user_key(self._auth), operation)
+        return request.execute()
 
     @retry_on_out_of_quota()
     def download(self, id: str, sheet_range: str, dimension: str = "ROWS", fill_row: bool = False) -> list:
@@ -49,9 +88,7 @@ class Sheets:
         if dimension not in VALID_DIMENSION:
             raise ValueError(f"{dimension} is not a valid dimension. expecting {VALID_DIMENSION}.")
 
-        result = self._client.values().get(spreadsheetId=id,
-                                           range=sheet_range,
-                                           majorDimension=dimension).execute()
+        result = self._execute(self._values.get(spreadsheetId=id, range=sheet_range, majorDimension=dimension), "read")
         values = result.get('values', [])
 
         if fill_row and dimension == "ROWS":
@@ -60,6 +97,18 @@ class Sheets:
 
         return values
 
+    def download_many(self, ranges: List[Tuple[str, str]], dimension: str = "ROWS", fill_row: bool = False) -> list:
+        """Downloads many sheet ranges. They are downloaded concurrently if `concurrency` is set.
+
+        :param ranges: a list of tuples of (spreadsheet id, sheet range).
+        :param dimension: "ROW" or "COLUMNS". See `download`.
+        :param fill_row: Whether force to return rows with desired number of columns. See `download`.
+        :return: a list of downloaded values in the order of `ranges`.
+        """
+        return bulk_map(lambda range: self.download(id=range[0], sheet_range=range[1], dimension=dimension,
+                                                    fill_row=fill_row),
+                        ranges, self.concurrency)
+
     @retry_on_out_of_quota()
     def upload(self, values: list, id: str, sheet_range: str) -> None:
         """Uploads a list of lists to target sheet range.
@@ -75,11 +124,11 @@ class Sheets:
         self.clear(id=id, sheet_range=sheet_range)
         body = {"values": values}
         logging.info(f"Updating sheet '{id}' range '{sheet_range}'")
-        request = self._client.values().update(spreadsheetId=id,
-                                               range=sheet_range,
-                                               valueInputOption="RAW",
-                                               body=body)
-        result = request.execute()
+        request = self._values.update(spreadsheetId=id,
+                                      range=sheet_range,
+                                      valueInputOption="RAW",
+                                      body=body)
+        result = self._execute(request, "write")
         msg = f"{result.get('updatedRange')} has been updated ({result.get('updatedRows')} rows " \
               f"and {result.get('updatedColumns')} columns)"
         logging.info(msg)
@@ -93,7 +142,7 @@ class Sheets:
           "sheet" and download column A to D and rows from 1 to the last row with non-empty values.
         :return: None
         """
-        self._client.values().clear(spreadsheetId=id, range=sheet_range, body={}).execute()
+        self._execute(self._values.clear(spreadsheetId=id, range=sheet_range, body={}), "write")
 
     def read_sheet(self, id: str, sheet_range: str, header: bool = True, dtypes: Optional[dict] = None,
                    columns: Optional[list] = None, fill_row: bool = True):
@@ -159,7 +208,7 @@ class Sheets:
         values.insert(0, list(df.columns))  # insert column names to first row.
         self.upload(values, id=id, sheet_range=sheet_range)
 
-    @retry_on_out_of_quota()
+    @retry_on_out_of_quota(idempotent=False)
     def create_spreadsheet(self, name: str) -> str:
         """Creates a spreadsheet with requested name.
 
@@ -169,10 +218,10 @@ class Sheets:
         file_metadata = {
             "properties": {"title": name}
         }
-        response = self._client.create(body=file_metadata, fields="spreadsheetId").execute()
+        response = self._execute(self._client.create(body=file_metadata, fields="spreadsheetId"), "write")
         return response.get("spreadsheetId")
 
-    @retry_on_out_of_quota()
+    @retry_on_out_of_quota(idempotent=False)
     def batch_update(self, id: str, body: dict):
         """Low level api used to submit a json body to make changes to the specified spreadsheet.
 
@@ -180,7 +229,7 @@ class Sheets:
         :param body: request json.
         :return: response from batch update.
         """
-        response = self._client.batchUpdate(spreadsheetId=id, body=body).execute()
+        response = self._execute(self._client.batchUpdate(spreadsheetId=id, body=body), "write")
         return response
 
     def create_tab(self, id: str, title: str):
@@ -1,18 +1,24 @@
 """Implements api to access google storage API.
 """
+import os
 from pathlib import PosixPath, Path
-from typing import Union
+from typing import Union, Optional
 
 from google.cloud import storage
 from google.cloud.storage.client import Bucket
 
 from pysuite.auth import Authentication
+from pysuite.concurrency import AdaptiveConcurrency, bulk_map
+from pysuite.instrumentation import instrument, is_enabled, set_payload_size
+from pysuite.utilities import GS_HEADER, is_gcs_uri
 
-GS_HEADER = "gs://"
 
+MAX_BATCH_SIZE = 1000  # max number of requests in a batch request of Google Storage API
 
-def _get_client(auth: Authentication):
-    return storage.Client(project=auth.project_id, credentials=auth.credential)
+
+def _get_client(auth: Authentication, api_endpoint: Optional[str] = None):
+    client_options = {"api_endpoint": api_endpoint} if api_endpoint is not None else None
+    return storage.Client(project=auth.project_id, credentials=auth.credential, client_options=client_options)
 
 
 class Storage:
@@ -20,15 +26,43 @@ class Storage:
 
     :param auth: An pysuite Authentication object.
     :param project_id: The project id for the corresponding credential.
-    """
+    :param concurrency: an AdaptiveConcurrency object transferring files of a folder concurrently under a limit adapted
+      to quota errors. If None, files are transferred sequentially.
+    :param api_endpoint: base url of Google Storage API, such as "http://localhost:8080". If None, the default Google
+      endpoint is used.
 
-    def __init__(self, auth: Authentication):
-        self._client = _get_client(auth)
+    Storage objects can be pickled and used after `os.fork()`. The client is rebuilt lazily in the new process.
+    """
 
+    def __init__(self, auth: Authentication, concurrency: Optional[AdaptiveConcurrency] = None,
+                 api_endpoint: Optional[str] = None):
+        self._auth = auth
+        self.concurrency = concurrency
+        self._api_endpoint = api_endpoint
+        self._cached_client = None
+        self._client_pid = None
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_cached_client"] = None
+        return state
+
+    @property
+    def _client(self) -> storage.Client:
+        # the client holds connections that cannot be shared with a forked or unpickled copy, so it is rebuilt lazily
+        # in each process.
+        pid = os.getpid()
+        if self._cached_client is None or self._client_pid != pid:
+            self._cached_client = _get_client(self._auth, self._api_endpoint)
+            self._client_pid = pid
+        return self._cached_client
+
+    @instrument()
     def upload(self, from_object: Union[str, PosixPath], to_object: str):
         """Uploads a file or a folder to google storage.
 
-        If `from_object` is a folder, this method will upload it recursively.
+        If `from_object` is a folder, this method will upload it recursively. Files are uploaded concurrently if
+        `concurrency` is set.
 
         :param from_object: Path to the local file or folder to be uploaded.
         :param to_object: Target Google storage object location. If `from_object` is a file, this will be a file. If
@@ -44,16 +78,19 @@ class Storage:
         if from_object.is_file():
             blob = bucket.blob(_gs_object)
             blob.upload_from_filename(str(from_object))
+            if is_enabled():  # avoids a stat call when calls are not measured.
+                set_payload_size(from_object.stat().st_size)
         else:
-            for _from, _to in _add_folder_tree_to_new_base_dir(from_object, _gs_object):
-                if _from.is_file():
-                    blob = bucket.blob(_to)
-                    blob.upload_from_filename(str(_from))
+            files = [(_from, _to) for _from, _to in _add_folder_tree_to_new_base_dir(from_object, _gs_object)
+                     if _from.is_file()]
+            bulk_map(lambda file: bucket.blob(file[1]).upload_from_filename(str(file[0])), files, self.concurrency)
 
+    @instrument()
     def download(self, from_object: str, to_object: Union[str, PosixPath]):
         """Downloads target Google storage file or folder to local.
 
-        If `from_object` is a folder, this method will download it recursively.
+        If `from_object` is a folder, this method will download it recursively. Files are downloaded concurrently if
+        `concurrency` is set.
 
         :param from_object: Target Google storage path to be downloaded. This is a string that looks like "gs://xxxx".
         :param to_object: Path to the local file or folder. If `from_object` is a file, this will be a file. If
@@ -65,28 +102,33 @@ class Storage:
         if len(blobs) == 1:
             # No way we can tell if it's a folder or file, always consider it as file
             blobs[0].download_to_filename(str(to_object))
+            if is_enabled():
+                set_payload_size(to_object.stat().st_size)
         else:
-            for blob in blobs:
-                _to_file = to_object / blob.name
-                _to_file.parent.mkdir(parents=True, exist_ok=True)
-                blob.download_to_filename(str(_to_file))
+            bulk_map(lambda blob: self._download_blob(blob, to_object / blob.name), blobs, self.concurrency)
 
+    @instrument()
     def remove(self, target_object: str):
         """Removes target Google storage file or folder.
 
-        If `target_object` is a folder, this will remove it recursively.
+        If `target_object` is a folder, this will remove it recursively. Files are deleted with batch requests of up to
+        `MAX_BATCH_SIZE` files.
 
         :param target_object: Target Google storage file or folder. This is a string that looks like "gs://xxxx".
         :return: None
         """
-        _bucket, _ = self._split_gs_object(target_object)
-        bucket = self.get_bucket(bucket_name=_bucket)
-        bucket.delete_blobs(blobs=list(self.list(target_object=target_object)))
+        blobs = list(self.list(target_object=target_object))
+        for start in range(0, len(blobs), MAX_BATCH_SIZE):
+            with self._client.batch():
+                for blob in blobs[start:start + MAX_BATCH_SIZE]:
+                    blob.delete()
 
+    @instrument()
     def copy(self, from_object: str, to_object: str):
         """Copies Google storage file or folder from one location to another.
 
-        If `from_object` is a folder, this will copy it recursively.
+        If `from_object` is a folder, this will copy it recursively. Files are copied concurrently if `concurrency` is
+        set.
 
         :param from_object: Source Google storage file or folder. This is a string that looks like "gs://xxxx".
         :param to_object: Destination Google storage file or folder. This is a string that looks like "gs://xxxx".
@@ -101,10 +143,8 @@ class Storage:
             src_bucket.copy_blob(blobs[0], dest_bucket, _dest_prefix)
         else:
             _src_prefix_len = len(_src_gs_object)
-            for blob in blobs:
-                name = blob.name
-                _dest_gs_object = _dest_prefix + name[_src_prefix_len:]
-                src_bucket.copy_blob(blob, dest_bucket, _dest_gs_object)
+            bulk_map(lambda blob: src_bucket.copy_blob(blob, dest_bucket, _dest_prefix + blob.name[_src_prefix_len:]),
+                     blobs, self.concurrency)
 
     def list(self, target_object: str):
         """Searches Google storage target location and return an iterator.
@@ -121,6 +161,7 @@ class Storage:
         blob_iterator = bucket.list_blobs(prefix=_gs_object)
         return blob_iterator
 
+    @instrument()
     def create_bucket(self, bucket_name: str) -> Bucket:
         """Create a bucket in Google Storage.
 
@@ -129,6 +170,7 @@ class Storage:
         """
         return self._client.create_bucket(bucket_name)
 
+    @instrument()
     def get_bucket(self, bucket_name: str) -> Bucket:
         """Gets a Bucket object for the target Google storage bucket.
 
@@ -137,6 +179,7 @@ class Storage:
         """
         return self._client.get_bucket(bucket_name)
 
+    @instrument()
     def remove_bucket(self, bucket_name: str, force: bool = False):
         """Removes the target bucket.
 
@@ -148,6 +191,10 @@ class Storage:
         bucket = self._client.get_bucket(bucket_name)
         bucket.delete(force=force)
 
+    def _download_blob(self, blob, to_file: PosixPath):
+        to_file.parent.mkdir(parents=True, exist_ok=True)
+        blob.download_to_filename(str(to_file))
+
     def _split_gs_object(self, target_object: str) -> (str, str):
         """Splits a string that looks like "gs://bucket_name/object/path" into bucket name and object path.
 
@@ -163,10 +210,6 @@ class Storage:
         return bucket, object_path
 
 
-def is_gcs_uri(target_uri: str):
-    return isinstance(target_uri, str) and target_uri.startswith(GS_HEADER)
-
-
 def _add_folder_tree_to_new_base_dir(from_path: PosixPath, to_path: str) -> (PosixPath, str):
     """Constructs Google storage folder tree based on local folder tree so that the hierarchy is maintained.
 
@@ -0,0 +1,76 @@
+"""Implements an on-disk access token cache shared by processes using the same credential.
+"""
+import json
+from datetime import datetime
+from pathlib import Path, PosixPath
+from typing import ContextManager, Optional, Tuple, Union
+
+from pysuite.utilities import atomic_write, file_lock, fingerprint
+
+_EXPIRY_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+class TokenCache:
+    """Stores the access token and its expiry in a json file, so that processes sharing a credential file reuse one
+    refreshed token instead of refreshing on their own.
+
+    Writes are atomic and a lock file serializes refreshes, so only one process refreshes while the others wait and
+    reuse its result. The token is stored in plain text with owner-only permission. File locking is only available on
+    POSIX systems. On other systems the cache still works but does not prevent concurrent refreshes.
+
+    :param path: path to the cache file.
+    """
+
+    def __init__(self, path: Union[str, PosixPath]):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+
+    @classmethod
+    def for_credential_file(cls, credential_file: Union[str, PosixPath]) -> "TokenCache":
+        """Creates a cache file next to the credential file. For example, "/path/credential.json" is cached in
+        "/path/credential.json.token_cache".
+
+        :param credential_file: path to the credential json file.
+        :return: a TokenCache object.
+        """
+        credential_file = Path(credential_file)
+        return cls(credential_file.with_name(credential_file.name + ".token_cache"))
+
+    def lock(self) -> ContextManager:
+        """Acquires an exclusive lock across processes. It blocks until the lock is released by other processes.
+        """
+        return file_lock(self.lock_path)
+
+    def load(self, refresh_token: Optional[str] = None) -> Optional[Tuple[str, Optional[datetime]]]:
+        """Loads the cached token.
+
+        :param refresh_token: refresh token of the credential. If the token was cached for a different refresh token,
+          it is ignored.
+        :return: a tuple of (token, expiry) or None if nothing is cached. expiry is a naive UTC datetime or None.
+        """
+        try:
+            with open(self.path, "r") as fp:
+                cached = json.load(fp)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if cached.get("fingerprint") != fingerprint(refresh_token) or not cached.get("token"):
+            return None
+
+        expiry = cached.get("expiry")
+        return cached["token"], datetime.strptime(expiry, _EXPIRY_FORMAT) if expiry is not None else None
+
+    def save(self, token: str, expiry: Optional[datetime], refresh_token: Optional[str] = None):
+        """Writes the token to the cache file atomically.
+
+        :param token: access token.
+        :param expiry: expiry of the access token as a naive UTC datetime.
+        :param refresh_token: refresh token of the credential, used to tell whether the cache belongs to a credential.
+        :return: None
+        """
+        content = {
+            "token": token,
+            "expiry": expiry.strftime(_EXPIRY_FORMAT) if expiry is not None else None,
+            "fingerprint": fingerprint(refresh_token),
+        }
+        atomic_write(self.path, json.dumps(content))
@@ -0,0 +1,142 @@
+"""Implements http transport shared by Google API clients.
+"""
+import os
+import threading
+import time
+import weakref
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httplib2
+from googleapiclient.http import build_http
+
+from pysuite.instrumentation import is_enabled, record_http
+from pysuite.utilities import register_after_fork
+
+CONNECTIONS_PER_HOST_ENV = "PYSUITE_CONNECTIONS_PER_HOST"
+DEFAULT_CONNECTIONS_PER_HOST = 10
+
+_POOLS = weakref.WeakSet()
+
+
+def get_default_connections_per_host() -> int:
+    """Gets the default pool size of PooledHttp in the current process. It can be configured per process by
+    environment variable "PYSUITE_CONNECTIONS_PER_HOST".
+
+    :return: default max number of connections to each host.
+    """
+    return int(os.environ.get(CONNECTIONS_PER_HOST_ENV, DEFAULT_CONNECTIONS_PER_HOST))
+
+
+class PooledHttp:
+    """A thread-safe replacement of httplib2.Http that keeps a pool of keep-alive connections for each host.
+
+    Every pooled connection is an httplib2.Http object that is used by only one request at a time and returned to the
+    pool afterwards, so that following requests to the same host reuse its open connection instead of making a new
+    TCP/TLS handshake.
+
+    In a child process created by `os.fork()`, connections opened by the parent process are dropped from the pool.
+
+    :param connections_per_host: max number of concurrent connections to each host. Requests beyond this limit wait
+      until a connection is returned to the pool. If None, `get_default_connections_per_host()` is used.
+    """
+
+    def __init__(self, connections_per_host: Optional[int] = None):
+        if connections_per_host is None:
+            connections_per_host = get_default_connections_per_host()
+
+        if connections_per_host < 1:
+            raise ValueError(f"connections_per_host must be positive. Got {connections_per_host}")
+
+        self.connections_per_host = connections_per_host
+        self._reset()
+        _POOLS.add(self)
+
+    @property
+    def stats(self) -> dict:
+        """Counters of requests made through this transport.
+
+        :return: a dictionary containing number of 'requests', 'new_connections' and 'reused_connections'.
+        """
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "new_connections": self._new_connections,
+                "reused_connections": self._reused_connections,
+            }
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=httplib2.DEFAULT_MAX_REDIRECTS,
+                connection_type=None, **kwargs):
+        """Implementation of httplib2's Http.request using a pooled connection.
+        """
+        parsed = urlsplit(uri)
+        host = f"{parsed.scheme}:{parsed.netloc.lower()}"
+        with self._get_slots(host):
+            http = self._checkout(host)
+            start = time.perf_counter()
+            try:
+                response = http.request(uri, method=method, body=body, headers=headers, redirections=redirections,
+                                        connection_type=connection_type, **kwargs)
+            except Exception:
+                # the connection may be in an unknown state. do not return it to the pool.
+                http.close()
+                if is_enabled():
+                    record_http(body, None, None, time.perf_counter() - start)
+                raise
+
+            self._checkin(host, http)
+            if is_enabled():
+                record_http(body, response[1], response[0].status, time.perf_counter() - start)
+            return response
+
+    def close(self):
+        """Closes all idle connections.
+
+        :return: None
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+
+        for pool in idle.values():
+            for http in pool:
+                http.close()
+
+    def _reset(self):
+        self._idle = {}  # host -> list of idle httplib2.Http objects
+        self._slots = {}  # host -> semaphore limiting concurrent connections
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._new_connections = 0
+        self._reused_connections = 0
+
+    def _get_slots(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            slots = self._slots.get(host)
+            if slots is None:
+                slots = self._slots[host] = threading.BoundedSemaphore(self.connections_per_host)
+            return slots
+
+    def _checkout(self, host: str) -> httplib2.Http:
+        with self._lock:
+            self._requests += 1
+            pool = self._idle.get(host)
+            http = pool.pop() if pool else None
+            if http is not None and http.connections:
+                self._reused_connections += 1
+                return http
+
+            self._new_connections += 1
+
+        return http if http is not None else build_http()
+
+    def _checkin(self, host: str, http: httplib2.Http):
+        with self._lock:
+            self._idle.setdefault(host, []).append(http)
+
+
+def _reset_after_fork():
+    for pool in list(_POOLS):
+        pool._reset()
+
+
+register_after_fork(_reset_after_fork)
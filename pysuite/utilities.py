@@ -1,54 +1,380 @@
+import contextlib
+import email.utils
 import functools
+import hashlib
+import itertools
+import os
+import random
 import re
+import socket
+import tempfile
+import threading
 import warnings
 import time
-from typing import Optional
+from datetime import datetime, timezone
+from pathlib import Path, PosixPath
+from typing import Optional, Callable, Iterable, Tuple, Union, Pattern
 
 from googleapiclient.errors import HttpError
 
+from pysuite.instrumentation import is_enabled, measure
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
 MAX_RETRY_ATTRIBUTE = "max_retry"
 SLEEP_ATTRIBUTE = "sleep"
+RETRY_POLICY_ATTRIBUTE = "retry_policy"
+DEFAULT_POLICY_ATTRIBUTE = "_default_retry_policy"
+GS_HEADER = "gs://"
 
 
-def retry_on_type_and_msg(exception: Exception, msg_pattern: Optional[str] = None):
+DEFAULT_RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+DEFAULT_RETRY_EXCEPTIONS = (ConnectionError, socket.timeout)
+QUOTA_MESSAGE_PATTERN = re.compile(".*(User Rate Limit Exceeded|Quota exceeded)+.*")
+
+
+class RetryPolicy:
+    """Decides which errors are retried and how long to wait between attempts.
+
+    An HttpError is retried if its status code is in `retry_status_codes` or its message matches `message_pattern`.
+    Other errors are retried if they are instances of `retry_exceptions`. A custom `classifier` replaces these rules.
+    The wait before the n-th retry is `sleep * multiplier ** (n - 1)`, capped by `max_sleep` and reduced by a random
+    fraction up to `jitter`, so that workers failing at the same time do not retry in lockstep. If the response has a
+    Retry-After header, the wait is at least that long.
+
+    :param max_retry: max number of retries. If 0 or less, no retry will be attempted.
+    :param sleep: base number of seconds between retries.
+    :param multiplier: factor by which the wait grows after each retry.
+    :param max_sleep: max number of seconds of one wait. If None, it is not capped.
+    :param jitter: fraction of the wait, between 0 and 1, that is randomly removed. 0 disables jitter.
+    :param max_elapsed: max number of seconds since the first attempt. No retry is attempted if it would wait beyond
+      it. If None, only `max_retry` limits retries.
+    :param retry_status_codes: HTTP status codes that are always retried.
+    :param retry_exceptions: exception types, other than HttpError, that are always retried, such as connection resets.
+    :param message_pattern: a regular expression. HttpError whose message matches it is retried. By default, it matches
+      quota exceeded errors.
+    :param classifier: a function that takes an exception and returns whether it should be retried. If provided, other
+      classification arguments are ignored.
+    :param respect_retry_after: whether waiting at least as long as the Retry-After header of the response.
+    """
+
+    def __init__(self, max_retry: int = 0, sleep: float = 5, multiplier: float = 2, max_sleep: Optional[float] = None,
+                 jitter: float = 0.5, max_elapsed: Optional[float] = None,
+                 retry_status_codes: Iterable[int] = DEFAULT_RETRY_STATUS_CODES,
+                 retry_exceptions: Tuple[type, ...] = DEFAULT_RETRY_EXCEPTIONS,
+                 message_pattern: Optional[Union[str, Pattern]] = QUOTA_MESSAGE_PATTERN,
+                 classifier: Optional[Callable[[Exception], bool]] = None, respect_retry_after: bool = True):
+        if sleep < 0:
+            raise ValueError(f"sleep must be positive. Got {sleep}")
+        if not 0 <= jitter <= 1:
+            raise ValueError(f"jitter must be between 0 and 1. Got {jitter}")
+
+        self.max_retry = max(max_retry, 0)
+        self.sleep = sleep
+        self.multiplier = multiplier
+        self.max_sleep = max_sleep
+        self.jitter = jitter
+        self.max_elapsed = max_elapsed
+        self.retry_status_codes = frozenset(retry_status_codes)
+        self.retry_exceptions = tuple(retry_exceptions)
+        self.message_pattern = re.compile(message_pattern) if isinstance(message_pattern, str) else message_pattern
+        self.classifier = classifier
+        self.respect_retry_after = respect_retry_after
+        self._reset_stats()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["_lock"], state["_stats"]
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._reset_stats()
+
+    def __copy__(self) -> "RetryPolicy":
+        # a copy counts its own calls, starting from the counters of this policy.
+        result = type(self).__new__(type(self))
+        result.__setstate__(self.__getstate__())
+        result._stats = self.stats
+        return result
+
+    @property
+    def stats(self) -> dict:
+        """Counters of calls made with this policy.
+
+        :return: a dictionary containing number of 'calls', 'retries', 'failures' (calls that raised after giving up
+          or on a non-retryable error) and total 'sleep_seconds'.
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def is_retryable(self, error: Exception) -> bool:
+        """Checks whether the error should be retried.
+
+        :param error: the raised exception.
+        :return: True if the error should be retried.
+        """
+        if self.classifier is not None:
+            return bool(self.classifier(error))
+
+        if isinstance(error, HttpError):
+            if error.resp.status in self.retry_status_codes:
+                return True
+            return self.message_pattern is not None and self.message_pattern.match(str(error)) is not None
+
+        return isinstance(error, self.retry_exceptions)
+
+    def get_delay(self, retry: int, error: Optional[Exception] = None) -> float:
+        """Calculates number of seconds to wait before the retry.
+
+        :param retry: number of the retry, starting from 1.
+        :param error: the raised exception. Its Retry-After header is respected if present.
+        :return: number of seconds to wait.
+        """
+        delay = self.sleep * self.multiplier ** (retry - 1)
+        if self.max_sleep is not None:
+            delay = min(delay, self.max_sleep)
+        delay *= 1 - random.uniform(0, self.jitter)
+
+        if self.respect_retry_after and error is not None:
+            retry_after = _get_retry_after(error)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+
+        return delay
+
+    def call(self, func: Callable, *args, **kwargs):
+        """Calls the function and retries it according to this policy.
+
+        :param func: function to be called.
+        :param args: positional arguments of the function.
+        :param kwargs: keyword arguments of the function.
+        :return: the returned value of the function.
+        """
+        return self._call(self.is_retryable, func, *args, **kwargs)
+
+    def _call(self, is_retryable: Callable[[Exception], bool], func: Callable, *args, **kwargs):
+        self._count("calls")
+        start = time.monotonic()
+        retry = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                retry += 1
+                remaining = self.max_retry - retry
+                delay = self.get_delay(retry, e) if remaining >= 0 and is_retryable(e) else None
+                if delay is None or self.max_elapsed is not None and time.monotonic() - start + delay > self.max_elapsed:
+                    self._count("failures")
+                    raise
+
+                warnings.warn(f"handled exception {e}. remaining retry: {remaining}", UserWarning)
+                self._count("retries")
+                self._count("sleep_seconds", delay)
+                time.sleep(delay)
+
+    def _reset_stats(self):
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "retries": 0, "failures": 0, "sleep_seconds": 0.0}
+
+    def _count(self, name: str, value: float = 1):
+        with self._lock:
+            self._stats[name] += value
+
+
+def get_retry_policy(obj) -> RetryPolicy:
+    """Gets the retry policy of an object.
+
+    It is the "retry_policy" attribute if it is not None. Otherwise a policy is created from the current "max_retry"
+    and "sleep" attributes, and kept on the object until they are changed.
+
+    :param obj: an object, such as a Drive object.
+    :return: a RetryPolicy object.
+    """
+    policy = getattr(obj, RETRY_POLICY_ATTRIBUTE, None)
+    if policy is not None:
+        return policy
+
+    max_retry = max(getattr(obj, MAX_RETRY_ATTRIBUTE, 0), 0)
+    sleep = getattr(obj, SLEEP_ATTRIBUTE, 5)
+    if sleep < 0:
+        raise AttributeError(f"{SLEEP_ATTRIBUTE} must be positive. Got {sleep}")
+
+    policy = getattr(obj, DEFAULT_POLICY_ATTRIBUTE, None)
+    if policy is None or (policy.max_retry, policy.sleep) != (max_retry, sleep):
+        policy = RetryPolicy(max_retry=max_retry, sleep=sleep)
+        setattr(obj, DEFAULT_POLICY_ATTRIBUTE, policy)
+    return policy
+
+
+def retry_with_policy(classifier: Optional[Callable[[Exception], bool]] = None, idempotent: bool = True):
+    """A decorator to retry class methods according to the retry policy of the object. See `get_retry_policy`. Each
+    attempt is measured by `pysuite.instrumentation` as operation "<class name>.<method name>". Retries are counted in
+    the stats of the object's policy.
+
+    :param classifier: a function that takes an exception and returns whether it should be retried. If provided, it
+      replaces the classification of the object's policy.
+    :param idempotent: whether the method can be called again after it may have taken effect. If False, only quota
+      errors, which reject the request, are retried. A timeout or 5xx error of a call creating a file is not retried,
+      since the file may have been created.
+    :return: a decorator.
+    """
     def wrapper(method):
         @functools.wraps(wrapped=method)
         def wrapped_function(self, *args, **kwargs):
-            max_retry = getattr(self, MAX_RETRY_ATTRIBUTE, 0)
-            max_retry = max(max_retry, 0)
-            sleep = getattr(self, SLEEP_ATTRIBUTE, 5)
-            if sleep < 0:
-                raise AttributeError(f"{SLEEP_ATTRIBUTE} must be positive. Got {sleep}")
-
-            pattern = None
-            if msg_pattern is not None:
-                pattern = re.compile(msg_pattern)
-            while True:
-                max_retry -= 1
-                try:
-                    result = method(self, *args, **kwargs)
-                    return result
-                except exception as e:
-                    if max_retry < 0 or pattern is not None and not pattern.match(str(e)):
-                        # max retry reached or pattern does not match.
-                        raise e
-
-                    warnings.warn(f"handled exception {e}. remaining retry: {max_retry}", UserWarning)
-                    time.sleep(sleep)
-                    sleep = sleep*2
-                    continue
+            policy = get_retry_policy(self)
+            is_retryable = classifier if classifier is not None else policy.is_retryable
+            if not idempotent:
+                is_retryable = _quota_only(is_retryable)
+            if not is_enabled():
+                return policy._call(is_retryable, method, self, *args, **kwargs)
+
+            operation = f"{type(self).__name__}.{method.__name__}"
+            attempts = itertools.count(1)
+            return policy._call(is_retryable, lambda: measure(operation, next(attempts), method, self, *args, **kwargs))
 
         return wrapped_function
 
     return wrapper
 
 
-def retry_on_out_of_quota():
-    """A decorator to give wrapped function ability to retry on quota exceeded related HttpError raise by Google API.
-    It only works on class method and requires "max_retry" and "sleep" attribute in the class. If `max_retry` is
-    non-positive, no retry will be attempt. `sleep` is the base number of seconds between consecutive retries. The
-    number of wait seconds will double after each sleep.
+def retry_on_type_and_msg(exception: Exception, msg_pattern: Optional[str] = None):
+    """A decorator to retry class methods on the given type of exception whose message matches `msg_pattern`. It uses
+    the retry policy of the object. See `get_retry_policy`.
+
+    :param exception: type of exception to be retried.
+    :param msg_pattern: a regular expression. If None, all exceptions of the type are retried.
+    :return: a decorator.
+    """
+    pattern = re.compile(msg_pattern) if msg_pattern is not None else None
+
+    def classifier(error: Exception) -> bool:
+        return isinstance(error, exception) and (pattern is None or pattern.match(str(error)) is not None)
+
+    return retry_with_policy(classifier=classifier)
+
+
+def retry_on_out_of_quota(idempotent: bool = True):
+    """A decorator to give wrapped function ability to retry on quota exceeded related HttpError raise by Google API,
+    as well as 429 and 5xx responses and connection errors.
 
+    It only works on class method. It uses the "retry_policy" attribute of the class if present. Otherwise it requires
+    "max_retry" and "sleep" attribute in the class. If `max_retry` is non-positive, no retry will be attempt. `sleep` is
+    the base number of seconds between consecutive retries. The number of wait seconds will roughly double after each
+    sleep. See `RetryPolicy` for details.
+
+    :param idempotent: whether the method can be called again after it may have taken effect. If False, such as for a
+      method creating a file, only quota errors are retried. See `retry_with_policy`.
     :return:
     """
-    return retry_on_type_and_msg(HttpError, msg_pattern=".*(User Rate Limit Exceeded|Quota exceeded)+.*")
+    return retry_with_policy(idempotent=idempotent)
+
+
+def is_quota_error(error: Exception) -> bool:
+    """Checks whether the error is raised because a rate limit or quota is exceeded. That is a 429 response or an
+    HttpError whose message matches `QUOTA_MESSAGE_PATTERN`.
+
+    :param error: the raised exception.
+    :return: True if it is a quota error.
+    """
+    if isinstance(error, HttpError):
+        return error.resp.status == 429 or QUOTA_MESSAGE_PATTERN.match(str(error)) is not None
+
+    # errors of google-cloud clients, such as google.api_core.exceptions.TooManyRequests, keep the status in `code`.
+    return getattr(error, "code", None) == 429
+
+
+def _quota_only(is_retryable: Callable[[Exception], bool]) -> Callable[[Exception], bool]:
+    return lambda error: is_quota_error(error) and is_retryable(error)
+
+
+def _get_retry_after(error: Exception) -> Optional[float]:
+    """Gets number of seconds in Retry-After header of the response of an HttpError, which is either seconds or a
+    HTTP date. Returns None if not available.
+    """
+    resp = getattr(error, "resp", None)
+    value = resp.get("retry-after") if resp is not None and hasattr(resp, "get") else None
+    if value is None:
+        return None
+
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0)
+
+
+def is_gcs_uri(target_uri: str):
+    return isinstance(target_uri, str) and target_uri.startswith(GS_HEADER)
+
+
+def fingerprint(secret: Optional[str]) -> Optional[str]:
+    """Hashes a secret, such as a refresh token, into a string identifying it without revealing it.
+
+    :param secret: the secret string.
+    :return: hex digest of the sha256 hash of the secret, or None if the secret is None.
+    """
+    if secret is None:
+        return None
+
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+
+def atomic_write(path: Union[str, PosixPath], data: Union[str, bytes]):
+    """Replaces the content of the file atomically, so that readers and crashes never see a partially written file. The
+    data is written to a temporary file, which is readable and writable only by the owner, synced to disk and renamed
+    over the file.
+
+    :param path: path to the file.
+    :param data: the new content.
+    :return: None
+    """
+    path = Path(path)
+    fd, temp_path = tempfile.mkstemp(dir=str(path.parent), prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb" if isinstance(data, bytes) else "w") as fp:
+            fp.write(data)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(temp_path, str(path))
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+@contextlib.contextmanager
+def file_lock(path: Union[str, PosixPath]):
+    """Holds an exclusive lock of the lock file across processes, blocking until other processes release it. File
+    locking is only available on POSIX systems. On other systems, nothing is locked.
+
+    :param path: path to the lock file, which is created if it does not exist.
+    """
+    with open(str(path), "a") as fp:
+        if fcntl is not None:
+            fcntl.flock(fp.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fp.fileno(), fcntl.LOCK_UN)
+
+
+def register_after_fork(func):
+    """Registers a function to be called in the child process after `os.fork()`. Nothing is registered on platforms
+    without fork.
+
+    :param func: a function without arguments.
+    :return: None
+    """
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=func)
@@ -1,6 +1,7 @@
 """Implement api to access google vision API
 """
 import json
+import os
 from pathlib import PosixPath
 from typing import Union, Optional, List
 import warnings
@@ -11,8 +12,9 @@ from google.cloud.vision_v1.types.image_annotator import BatchAnnotateImagesResp
 from google.cloud.vision_v1 import types, ImageAnnotatorClient
 from google.api_core.operation import Operation
 
-from pysuite.storage import is_gcs_uri
+from pysuite.utilities import is_gcs_uri
 from pysuite.auth import Authentication
+from pysuite.instrumentation import instrument
 
 
 def _get_client(auth: Authentication) -> ImageAnnotatorClient:
@@ -23,12 +25,31 @@ class Vision:
     """Interacts with Google Vision API.
 
     :param auth: an authorized Google Vision service client.
+
+    Vision objects can be pickled and used after `os.fork()`. The client is rebuilt lazily in the new process.
     """
 
     def __init__(self, auth: Authentication):
-        self._client = _get_client(auth)
+        self._auth = auth
+        self._cached_client = None
+        self._client_pid = None
         self._requests = []
 
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_cached_client"] = None
+        return state
+
+    @property
+    def _client(self) -> ImageAnnotatorClient:
+        # the client holds connections that cannot be shared with a forked or unpickled copy, so it is rebuilt lazily
+        # in each process.
+        pid = os.getpid()
+        if self._cached_client is None or self._client_pid != pid:
+            self._cached_client = _get_client(self._auth)
+            self._client_pid = pid
+        return self._cached_client
+
     @staticmethod
     def load_image(image_path: Union[str, PosixPath]) -> gv.Image:
         """Loads a local image as Image class that can be used to submit image annotation requests.
@@ -62,6 +83,7 @@ class Vision:
         request = self._create_request(image_path, methods)
         self._requests.append(request)
 
+    @instrument()
     def annotate_image(
             self, image_path: Union[str, PosixPath], methods: Union[List[str], str]
     ) -> AnnotateImageResponse:
@@ -77,6 +99,7 @@ class Vision:
         response = self._client.annotate_image(request=request)
         return response
 
+    @instrument()
     def batch_annotate_image(self) -> Optional[BatchAnnotateImagesResponse]:
         """Submits the prepared requests to annotate images and return a response with annotated content.
 
@@ -92,6 +115,7 @@ class Vision:
         response = self._client.batch_annotate_images(requests=self._requests)
         return response
 
+    @instrument()
     def async_annotate_image(self, output_gcs_uri: str, batch_size: int = 0) -> Optional[Operation]:
         """Annotates images asynchronously and place output in Google Cloud Storage in batches.
 
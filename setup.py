@@ -24,7 +24,7 @@ REQUIRES_PYTHON = '>=3.6.0'
 VERSION = get_version()
 
 REQUIRED = [
-    "google-api-python-client>=1.7.8",
+    "google-api-python-client>=2.0.0",
     "google-api-core>=1.31.1",
     "google-auth>=1.20.1",
     "pyparsing>=2.4.7, <3.0.0",
@@ -0,0 +1,309 @@
+"""A local stand-in for the Google Storage JSON API, so that pysuite.storage.Storage can be tested and benchmarked
+without credentials or network.
+"""
+import base64
+import bisect
+import email
+import hashlib
+import itertools
+import json
+import re
+from datetime import datetime, timezone
+from typing import Optional
+from urllib.parse import quote, unquote, urlsplit, parse_qs
+
+import google_crc32c
+
+from tests.stub_server import StubGoogleApi, _error, _json, _media
+
+MAX_RESULTS = 1000
+BATCH_BOUNDARY = "batch_boundary"
+
+
+class FakeGcsServer(StubGoogleApi):
+    """Serves in-memory Google Storage buckets on a local port through the JSON API.
+
+    It supports buckets get, insert and delete, objects list (with prefix, delimiter and paging), get, delete, copyTo
+    and rewriteTo (with `maxBytesRewrittenPerCall` and rewrite tokens), uploads of "media", "multipart" and "resumable"
+    types, downloads with Range header and `x-goog-hash` checksums, and batch requests. The XML API is not implemented.
+
+    :example:
+
+    >>> with FakeGcsServer() as server:
+    ...     server.add_object("bucket", "folder/file.txt", b"content")
+    ...     storage = Storage(auth, api_endpoint=server.endpoint)
+
+    :param latency: number of seconds each request takes.
+    :param quota: max number of requests per second. Requests beyond it get 429 "User Rate Limit Exceeded" responses.
+      If None, there is no quota.
+    """
+
+    def __init__(self, latency: float = 0, quota: Optional[int] = None):
+        super().__init__(latency=latency, quota=quota)
+        self.buckets = {}  # name -> {"metadata": dict, "objects": {name: dictionary of metadata and "content"}}
+        self.rewrites = {}  # rewrite token -> {"source": object, "done": number of rewritten bytes}
+        self.batch_count = 0
+        self._generations = itertools.count(1)
+        self._names = {}  # bucket name -> sorted object names, removed when objects of the bucket change
+
+    @property
+    def endpoint(self) -> str:
+        return self.url.rstrip("/")
+
+    def add_bucket(self, name: str) -> dict:
+        bucket = {"metadata": {"kind": "storage#bucket", "id": name, "name": name, "location": "US",
+                               "storageClass": "STANDARD", "metageneration": "1", "timeCreated": _now()},
+                  "objects": {}}
+        self.buckets[name] = bucket
+        return bucket
+
+    def add_object(self, bucket: str, name: str, content: bytes = b"",
+                   content_type: str = "application/octet-stream") -> dict:
+        """Adds an object, creating its bucket if needed.
+
+        :param bucket: name of the bucket.
+        :param name: name of the object.
+        :param content: content of the object.
+        :param content_type: content type of the object.
+        :return: the stored object.
+        """
+        if bucket not in self.buckets:
+            self.add_bucket(bucket)
+        generation = str(next(self._generations))
+        crc32c = google_crc32c.Checksum(content).digest()
+        obj = {
+            "kind": "storage#object", "id": f"{bucket}/{name}/{generation}", "name": name, "bucket": bucket,
+            "generation": generation, "metageneration": "1", "contentType": content_type, "size": str(len(content)),
+            "md5Hash": base64.b64encode(hashlib.md5(content).digest()).decode(),
+            "crc32c": base64.b64encode(crc32c).decode(), "etag": generation, "timeCreated": _now(), "updated": _now(),
+            "storageClass": "STANDARD",
+            "selfLink": f"{self.url}storage/v1/b/{bucket}/o/{quote(name, safe='')}",
+            "mediaLink": f"{self.url}download/storage/v1/b/{bucket}/o/{quote(name, safe='')}"
+                         f"?generation={generation}&alt=media",
+            "content": content,
+        }
+        self.buckets[bucket]["objects"][name] = obj
+        self._names.pop(bucket, None)
+        return obj
+
+    def get_content(self, bucket: str, name: str) -> bytes:
+        return self.buckets[bucket]["objects"][name]["content"]
+
+    def _route(self, method: str, path: str, query: dict, body: bytes, headers: dict) -> tuple:
+        if path == "/batch/storage/v1":
+            return self._batch(body, headers)
+        if path.startswith("/upload/storage/v1/b/"):
+            return self._upload(method, _segments(path, "/upload/storage/v1/b/")[0], query, body, headers)
+        if path.startswith("/download/storage/v1/b/"):
+            return self._handle_object("GET", _segments(path, "/download/storage/v1/b/"), dict(query, alt="media"),
+                                       body, headers)
+        if path == "/storage/v1/b" and method == "POST":
+            return self._create_bucket(json.loads(body or b"{}"))
+        if path.startswith("/storage/v1/b/"):
+            segments = _segments(path, "/storage/v1/b/")
+            if len(segments) == 1:
+                return self._handle_bucket(method, segments[0])
+            if len(segments) == 2 and segments[1] == "o" and method == "GET":
+                return self._list_objects(segments[0], query)
+            if len(segments) >= 3 and segments[1] == "o":
+                return self._handle_object(method, segments, query, body, headers)
+        return _error(404, f"{method} {path} is not implemented by fake gcs server")
+
+    def _create_bucket(self, metadata: dict) -> tuple:
+        name = metadata.get("name")
+        if name in self.buckets:
+            return _error(409, f"Bucket already exists: {name}")
+        return _json(200, self.add_bucket(name)["metadata"])
+
+    def _handle_bucket(self, method: str, name: str) -> tuple:
+        bucket = self.buckets.get(name)
+        if bucket is None:
+            return _error(404, f"Bucket not found: {name}")
+        if method == "GET":
+            return _json(200, bucket["metadata"])
+        if method == "DELETE":
+            if bucket["objects"]:
+                return _error(409, f"Bucket is not empty: {name}")
+            del self.buckets[name]
+            self._names.pop(name, None)
+            return 204, "application/json", b"", {}
+        return _error(405, f"{method} is not allowed on buckets")
+
+    def _list_objects(self, name: str, query: dict) -> tuple:
+        bucket = self.buckets.get(name)
+        if bucket is None:
+            return _error(404, f"Bucket not found: {name}")
+
+        names = self._names.get(name)
+        if names is None:
+            names = self._names[name] = sorted(bucket["objects"])
+        prefix = query.get("prefix", "")
+        delimiter = query.get("delimiter")
+        max_results = min(int(query.get("maxResults", MAX_RESULTS)), MAX_RESULTS)
+        index = bisect.bisect_left(names, prefix)
+        if "pageToken" in query:
+            index = max(index, bisect.bisect_right(names, query["pageToken"]))
+
+        items, prefixes = [], []
+        while index < len(names) and names[index].startswith(prefix) and len(items) + len(prefixes) < max_results:
+            end = names[index].find(delimiter, len(prefix)) if delimiter else -1
+            if end < 0:
+                items.append(_metadata(bucket["objects"][names[index]]))
+                index += 1
+            else:
+                # objects under a sub prefix are reported as one prefix and skipped.
+                sub_prefix = names[index][:end + len(delimiter)]
+                prefixes.append(sub_prefix)
+                while index < len(names) and names[index].startswith(sub_prefix):
+                    index += 1
+
+        content = {"kind": "storage#objects", "items": items}
+        if prefixes:
+            content["prefixes"] = prefixes
+        if index < len(names) and names[index].startswith(prefix):
+            content["nextPageToken"] = names[index - 1]
+        return _json(200, content)
+
+    def _handle_object(self, method: str, segments: list, query: dict, body: bytes, headers: dict) -> tuple:
+        bucket = self.buckets.get(segments[0])
+        if bucket is None:
+            return _error(404, f"Bucket not found: {segments[0]}")
+        obj = bucket["objects"].get(segments[2])
+        if obj is None:
+            return _error(404, f"Object not found: {segments[0]}/{segments[2]}")
+
+        if len(segments) == 8 and method == "POST" and segments[3] in ("copyTo", "rewriteTo"):
+            # .../o/{source}/copyTo/b/{destination bucket}/o/{destination}
+            if segments[5] not in self.buckets:
+                return _error(404, f"Bucket not found: {segments[5]}")
+            metadata = json.loads(body) if body else {}
+            if segments[3] == "copyTo":
+                copied = self.add_object(segments[5], segments[7], obj["content"],
+                                         metadata.get("contentType", obj["contentType"]))
+                return _json(200, _metadata(copied))
+            return self._rewrite(obj, segments[5], segments[7], metadata, query)
+        if len(segments) != 3:
+            return _error(404, f"{method} {'/'.join(segments)} is not implemented by fake gcs server")
+
+        if method == "GET" and query.get("alt") == "media":
+            status, content_type, content, response_headers = _media(obj["content"], headers.get("range"))
+            response_headers.update({
+                "x-goog-hash": f"crc32c={obj['crc32c']},md5={obj['md5Hash']}", "x-goog-generation": obj["generation"],
+                "x-goog-metageneration": obj["metageneration"], "x-goog-stored-content-length": obj["size"],
+                "x-goog-stored-content-encoding": "identity",
+            })
+            return status, obj["contentType"], content, response_headers
+        if method == "GET":
+            return _json(200, _metadata(obj))
+        if method == "DELETE":
+            del bucket["objects"][obj["name"]]
+            self._names.pop(segments[0], None)
+            return 204, "application/json", b"", {}
+        return _error(405, f"{method} is not allowed on objects")
+
+    def _rewrite(self, source: dict, bucket: str, name: str, metadata: dict, query: dict) -> tuple:
+        token = query.get("rewriteToken")
+        if token is None:
+            token = f"rewrite_{self._new_id()}"
+            self.rewrites[token] = {"source": source, "done": 0}
+        rewrite = self.rewrites.get(token)
+        if rewrite is None:
+            return _error(400, f"Invalid rewrite token: {token}")
+
+        size = len(rewrite["source"]["content"])
+        rewrite["done"] = min(size, rewrite["done"] + int(query.get("maxBytesRewrittenPerCall", size) or size))
+        content = {"kind": "storage#rewriteResponse", "totalBytesRewritten": str(rewrite["done"]),
+                   "objectSize": str(size), "done": rewrite["done"] == size}
+        if rewrite["done"] < size:
+            content["rewriteToken"] = token
+            return _json(200, content)
+
+        del self.rewrites[token]
+        rewritten = self.add_object(bucket, name, rewrite["source"]["content"],
+                                    metadata.get("contentType", rewrite["source"]["contentType"]))
+        content["resource"] = _metadata(rewritten)
+        return _json(200, content)
+
+    def _upload(self, method: str, bucket: str, query: dict, body: bytes, headers: dict) -> tuple:
+        if bucket not in self.buckets:
+            return _error(404, f"Bucket not found: {bucket}")
+
+        upload_type = query.get("uploadType")
+        if "upload_id" in query:
+            return self._upload_chunk(query["upload_id"], body, headers)
+        if upload_type == "media":
+            return self._save_object(bucket, {"name": query.get("name")}, body, headers.get("content-type"))
+        if upload_type == "multipart":
+            metadata, content_type, content = _split_multipart(body, headers.get("content-type", ""))
+            return self._save_object(bucket, metadata, content, content_type)
+        if upload_type == "resumable":
+            metadata = json.loads(body) if body else {}
+            metadata.setdefault("name", query.get("name"))
+            upload_id = self._new_id()
+            total = headers.get("x-upload-content-length")
+            self.uploads[upload_id] = {"file": bucket, "metadata": metadata, "content": bytearray(),
+                                       "total": int(total) if total else None,
+                                       "content_type": headers.get("x-upload-content-type")}
+            location = f"{self.url}upload/storage/v1/b/{bucket}/o?uploadType=resumable&upload_id={upload_id}"
+            return 200, "application/json", b"", {"Location": location}
+        return _error(400, f"Unsupported upload type: {upload_type}")
+
+    def _complete_upload(self, upload: dict) -> tuple:
+        return self._save_object(upload["file"], upload["metadata"], bytes(upload["content"]), upload["content_type"])
+
+    def _save_object(self, bucket: str, metadata: dict, content: bytes, content_type: Optional[str]) -> tuple:
+        crc32c = base64.b64encode(google_crc32c.Checksum(content).digest()).decode()
+        if metadata.get("crc32c", crc32c) != crc32c:
+            return _error(400, "Provided CRC32C does not match the uploaded data")
+        obj = self.add_object(bucket, metadata["name"], content,
+                              metadata.get("contentType") or content_type or "application/octet-stream")
+        return _json(200, _metadata(obj))
+
+    def _batch(self, body: bytes, headers: dict) -> tuple:
+        self.batch_count += 1
+        message = email.message_from_bytes(b"Content-Type: " + headers.get("content-type", "").encode() + b"\r\n\r\n"
+                                           + body)
+        parts = []
+        for part in message.get_payload():
+            request_line, _, rest = part.get_payload().partition("\n")
+            method, uri, _ = request_line.strip().split(" ", 2)
+            sub_headers, _, sub_body = rest.replace("\r\n", "\n").partition("\n\n")
+            sub_headers = dict(line.split(": ", 1) for line in sub_headers.splitlines() if line)
+            url = urlsplit(uri)
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            status, content_type, content, _ = self._route(
+                method, url.path, query, sub_body.encode(), {key.lower(): value for key, value in sub_headers.items()})
+            content_id = (part["Content-ID"] or "").strip("<>")
+            parts.append(f"--{BATCH_BOUNDARY}\r\nContent-Type: application/http\r\n"
+                         f"Content-ID: <response-{content_id}>\r\n\r\nHTTP/1.1 {status} {_reason(status)}\r\n"
+                         f"Content-Type: {content_type}\r\nContent-Length: {len(content)}\r\n\r\n"
+                         f"{content.decode()}\r\n")
+        content = "".join(parts) + f"--{BATCH_BOUNDARY}--\r\n"
+        return 200, f"multipart/mixed; boundary={BATCH_BOUNDARY}", content.encode(), {}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _segments(path: str, prefix: str) -> list:
+    return [unquote(segment) for segment in path[len(prefix):].split("/")]
+
+
+def _metadata(obj: dict) -> dict:
+    return {key: value for key, value in obj.items() if key != "content"}
+
+
+def _split_multipart(body: bytes, content_type: str) -> tuple:
+    """Splits a multipart/related upload body into metadata, content type and content of the object."""
+    boundary = re.search(r'boundary="?([^";]+)"?', content_type).group(1).encode()
+    parts = body.split(b"--" + boundary)
+    headers, _, metadata = parts[1].partition(b"\r\n\r\n")
+    headers, _, content = parts[2].partition(b"\r\n\r\n")
+    media_type = re.search(rb"content-type: *([^\r\n]+)", headers, re.IGNORECASE)
+    return (json.loads(metadata.rstrip(b"\r\n")), media_type.group(1).decode() if media_type else None,
+            content[:-2] if content.endswith(b"\r\n") else content)
+
+
+def _reason(status: int) -> str:
+    return {200: "OK", 204: "No Content", 404: "Not Found", 409: "Conflict"}.get(status, "Error")
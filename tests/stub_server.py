@@ -0,0 +1,623 @@
+"""A local stand-in for the Google APIs used by pysuite, so that pysuite can be tested without credentials or network.
+"""
+import hashlib
+import itertools
+import json
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from typing import Optional
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from pysuite.query import word_prefix_pattern
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+MAX_PAGE_SIZE = 1000
+
+
+class StubGoogleApi:
+    """Serves an in-memory Google Drive v3 and Google Sheets v4 on a local port.
+
+    Drive supports files.get (including `alt=media` with Range header), files.list with paging and queries,
+    files.create, files.update and files.copy with metadata or media uploads ("media" and "resumable" upload types),
+    files.delete, and changes.getStartPageToken and changes.list over changes made through the API or the helpers of
+    this class. Sheets supports spreadsheets.create, spreadsheets.batchUpdate (addSheet, deleteSheet and
+    updateSheetProperties) and spreadsheets.values get, update and clear.
+
+    :example:
+
+    >>> with StubGoogleApi() as stub:
+    ...     stub.add_file("id1", "name1", b"content")
+    ...     stub.add_spreadsheet("sheet_id", {"tab": [["a", "b"], ["1", "2"]]})
+    ...     drive = Drive(auth, api_endpoint=stub.drive_endpoint)
+    ...     sheets = Sheets(auth, api_endpoint=stub.sheets_endpoint)
+
+    :param latency: number of seconds each request takes.
+    :param quota: max number of requests per second. Requests beyond it get 429 "User Rate Limit Exceeded" responses.
+      If None, there is no quota.
+    """
+
+    def __init__(self, latency: float = 0, quota: Optional[int] = None):
+        self.files = {}  # id -> dictionary of file metadata and "content"
+        self.spreadsheets = {}  # id -> {"title": title, "sheets": [{"sheetId": id, "title": title, "rows": rows}]}
+        self.uploads = {}  # upload id -> {"file": file or None, "metadata": dict, "content": bytearray, "total": int}
+        self.completed_uploads = {}  # upload id -> id of the uploaded file
+        self.changes = []  # ids of changed files in order. The page token of a change is its index.
+        self.latency = latency
+        self.quota = quota
+        self.request_count = 0
+        self.throttled_count = 0
+        self._lock = threading.RLock()
+        self._ids = itertools.count(1)
+        self._recent = deque()  # time of requests accepted in the last second
+        self._listings = {}  # query -> sorted matching files, cleared when files change
+        self._server = _ThreadingServer(("127.0.0.1", 0), _make_handler(self))
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/"
+
+    @property
+    def drive_endpoint(self) -> str:
+        return self.url + "drive/v3/"
+
+    @property
+    def sheets_endpoint(self) -> str:
+        return self.url
+
+    def add_file(self, id: str, name: str, content: bytes = b"", parents: tuple = (),
+                 mime_type: str = "text/plain") -> dict:
+        file = {"id": id, "name": name, "parents": list(parents), "mimeType": mime_type, "trashed": False}
+        _set_content(file, content)
+        self.files[id] = file
+        self._changed(id)
+        return file
+
+    def add_folder(self, id: str, name: str, parents: tuple = ()) -> dict:
+        return self.add_file(id, name, parents=parents, mime_type=FOLDER_MIME_TYPE)
+
+    def move_file(self, id: str, parents: tuple):
+        """Moves the file into the parent folders."""
+        self.files[id]["parents"] = list(parents)
+        self._changed(id)
+
+    def trash_file(self, id: str):
+        """Moves the file to trash."""
+        self.files[id]["trashed"] = True
+        self._changed(id)
+
+    def add_spreadsheet(self, id: str, sheets: dict, title: str = "spreadsheet") -> dict:
+        """Adds a spreadsheet.
+
+        :param id: id of the spreadsheet.
+        :param sheets: a dictionary from tab title to a list of rows.
+        :param title: title of the spreadsheet.
+        :return: the stored spreadsheet.
+        """
+        spreadsheet = {"title": title, "sheets": [
+            {"sheetId": index, "title": tab, "rows": [list(row) for row in rows]}
+            for index, (tab, rows) in enumerate(sheets.items())
+        ]}
+        self.spreadsheets[id] = spreadsheet
+        return spreadsheet
+
+    def get_values(self, id: str, tab: str) -> list:
+        """Gets all rows of a tab, with trailing empty cells and rows removed."""
+        return _trim(_find_sheet(self.spreadsheets[id], tab)["rows"])
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def handle(self, method: str, path: str, query: dict, body: bytes, headers: Optional[dict] = None) -> tuple:
+        """Handles a request.
+
+        :param method: http method.
+        :param path: url path, still percent-encoded.
+        :param query: a dictionary of query parameters.
+        :param body: request body.
+        :param headers: request headers with lower case names.
+        :return: a tuple of (status, content type, body, dictionary of response headers).
+        """
+        headers = headers or {}
+        if "x-http-method-override" in headers:
+            # googleapiclient sends requests with long urls as POST requests with parameters in the body.
+            method = headers["x-http-method-override"]
+            query = dict(query, **{key: values[-1] for key, values in parse_qs(body.decode()).items()})
+            body = b""
+        with self._lock:
+            self.request_count += 1
+            throttled = self._throttle()
+
+        if self.latency:
+            time.sleep(self.latency)
+        if throttled:
+            return _error(429, "User Rate Limit Exceeded")
+
+        with self._lock:
+            return self._route(method, path, query, body, headers)
+
+    def _route(self, method: str, path: str, query: dict, body: bytes, headers: dict) -> tuple:
+        if path.startswith("/drive/v3/") or path.startswith("/upload/drive/v3/"):
+            return self._handle_drive(method, path, query, body, headers)
+        if path.startswith("/v4/spreadsheets"):
+            return self._handle_sheets(method, path, query, body)
+        return _error(404, f"{method} {path} is not implemented by stub server")
+
+    def _throttle(self) -> bool:
+        if self.quota is None:
+            return False
+
+        now = time.monotonic()
+        while self._recent and self._recent[0] <= now - 1:
+            self._recent.popleft()
+        if len(self._recent) >= self.quota:
+            self.throttled_count += 1
+            return True
+
+        self._recent.append(now)
+        return False
+
+    def _changed(self, id: str):
+        self.changes.append(id)
+        self._listings.clear()
+
+    def _new_id(self) -> str:
+        return f"stub_{next(self._ids)}"
+
+    def _handle_drive(self, method: str, path: str, query: dict, body: bytes, headers: dict) -> tuple:
+        if path.startswith("/upload/drive/v3/uploads/"):
+            return self._upload_chunk(path.rsplit("/", 1)[1], body, headers)
+
+        if path == "/drive/v3/changes/startPageToken" and method == "GET":
+            return _json(200, {"startPageToken": str(len(self.changes))})
+        if path == "/drive/v3/changes" and method == "GET":
+            return self._list_changes(query)
+
+        upload = path.startswith("/upload/")
+        match = re.match(r"^(?:/upload)?/drive/v3/files(?:/([^/]+))?(/copy)?$", path)
+        if match is None:
+            return _error(404, f"{method} {path} is not implemented by stub server")
+
+        id, copy = match.group(1), match.group(2)
+        if id is None:
+            if method == "GET":
+                return self._list_files(query)
+            if method == "POST":
+                return self._write_file(None, query, body, headers, upload)
+            return _error(404, f"{method} {path} is not implemented by stub server")
+
+        id = unquote(id)
+        file = self.files.get(id)
+        if file is None:
+            return _error(404, f"File not found: {id}")
+        if method == "GET":
+            if query.get("alt") == "media":
+                return _media(file["content"], headers.get("range"))
+            fields = query.get("fields")
+            return _json(200, _metadata(file, {field.strip() for field in fields.split(",")} if fields else None))
+        if method == "POST" and copy:
+            metadata = json.loads(body or b"{}")
+            new = self.add_file(self._new_id(), metadata.get("name", file["name"]), file["content"],
+                                parents=_parents(metadata, file["parents"]), mime_type=file["mimeType"])
+            return _json(200, _metadata(new))
+        if method == "PATCH":
+            return self._write_file(file, query, body, headers, upload)
+        if method == "DELETE":
+            del self.files[id]
+            self._changed(id)
+            return 204, "application/json", b"", {}
+
+        return _error(404, f"{method} {path} is not implemented by stub server")
+
+    def _list_files(self, query: dict) -> tuple:
+        q = query.get("q", "")
+        files = self._listings.get(q)
+        if files is None:
+            predicate = _parse_query(q)
+            files = self._listings[q] = sorted((file for file in self.files.values() if predicate(file)),
+                                               key=lambda file: file["id"])
+        start = int(query.get("pageToken", 0))
+        end = start + min(int(query.get("pageSize", 100)), MAX_PAGE_SIZE)
+        fields = _file_fields(query.get("fields", ""))
+        content = {"files": [_metadata(file, fields) for file in files[start:end]]}
+        if end < len(files):
+            content["nextPageToken"] = str(end)
+        return _json(200, content)
+
+    def _list_changes(self, query: dict) -> tuple:
+        start = int(query["pageToken"])
+        end = start + min(int(query.get("pageSize", 100)), MAX_PAGE_SIZE)
+        changes = []
+        for id in self.changes[start:end]:
+            file = self.files.get(id)
+            change = {"kind": "drive#change", "changeType": "file", "fileId": id, "removed": file is None}
+            if file is not None:
+                change["file"] = _metadata(file)
+            changes.append(change)
+        content = {"changes": changes}
+        if end < len(self.changes):
+            content["nextPageToken"] = str(end)
+        else:
+            content["newStartPageToken"] = str(len(self.changes))
+        return _json(200, content)
+
+    def _write_file(self, file: Optional[dict], query: dict, body: bytes, headers: dict, upload: bool) -> tuple:
+        upload_type = query.get("uploadType") if upload else None
+        if upload_type == "resumable":
+            upload_id = self._new_id()
+            total = headers.get("x-upload-content-length")
+            self.uploads[upload_id] = {"file": file, "metadata": json.loads(body) if body else {},
+                                       "content": bytearray(), "total": int(total) if total is not None else None}
+            return 200, "application/json", b"", {"Location": f"{self.url}upload/drive/v3/uploads/{upload_id}"}
+        if upload_type == "media":
+            return _json(200, _metadata(self._save_file(file, {}, body)))
+        if upload_type is not None:
+            return _error(400, f"uploadType {upload_type} is not implemented by stub server")
+
+        if file is not None and ("addParents" in query or "removeParents" in query):
+            removed = query.get("removeParents", "").split(",")
+            file["parents"] = [parent for parent in file["parents"] if parent not in removed] + \
+                [parent for parent in query.get("addParents", "").split(",") if parent]
+        return _json(200, _metadata(self._save_file(file, json.loads(body or b"{}"), None)))
+
+    def _upload_chunk(self, upload_id: str, body: bytes, headers: dict) -> tuple:
+        upload = self.uploads.get(upload_id)
+        if upload is None and self.completed_uploads.get(upload_id) in self.files:
+            return _json(200, _metadata(self.files[self.completed_uploads[upload_id]]))
+        if upload is None:
+            return _error(404, f"Upload not found: {upload_id}")
+
+        match = re.match(r"bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)", headers.get("content-range", ""))
+        if match is not None:
+            if match.group(1) is not None and int(match.group(1)) != len(upload["content"]):
+                return _error(400, "Chunk does not start at the end of received content")
+            if match.group(3) != "*":
+                upload["total"] = int(match.group(3))
+        else:
+            # a request without content range sends the whole remaining content.
+            upload["total"] = len(upload["content"]) + len(body)
+
+        upload["content"].extend(body)
+        if upload["total"] is None or len(upload["content"]) < upload["total"]:
+            range_headers = {"Range": f"bytes=0-{len(upload['content']) - 1}"} if upload["content"] else {}
+            return 308, "application/json", b"", range_headers
+
+        del self.uploads[upload_id]
+        status, content_type, content, headers = self._complete_upload(upload)
+        if status == 200:
+            self.completed_uploads[upload_id] = json.loads(content).get("id")
+        return status, content_type, content, headers
+
+    def _complete_upload(self, upload: dict) -> tuple:
+        file = self._save_file(upload["file"], upload["metadata"], bytes(upload["content"]))
+        return _json(200, _metadata(file))
+
+    def _save_file(self, file: Optional[dict], metadata: dict, content: Optional[bytes]) -> dict:
+        if file is None:
+            file = self.add_file(self._new_id(), metadata.get("name", "Untitled"), parents=_parents(metadata, []),
+                                 mime_type=metadata.get("mimeType", "application/octet-stream"))
+        else:
+            for key in ("name", "mimeType", "trashed"):
+                if key in metadata:
+                    file[key] = metadata[key]
+        if content is not None:
+            _set_content(file, content)
+        self._changed(file["id"])
+        return file
+
+    def _handle_sheets(self, method: str, path: str, query: dict, body: bytes) -> tuple:
+        if method == "POST" and path == "/v4/spreadsheets":
+            return self._create_spreadsheet(json.loads(body or b"{}"))
+
+        match = re.match(r"^/v4/spreadsheets/([^/:]+)(?::(batchUpdate)|/values/([^/:]+)(?::(clear))?)?$", path)
+        if match is None:
+            return _error(404, f"{method} {path} is not implemented by stub server")
+
+        id = unquote(match.group(1))
+        spreadsheet = self.spreadsheets.get(id)
+        if spreadsheet is None:
+            return _error(404, f"Requested entity was not found: {id}")
+
+        if match.group(2) and method == "POST":
+            return self._batch_update(id, spreadsheet, json.loads(body))
+
+        sheet_range = unquote(match.group(3) or "")
+        if not sheet_range:
+            return _json(200, {"spreadsheetId": id, "properties": {"title": spreadsheet["title"]},
+                               "sheets": [{"properties": _sheet_properties(sheet)} for sheet in spreadsheet["sheets"]]})
+
+        tab, bounds = _parse_range(sheet_range)
+        sheet = _find_sheet(spreadsheet, tab)
+        if sheet is None:
+            return _error(400, f"Unable to parse range: {sheet_range}")
+
+        if match.group(4) and method == "POST":
+            _clear(sheet["rows"], bounds)
+            return _json(200, {"spreadsheetId": id, "clearedRange": sheet_range})
+        if method == "GET":
+            return _json(200, _get_values(sheet["rows"], bounds, sheet_range, query.get("majorDimension", "ROWS")))
+        if method == "PUT":
+            values = json.loads(body).get("values", [])
+            _update(sheet["rows"], bounds, values)
+            return _json(200, {"spreadsheetId": id, "updatedRange": sheet_range, "updatedRows": len(values),
+                               "updatedColumns": max((len(row) for row in values), default=0),
+                               "updatedCells": sum(len(row) for row in values)})
+
+        return _error(404, f"{method} {path} is not implemented by stub server")
+
+    def _create_spreadsheet(self, body: dict) -> tuple:
+        id = self._new_id()
+        title = body.get("properties", {}).get("title", "Untitled spreadsheet")
+        self.add_spreadsheet(id, {"Sheet1": []}, title=title)
+        return _json(200, {"spreadsheetId": id, "properties": {"title": title}})
+
+    def _batch_update(self, id: str, spreadsheet: dict, body: dict) -> tuple:
+        replies = []
+        for request in body.get("requests", []):
+            if "addSheet" in request:
+                properties = request["addSheet"].get("properties", {})
+                next_id = max((sheet["sheetId"] for sheet in spreadsheet["sheets"]), default=-1) + 1
+                sheet_id = properties.get("sheetId", next_id)
+                sheet = {"sheetId": sheet_id, "title": properties.get("title", f"Sheet{sheet_id + 1}"), "rows": []}
+                spreadsheet["sheets"].append(sheet)
+                replies.append({"addSheet": {"properties": _sheet_properties(sheet)}})
+            elif "deleteSheet" in request:
+                sheet_id = request["deleteSheet"]["sheetId"]
+                spreadsheet["sheets"] = [sheet for sheet in spreadsheet["sheets"] if sheet["sheetId"] != sheet_id]
+                replies.append({})
+            elif "updateSheetProperties" in request:
+                properties = request["updateSheetProperties"]["properties"]
+                for sheet in spreadsheet["sheets"]:
+                    if sheet["sheetId"] == properties["sheetId"] and "title" in properties:
+                        sheet["title"] = properties["title"]
+                replies.append({})
+            else:
+                return _error(400, f"Request {list(request)} is not implemented by stub server")
+        return _json(200, {"spreadsheetId": id, "replies": replies})
+
+
+def _json(status: int, content: dict, headers: Optional[dict] = None) -> tuple:
+    return status, "application/json", json.dumps(content).encode(), headers or {}
+
+
+def _error(status: int, message: str) -> tuple:
+    return _json(status, {"error": {"code": status, "message": message, "errors": [{"message": message}]}})
+
+
+def _metadata(file: dict, fields: Optional[set] = None) -> dict:
+    return {key: value for key, value in file.items() if key != "content" and (fields is None or key in fields)}
+
+
+def _file_fields(fields: str) -> Optional[set]:
+    """Gets top level fields of files requested by a `fields` parameter such as "nextPageToken, files(id,name)". It is
+    None if all fields are requested."""
+    match = re.search(r"files\(([^)]*)\)", fields)
+    if match is None:
+        return None
+    return {field.split("(")[0].split("/")[0].strip() for field in match.group(1).split(",")}
+
+
+def _set_content(file: dict, content: bytes):
+    file["content"] = content
+    file["size"] = str(len(content))
+    file["md5Checksum"] = hashlib.md5(content).hexdigest()
+    file["modifiedTime"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _parents(metadata: dict, default: list) -> list:
+    parents = metadata.get("parents", default)
+    return [parents] if isinstance(parents, str) else list(parents)
+
+
+def _media(content: bytes, range_header: Optional[str]) -> tuple:
+    match = re.match(r"bytes=(\d+)-(\d*)", range_header or "")
+    if match is None:
+        return 200, "application/octet-stream", content, {}
+
+    start = int(match.group(1))
+    if start >= len(content):
+        return 416, "application/octet-stream", b"", {"Content-Range": f"bytes */{len(content)}"}
+    end = min(int(match.group(2)) if match.group(2) else len(content) - 1, len(content) - 1)
+    return 206, "application/octet-stream", content[start:end + 1], {
+        "Content-Range": f"bytes {start}-{end}/{len(content)}"}
+
+
+_TOKEN_PATTERN = re.compile(r"\s*('(?:[^'\\]|\\.)*'|\(|\)|\{|\}|!=|<=|>=|=|<|>|[A-Za-z_]+)")
+_OPERATORS = {
+    "=": lambda a, b: a == b, "!=": lambda a, b: a != b, "<": lambda a, b: a < b, ">": lambda a, b: a > b,
+    "<=": lambda a, b: a <= b, ">=": lambda a, b: a >= b,
+    # like the API, names contain strings that prefix them or their words.
+    "contains": lambda a, b: word_prefix_pattern(b).search(a or "") is not None,
+}
+
+
+def _parse_query(q: str):
+    """Parses a Drive search query into a predicate of file metadata. It supports `and`, `or`, `not`, parentheses,
+    `'<id>' in parents`, `properties has { key='<key>' and value='<value>' }` and comparisons of metadata fields,
+    such as name, mimeType, trashed and modifiedTime.
+    """
+    tokens = []
+    q = q.strip()
+    position = 0
+    while position < len(q):
+        match = _TOKEN_PATTERN.match(q, position)
+        if match is None:
+            raise ValueError(f"Invalid query: {q}")
+        tokens.append(match.group(1))
+        position = match.end()
+    tokens.append(None)
+    tokens.reverse()
+
+    def parse_or():
+        predicates = [parse_and()]
+        while tokens[-1] == "or":
+            tokens.pop()
+            predicates.append(parse_and())
+        return lambda file: any(predicate(file) for predicate in predicates)
+
+    def parse_and():
+        predicates = [parse_not()]
+        while tokens[-1] == "and":
+            tokens.pop()
+            predicates.append(parse_not())
+        return lambda file: all(predicate(file) for predicate in predicates)
+
+    def parse_not():
+        token = tokens.pop()
+        if token == "not":
+            predicate = parse_not()
+            return lambda file: not predicate(file)
+        if token == "(":
+            predicate = parse_or()
+            tokens.pop()  # ")"
+            return predicate
+
+        operator, right = tokens.pop(), tokens.pop()
+        if operator == "has":  # properties has { key='key' and value='value' }
+            key, value = _unescape(tokens[-3]), _unescape(tokens[-7])
+            del tokens[-8:]
+            return lambda file: file.get(token, {}).get(key) == value
+        if operator == "in":
+            value = _unescape(token)
+            return lambda file: value in file.get(right, [])
+
+        value = _unescape(right) if right.startswith("'") else right == "true"
+        compare = _OPERATORS[operator]
+        return lambda file: compare(file.get(token), value)
+
+    if tokens[-1] is None:
+        return lambda file: True
+    return parse_or()
+
+
+def _unescape(token: str) -> str:
+    return re.sub(r"\\(.)", r"\1", token[1:-1])
+
+
+def _column_number(column: str) -> int:
+    number = 0
+    for char in column.upper():
+        number = number * 26 + ord(char) - 64
+    return number
+
+
+def _parse_range(sheet_range: str) -> tuple:
+    """Parses "tab!A1:D10" into (tab, (first row, first column, last row, last column)), 0-based and inclusive. Missing
+    bounds are None.
+    """
+    tab, _, cells = sheet_range.rpartition("!")
+    if not tab:
+        return cells.strip("'"), (0, 0, None, None)
+
+    start, _, end = cells.partition(":")
+    start_column, start_row = re.match(r"([A-Za-z]*)(\d*)", start).groups()
+    end_column, end_row = re.match(r"([A-Za-z]*)(\d*)", end).groups() if end else (start_column, start_row)
+    return tab.strip("'"), (int(start_row) - 1 if start_row else 0,
+                            _column_number(start_column) - 1 if start_column else 0,
+                            int(end_row) - 1 if end_row else None,
+                            _column_number(end_column) - 1 if end_column else None)
+
+
+def _find_sheet(spreadsheet: dict, tab: str) -> Optional[dict]:
+    for sheet in spreadsheet["sheets"]:
+        if sheet["title"] == tab:
+            return sheet
+    return None
+
+
+def _trim(rows: list) -> list:
+    rows = [list(row) for row in rows]
+    for row in rows:
+        while row and row[-1] in ("", None):
+            row.pop()
+    while rows and not rows[-1]:
+        rows.pop()
+    return rows
+
+
+def _get_values(rows: list, bounds: tuple, sheet_range: str, dimension: str) -> dict:
+    first_row, first_column, last_row, last_column = bounds
+    selected = [row[first_column:None if last_column is None else last_column + 1]
+                for row in rows[first_row:None if last_row is None else last_row + 1]]
+    selected = _trim([[str(cell) for cell in row] for row in selected])
+    if dimension == "COLUMNS" and selected:
+        width = max(len(row) for row in selected)
+        selected = _trim([[row[i] if i < len(row) else "" for row in selected] for i in range(width)])
+
+    content = {"range": sheet_range, "majorDimension": dimension}
+    if selected:
+        content["values"] = selected
+    return content
+
+
+def _update(rows: list, bounds: tuple, values: list):
+    first_row, first_column = bounds[0], bounds[1]
+    for i, values_row in enumerate(values):
+        while len(rows) <= first_row + i:
+            rows.append([])
+        row = rows[first_row + i]
+        while len(row) < first_column + len(values_row):
+            row.append("")
+        row[first_column:first_column + len(values_row)] = ["" if value is None else value for value in values_row]
+
+
+def _clear(rows: list, bounds: tuple):
+    first_row, first_column, last_row, last_column = bounds
+    for row in rows[first_row:None if last_row is None else last_row + 1]:
+        end = len(row) if last_column is None else min(last_column + 1, len(row))
+        for i in range(first_column, end):
+            row[i] = ""
+
+
+def _sheet_properties(sheet: dict) -> dict:
+    return {"sheetId": sheet["sheetId"], "title": sheet["title"]}
+
+
+class _ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def _make_handler(api: StubGoogleApi):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # headers and body are written separately. without TCP_NODELAY, small responses wait for a delayed ACK.
+        disable_nagle_algorithm = True
+
+        def _dispatch(self):
+            parsed = urlsplit(self.path)
+            query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length) if length else b""
+            headers = {key.lower(): value for key, value in self.headers.items()}
+            status, content_type, content, response_headers = api.handle(self.command, parsed.path, query, body,
+                                                                         headers)
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(content)))
+            for key, value in response_headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(content)
+
+        do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = _dispatch
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
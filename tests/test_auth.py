@@ -1,4 +1,7 @@
 import logging
+import threading
+import time
+from datetime import datetime, timedelta
 
 import pytest
 from pathlib import PosixPath
@@ -7,7 +10,7 @@ import json
 from google.auth.exceptions import RefreshError
 from google.oauth2.credentials import Credentials
 
-from pysuite.auth import Authentication, load_oauth, get_token_from_secrets_file
+from pysuite.auth import Authentication, load_oauth, get_token_from_secrets_file, _utcnow
 
 
 test_project_id = "pysuite-test"
@@ -60,6 +63,62 @@ def test_authentication_log_correctly_when_refresh_error(caplog):
     assert expected == result
 
 
+def test_load_oauth_parse_expiry_correctly():
+    result = load_oauth({"token": "token", "expiry": "2022-12-31T01:02:03.000000Z"})
+    assert result.expiry == datetime(2022, 12, 31, 1, 2, 3)
+
+
+class CountingCredentials(Credentials):
+    """Credentials whose refresh issues a token valid for `lifetime` seconds without network calls."""
+
+    def __init__(self, lifetime: float = 3600, **kwargs):
+        super().__init__(**kwargs)
+        self.lifetime = lifetime
+        self.refresh_count = 0
+
+    def refresh(self, request):
+        time.sleep(0.05)
+        self.refresh_count += 1
+        self.token = f"token_{self.refresh_count}"
+        self.expiry = _utcnow() + timedelta(seconds=self.lifetime)
+
+
+def test_authentication_not_refresh_valid_token():
+    credential = CountingCredentials(token="token", expiry=_utcnow() + timedelta(hours=1))
+    auth = Authentication(credential=credential)
+    assert credential.refresh_count == 0
+    assert not auth.needs_refresh()
+
+
+def test_authentication_refresh_token_without_expiry_on_init():
+    credential = CountingCredentials(token="token")
+    Authentication(credential=credential)
+    assert credential.refresh_count == 1
+
+
+def test_authentication_ensure_valid_refresh_once_for_concurrent_calls():
+    credential = CountingCredentials(token="token", expiry=_utcnow() + timedelta(hours=1))
+    auth = Authentication(credential=credential)
+    credential.expiry = _utcnow() + timedelta(seconds=10)  # within refresh margin
+    threads = [threading.Thread(target=auth.ensure_valid) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert credential.refresh_count == 1
+
+
+def test_authentication_renewer_refresh_before_expiry():
+    credential = CountingCredentials(lifetime=3, token="token", expiry=_utcnow() + timedelta(seconds=3))
+    auth = Authentication(credential=credential, refresh_margin=1, background_refresh=True)
+    assert credential.refresh_count == 0
+    time.sleep(1.5)
+    auth.stop_renewer()
+    assert credential.refresh_count >= 1
+    assert not auth.needs_refresh()
+
+
 @pytest.fixture(scope="session")
 def auth_fixture():
     return Authentication(credential=token_file, project_id=test_project_id)
@@ -0,0 +1,92 @@
+import pickle
+
+import pytest
+
+from pysuite.cache import MetadataCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_cache_counts_hits_and_misses():
+    cache = MetadataCache()
+    assert cache.get("a") is None
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.get("b", "default") == "default"
+    assert cache.stats == {"hits": 1, "misses": 2, "evictions": 0, "size": 1}
+
+
+def test_cache_expires_entries():
+    clock = FakeClock()
+    cache = MetadataCache(ttl=10, clock=clock)
+    cache.set("a", 1)
+    clock.now = 9.9
+    assert cache.get("a") == 1
+    clock.now = 10
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_cache_items_skip_expired_entries():
+    clock = FakeClock()
+    cache = MetadataCache(ttl=10, clock=clock)
+    cache.set("a", 1)
+    clock.now = 5
+    cache.set("b", 2)
+    assert cache.items() == [("a", 1), ("b", 2)]
+    clock.now = 10
+    assert cache.items() == [("b", 2)]
+    assert cache.stats["hits"] == cache.stats["misses"] == 0
+
+
+def test_cache_evicts_least_recently_used():
+    cache = MetadataCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats["evictions"] == 1
+
+
+def test_cache_update_merges_fields():
+    clock = FakeClock()
+    cache = MetadataCache(ttl=10, clock=clock)
+    cache.update("id", {"name": "a"})
+    cache.update("id", {"size": "1"})
+    assert cache.get("id") == {"name": "a", "size": "1"}
+    clock.now = 10
+    cache.update("id", {"size": "2"})
+    assert cache.get("id") == {"size": "2"}
+
+
+def test_cache_invalidate():
+    cache = MetadataCache()
+    for key in ("a", "b", "c"):
+        cache.set(key, key)
+    cache.invalidate("a", predicate=lambda key, value: value == "b")
+    assert len(cache) == 1
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+def test_cache_is_pickled_empty():
+    cache = MetadataCache(ttl=10)
+    cache.set("a", 1)
+    cache = pickle.loads(pickle.dumps(cache))
+    assert cache.ttl == 10 and len(cache) == 0
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+
+
+@pytest.mark.parametrize("kwargs", [{"ttl": 0}, {"max_size": 0}])
+def test_cache_raise_error_on_invalid_arguments(kwargs):
+    with pytest.raises(ValueError):
+        MetadataCache(**kwargs)
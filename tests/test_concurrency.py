@@ -0,0 +1,139 @@
+import pickle
+import threading
+import time
+import warnings
+from datetime import timedelta
+
+import pytest
+from google.oauth2.credentials import Credentials
+
+from pysuite.auth import Authentication, _utcnow
+from pysuite.concurrency import AdaptiveConcurrency, bulk_map
+from pysuite.drive import Drive
+from pysuite.utilities import is_quota_error
+from tests.stub_server import StubGoogleApi
+from tests.test_utilities import make_http_error
+
+
+class Throttled(Exception):
+    code = 429
+
+
+def test_adaptive_concurrency_raise_error_on_invalid_limits():
+    with pytest.raises(ValueError):
+        AdaptiveConcurrency(initial_limit=10, max_limit=5)
+
+    with pytest.raises(ValueError):
+        AdaptiveConcurrency(decrease=1)
+
+
+def test_adaptive_concurrency_increase_additively_on_success():
+    concurrency = AdaptiveConcurrency(initial_limit=2, max_limit=4)
+    for _ in range(4):
+        concurrency.call(lambda: None)
+
+    assert concurrency.limit == 3
+    for _ in range(100):
+        concurrency.call(lambda: None)
+
+    assert concurrency.limit == 4
+    assert concurrency.stats["successes"] == 104
+
+
+def test_adaptive_concurrency_keep_only_calls_in_window():
+    concurrency = AdaptiveConcurrency(window=0.05)
+    for _ in range(10):
+        concurrency.call(lambda: None)
+    time.sleep(0.06)
+    concurrency.call(lambda: None)
+    assert len(concurrency._completed) == 1
+
+
+def test_adaptive_concurrency_decrease_once_per_round_of_throttles():
+    concurrency = AdaptiveConcurrency(initial_limit=16)
+    epochs = [concurrency._acquire() for _ in range(8)]
+    for epoch in epochs:
+        concurrency._release(epoch, succeeded=False, throttled=True)
+
+    assert concurrency.limit == 8
+    assert concurrency.stats["throttles"] == 8
+    assert concurrency.stats["decreases"] == 1
+
+    with pytest.raises(Throttled):
+        concurrency.call(lambda: (_ for _ in ()).throw(Throttled()))
+    assert concurrency.limit == 4
+
+
+def test_adaptive_concurrency_limit_in_flight_calls():
+    concurrency = AdaptiveConcurrency(initial_limit=3, max_limit=3)
+    lock = threading.Lock()
+    current = [0, 0]  # in flight, max in flight
+
+    def work(i):
+        with lock:
+            current[0] += 1
+            current[1] = max(current[1], current[0])
+        time.sleep(0.01)
+        with lock:
+            current[0] -= 1
+        return i
+
+    assert concurrency.map(work, range(30)) == list(range(30))
+    assert current[1] == 3
+    assert concurrency.in_flight == 0
+    assert concurrency.throughput > 0
+
+
+def test_adaptive_concurrency_map_retry_throttled_calls():
+    concurrency = AdaptiveConcurrency(initial_limit=4, sleep=0.01)
+    failed = set()
+
+    def work(i):
+        if i % 2 == 0 and i not in failed:
+            failed.add(i)
+            raise Throttled()
+        return i
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        assert concurrency.map(work, range(10)) == list(range(10))
+
+    assert concurrency.stats["throttles"] == 5
+
+
+def test_adaptive_concurrency_pickle():
+    concurrency = AdaptiveConcurrency(initial_limit=8)
+    concurrency.call(lambda: None)
+    unpickled = pickle.loads(pickle.dumps(concurrency))
+    assert unpickled.limit == concurrency.limit
+    assert unpickled.stats["successes"] == 0
+
+
+def test_bulk_map_without_controller_runs_sequentially():
+    assert bulk_map(lambda i: i * 2, range(3)) == [0, 2, 4]
+
+
+def test_is_quota_error():
+    assert is_quota_error(make_http_error(429))
+    assert not is_quota_error(make_http_error(500))
+    assert is_quota_error(Throttled())
+    assert not is_quota_error(ValueError())
+
+
+def test_drive_recursive_list_converges_under_quota():
+    with StubGoogleApi(latency=0.01, quota=3) as stub:
+        for i in range(120):
+            stub.add_file(f"folder_{i}", f"folder_{i}", parents=("root",),
+                          mime_type="application/vnd.google-apps.folder")
+            for j in range(5):
+                stub.add_file(f"file_{i}_{j}", f"file_{i}_{j}", parents=(f"folder_{i}",))
+
+        credential = Credentials(token="token", expiry=_utcnow() + timedelta(hours=1))
+        concurrency = AdaptiveConcurrency(initial_limit=4, max_limit=32, sleep=0.05)
+        drive = Drive(Authentication(credential=credential), api_endpoint=stub.drive_endpoint, concurrency=concurrency)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            result = drive.list("root", recursive=True, depth=2)
+
+    assert sorted(file["id"] for file in result) == sorted(stub.files)
+    assert concurrency.stats["successes"] == 4  # the root, and 120 folders in 3 queries.
@@ -0,0 +1,83 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+from google.oauth2.credentials import Credentials
+
+from pysuite import discovery
+from pysuite.discovery import get_discovery_document, get_resource, clear_cache
+from pysuite.transport import PooledHttp
+
+
+@pytest.fixture()
+def dummy_auth():
+    clear_cache()
+    yield SimpleNamespace(credential=Credentials(token="dummy_token"))
+    clear_cache()
+
+
+def test_get_discovery_document_return_bundled_document():
+    result = get_discovery_document("drive", "v3")
+    assert '"name": "drive"' in result
+
+
+def test_get_discovery_document_raise_error_for_unknown_api():
+    with pytest.raises(ValueError):
+        get_discovery_document("not_a_service", "v0")
+
+
+def test_get_resource_reuse_resource_for_same_credential(dummy_auth):
+    result = get_resource("drive", "v3", dummy_auth)
+    assert get_resource("drive", "v3", dummy_auth) is result
+
+
+def test_get_resource_build_new_resource_for_different_credential(dummy_auth):
+    other_auth = SimpleNamespace(credential=Credentials(token="other_token"))
+    assert get_resource("drive", "v3", dummy_auth) is not get_resource("drive", "v3", other_auth)
+
+
+def test_get_resource_build_new_resource_in_different_thread(dummy_auth):
+    result = get_resource("sheets", "v4", dummy_auth)
+    resources = []
+    thread = threading.Thread(target=lambda: resources.append(get_resource("sheets", "v4", dummy_auth)))
+    thread.start()
+    thread.join()
+    assert resources[0] is not result
+
+
+def test_clear_cache_remove_requested_service_only(dummy_auth):
+    get_resource("drive", "v3", dummy_auth)
+    get_resource("sheets", "v4", dummy_auth)
+    clear_cache("drive")
+    assert [key[0] for key in discovery._RESOURCES] == ["sheets"]
+
+
+def test_get_resource_evict_least_recently_used_resources(dummy_auth, monkeypatch):
+    monkeypatch.setattr(discovery, "MAX_RESOURCES", 2)
+    first = get_resource("drive", "v3", dummy_auth)
+    get_resource("sheets", "v4", dummy_auth)
+    assert get_resource("drive", "v3", dummy_auth) is first
+    get_resource("gmail", "v1", dummy_auth)
+    assert [key[0] for key in discovery._RESOURCES] == ["drive", "gmail"]
+
+    other_auth = SimpleNamespace(credential=Credentials(token="other_token"))
+    for _ in range(3):
+        get_resource("drive", "v3", other_auth)
+    assert len(discovery._RESOURCES) == 2
+
+
+def test_get_resource_reuse_nested_resource(dummy_auth):
+    result = get_resource("gmail", "v1", dummy_auth, "users", "messages")
+    assert get_resource("gmail", "v1", dummy_auth, "users", "messages") is result
+    assert hasattr(result, "send")
+
+
+def test_get_resource_share_resource_across_threads_with_shared_transport(dummy_auth):
+    auth = SimpleNamespace(credential=dummy_auth.credential, http=PooledHttp())
+    result = get_resource("sheets", "v4", auth)
+    resources = []
+    thread = threading.Thread(target=lambda: resources.append(get_resource("sheets", "v4", auth)))
+    thread.start()
+    thread.join()
+    assert resources[0] is result
+    assert result._http is auth.http
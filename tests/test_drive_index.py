@@ -0,0 +1,132 @@
+from datetime import timedelta
+
+import pytest
+from google.oauth2.credentials import Credentials
+
+from pysuite.auth import Authentication, _utcnow
+from pysuite.drive import Drive
+from pysuite.drive_index import DriveIndex
+from tests.stub_server import StubGoogleApi
+
+
+@pytest.fixture()
+def stub():
+    with StubGoogleApi() as stub:
+        stub.add_folder("root", "root")
+        stub.add_file("a", "a.txt", b"a", parents=("root",))
+        stub.add_folder("sub", "sub", parents=("root",))
+        stub.add_file("b", "b.txt", b"b", parents=("sub",))
+        stub.add_folder("deep", "deep", parents=("sub",))
+        stub.add_file("c", "C.txt", b"c", parents=("deep",))
+        stub.add_folder("outside", "outside")
+        stub.add_file("d", "d.txt", b"d", parents=("outside",))
+        yield stub
+
+
+@pytest.fixture()
+def drive(stub):
+    auth = Authentication(credential=Credentials(token="token", expiry=_utcnow() + timedelta(hours=1)))
+    return Drive(auth, api_endpoint=stub.drive_endpoint)
+
+
+def test_index_answers_lookups_locally(stub, drive):
+    with DriveIndex(drive, "root") as index:
+        index.build()
+        count = stub.request_count
+        assert index.get_id("b.txt", parent_id="sub") == "b"
+        assert index.get_id("b.txt") == "b"
+        assert index.get_id("d.txt") is None
+        assert index.find(name_contains="c.") == [{"id": "c", "name": "C.txt"}]
+        assert index.find(name_not_contains=".txt", parent_id="sub") == [{"id": "deep", "name": "deep"}]
+        assert index.list("sub") == [{"id": "b", "name": "b.txt", "parents": ["sub"]},
+                                     {"id": "deep", "name": "deep", "parents": ["sub"]}]
+        assert [file["id"] for file in index.list("root", recursive=True)] == ["a", "b", "c", "deep", "sub"]
+        assert index.resolve("sub/deep/C.txt") == "c"
+        assert index.resolve("") == "root"
+        assert index.resolve("sub/missing") is None
+        assert index.get_path("c") == "sub/deep/C.txt"
+        assert index.get("a")["md5Checksum"] == stub.files["a"]["md5Checksum"]
+        assert stub.request_count == count
+
+
+def test_index_sync_applies_changes(stub, drive, tmpdir):
+    with DriveIndex(drive, "root") as index:
+        assert index.sync() == 0  # the first sync builds the index.
+        local = tmpdir.join("new.txt")
+        local.write("new")
+        new_id = drive.upload(local, parent_id="deep")
+        drive.update("a", local)
+        drive.delete("b")
+        stub.trash_file("deep")  # files in a trashed folder are removed too.
+        stub.move_file("outside", ("root",))  # files in a folder moved in are added.
+        stub.add_file("e", "e.txt", parents=("elsewhere",))
+
+        count = stub.request_count
+        assert index.sync() > 0
+        assert stub.request_count - count == 2  # one page of changes and one listing of the moved folder.
+        assert [file["id"] for file in index.list("root", recursive=True)] == ["a", "d", "outside", "sub"]
+        assert index.get(new_id) is None
+        assert index.get("a")["size"] == "3"
+        assert index.resolve("outside/d.txt") == "d"
+
+        count = stub.request_count
+        assert index.sync() == 0
+        assert stub.request_count - count == 1
+
+
+def test_index_is_reused_from_file(stub, drive, tmpdir):
+    path = tmpdir.join("index.sqlite")
+    with DriveIndex(drive, "root", path) as index:
+        index.build()
+        page_token = index.page_token
+
+    count = stub.request_count
+    with DriveIndex(drive, "root", path) as index:
+        assert index.page_token == page_token
+        assert index.resolve("sub/b.txt") == "b"
+    assert stub.request_count == count
+
+    with pytest.raises(ValueError):
+        DriveIndex(drive, "sub", path)
+
+
+def test_index_sync_rolls_back_on_error(stub, drive):
+    with DriveIndex(drive, "root") as index:
+        index.build()
+        page_token = index.page_token
+        stub.move_file("outside", ("root",))
+        stub.trash_file("a")
+
+        def fail(*args, **kwargs):
+            raise ConnectionError("connection reset")
+
+        drive.walk = fail  # listing the moved folder fails before changes are applied.
+        with pytest.raises(ConnectionError):
+            index.sync()
+        assert index.page_token == page_token
+        assert index.get("outside") is None
+        assert index.get("a") is not None
+
+
+def test_index_sync_sends_requests_outside_transaction(stub, drive):
+    with DriveIndex(drive, "root") as index:
+        index.build()
+        stub.move_file("outside", ("root",))
+        stub.add_folder("new", "new", parents=("sub",))
+        stub.add_folder("elsewhere", "elsewhere")
+        walk, list_changes = drive.walk, drive.list_changes
+        walked = []
+
+        def check(function):
+            def wrapper(id, *args, **kwargs):
+                assert not index._lock.locked() and not index._connection.in_transaction
+                walked.append(id)
+                return function(id, *args, **kwargs)
+            return wrapper
+
+        drive.walk, drive.list_changes = check(walk), check(list_changes)
+        index.sync()
+        assert sorted(walked[1:]) == ["new", "outside"]  # folders created outside the tree are not listed.
+        assert index.resolve("outside/d.txt") == "d"
+        assert index.resolve("sub/new") == "new"
+        assert index.get("elsewhere") is None
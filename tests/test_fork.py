@@ -0,0 +1,77 @@
+import json
+import os
+import pickle
+from datetime import timedelta
+
+import pytest
+from google.oauth2.credentials import Credentials
+
+from pysuite import discovery
+from pysuite.auth import Authentication, _utcnow
+from pysuite.drive import Drive
+from pysuite.sheets import Sheets
+from pysuite.storage import Storage
+from pysuite.transport import CONNECTIONS_PER_HOST_ENV
+from pysuite.vision import Vision
+
+
+@pytest.fixture()
+def auth():
+    credential = Credentials(token="token", expiry=_utcnow() + timedelta(hours=1))
+    return Authentication(credential=credential, project_id="pysuite-test", connections_per_host=3)
+
+
+def test_authentication_pickle_credential_and_settings(auth):
+    result = pickle.loads(pickle.dumps(auth))
+    assert result.credential.token == "token"
+    assert result.project_id == "pysuite-test"
+    assert result.transport is not auth.transport
+    assert result.transport.connections_per_host == 3
+
+
+def test_authentication_use_process_default_pool_size(monkeypatch):
+    monkeypatch.setenv(CONNECTIONS_PER_HOST_ENV, "7")
+    credential = Credentials(token="token", expiry=_utcnow() + timedelta(hours=1))
+    result = Authentication(credential=credential)
+    assert result.transport.connections_per_host == 7
+
+
+@pytest.mark.parametrize("cls", [Drive, Sheets])
+def test_service_pickle_rebuild_client(auth, cls):
+    service = cls(auth, max_retry=3, sleep=1)
+    result = pickle.loads(pickle.dumps(service))
+    assert (result.max_retry, result.sleep, result._version) == (3, 1, service._version)
+    assert result._client._http is result._auth.http
+
+
+@pytest.mark.parametrize("cls", [Storage, Vision])
+def test_cloud_service_pickle_rebuild_client(auth, cls):
+    service = cls(auth)
+    client = service._client
+    result = pickle.loads(pickle.dumps(service))
+    assert result._cached_client is None
+    assert result._client is not client
+
+
+@pytest.mark.skipif(not hasattr(os, "register_at_fork"), reason="os.register_at_fork requires python 3.7")
+def test_services_reinitialize_after_fork(auth):
+    drive = Drive(auth)
+    storage = Storage(auth)
+    drive._client
+    parent_storage_client = storage._client
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover
+        try:
+            result = [len(discovery._RESOURCES), drive._client._http is auth.http,
+                      storage._client is not parent_storage_client, auth.transport.stats["requests"]]
+            os.write(write_fd, json.dumps(result).encode())
+        finally:
+            os._exit(0)
+
+    os.close(write_fd)
+    os.waitpid(pid, 0)
+    with os.fdopen(read_fd) as fp:
+        result = json.load(fp)
+
+    assert result == [0, True, True, 0]
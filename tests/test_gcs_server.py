@@ -0,0 +1,101 @@
+import json
+from datetime import timedelta
+
+import pytest
+from google.api_core.exceptions import NotFound
+from google.oauth2.credentials import Credentials
+
+from pysuite.auth import Authentication, _utcnow
+from pysuite.concurrency import AdaptiveConcurrency
+from pysuite.storage import Storage
+from tests.gcs_server import FakeGcsServer
+
+
+@pytest.fixture()
+def server():
+    with FakeGcsServer() as server:
+        yield server
+
+
+@pytest.fixture()
+def storage(server):
+    credential = Credentials(token="token", expiry=_utcnow() + timedelta(hours=1))
+    return Storage(Authentication(credential=credential), api_endpoint=server.endpoint)
+
+
+def test_storage_bucket_round_trip(server, storage):
+    storage.create_bucket("bucket")
+    assert storage.get_bucket("bucket").name == "bucket"
+
+    storage.remove_bucket("bucket")
+    assert server.buckets == {}
+    with pytest.raises(NotFound):
+        storage.get_bucket("bucket")
+
+
+def test_storage_upload_download_copy_remove_folder(server, storage, tmpdir):
+    server.add_bucket("bucket")
+    folder = tmpdir.mkdir("folder")
+    for i in range(5):
+        folder.join(f"file_{i}").write_binary(b"x" * i)
+    storage.concurrency = AdaptiveConcurrency(initial_limit=4)
+
+    storage.upload(folder, "gs://bucket/folder")
+    assert server.get_content("bucket", "folder/file_3") == b"xxx"
+
+    storage.copy("gs://bucket/folder", "gs://bucket/copied")
+    assert server.get_content("bucket", "copied/file_4") == b"xxxx"
+
+    storage.download("gs://bucket/copied", tmpdir.join("downloaded"))
+    assert tmpdir.join("downloaded", "copied", "file_2").read_binary() == b"xx"
+
+    batch_count = server.batch_count
+    storage.remove("gs://bucket/folder")
+    assert sorted(server.buckets["bucket"]["objects"]) == [f"copied/file_{i}" for i in range(5)]
+    assert server.batch_count == batch_count + 1
+
+
+def test_storage_resumable_upload_and_checksummed_download(server, storage, tmpdir):
+    server.add_bucket("bucket")
+    content = bytes(range(256)) * 4096
+    local = tmpdir.join("local")
+    local.write_binary(content)
+
+    blob = storage.get_bucket("bucket").blob("large", chunk_size=256 * 1024)
+    blob.upload_from_filename(str(local))
+    assert server.get_content("bucket", "large") == content
+
+    storage.download("gs://bucket/large", tmpdir.join("downloaded"))
+    assert tmpdir.join("downloaded").read_binary() == content
+    assert blob.download_as_bytes(start=256, end=511) == bytes(range(256))
+
+
+def test_list_objects_pages_and_prefixes(server):
+    for name in ["a/1", "a/2", "b/1", "c", "d"]:
+        server.add_object("bucket", name)
+
+    content = json.loads(server.handle("GET", "/storage/v1/b/bucket/o", {"delimiter": "/", "maxResults": "3"}, b"")[2])
+    assert [item["name"] for item in content["items"]] == ["c"]
+    assert content["prefixes"] == ["a/", "b/"]
+
+    query = {"delimiter": "/", "pageToken": content["nextPageToken"]}
+    content = json.loads(server.handle("GET", "/storage/v1/b/bucket/o", query, b"")[2])
+    assert [item["name"] for item in content["items"]] == ["d"]
+    assert "nextPageToken" not in content
+
+
+def test_rewrite_in_several_calls(server):
+    server.add_object("bucket", "source", b"0123456789")
+    path = "/storage/v1/b/bucket/o/source/rewriteTo/b/bucket/o/destination"
+    query = {"maxBytesRewrittenPerCall": "4"}
+    progress = []
+    while True:
+        content = json.loads(server.handle("POST", path, query, b"")[2])
+        progress.append(content["totalBytesRewritten"])
+        if content["done"]:
+            break
+        query["rewriteToken"] = content["rewriteToken"]
+
+    assert progress == ["4", "8", "10"]
+    assert content["resource"]["name"] == "destination"
+    assert server.get_content("bucket", "destination") == b"0123456789"
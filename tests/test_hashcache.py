@@ -0,0 +1,38 @@
+import hashlib
+import os
+import time
+
+from pysuite.hashcache import HashCache, file_md5
+
+
+def _write(path, content: bytes, age: float = 60):
+    path.write_binary(content)
+    os.utime(str(path), (time.time() - age, time.time() - age))
+
+
+def test_hash_cache_hashes_files_once(tmpdir):
+    local = tmpdir.join("file.bin")
+    _write(local, b"content")
+    assert file_md5(local) == hashlib.md5(b"content").hexdigest()
+
+    with HashCache(tmpdir.join("hashes.sqlite")) as hashes:
+        assert hashes.md5(local) == file_md5(local)
+        assert hashes.md5(local) == file_md5(local)
+        assert hashes.stats == {"hits": 1, "misses": 1}
+
+        _write(local, b"changed", age=30)
+        assert hashes.md5(local) == hashlib.md5(b"changed").hexdigest()
+        assert hashes.stats == {"hits": 1, "misses": 2}
+
+    with HashCache(tmpdir.join("hashes.sqlite")) as hashes:
+        assert hashes.md5(local) == hashlib.md5(b"changed").hexdigest()
+        assert hashes.stats == {"hits": 1, "misses": 0}
+
+
+def test_hash_cache_does_not_cache_recently_modified_files(tmpdir):
+    local = tmpdir.join("file.bin")
+    local.write_binary(b"content")
+    hashes = HashCache()
+    assert hashes.md5(local) == hashes.md5(local) == file_md5(local)
+    assert hashes.stats == {"hits": 0, "misses": 2}
+    hashes.close()
@@ -0,0 +1,49 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+import pysuite
+
+HEAVY_MODULES = ["google.cloud.vision", "google.cloud.storage", "grpc", "requests", "google_auth_oauthlib"]
+
+# pysuite falls back to eager imports before python 3.7, which has no module level __getattr__.
+lazy_imports = pytest.mark.skipif(sys.version_info < (3, 7), reason="lazy imports require python 3.7")
+
+
+def imported_modules(statement: str) -> set:
+    code = f"import sys, json\n{statement}\nprint(json.dumps(sorted(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE, universal_newlines=True, check=True)
+    return set(json.loads(result.stdout))
+
+
+@lazy_imports
+@pytest.mark.parametrize("statement",
+                         [
+                             "import pysuite",
+                             "from pysuite import Authentication",
+                             "from pysuite import Sheets",
+                             "from pysuite import Drive",
+                             "from pysuite import GMail",
+                         ])
+def test_import_not_load_unused_client_libraries(statement):
+    result = imported_modules(statement)
+    assert [module for module in HEAVY_MODULES if module in result] == []
+
+
+@lazy_imports
+def test_import_pysuite_not_load_service_modules():
+    result = imported_modules("import pysuite")
+    assert [module for module in result if module.startswith("pysuite.")] == []
+
+
+def test_lazy_attribute_return_class_from_submodule():
+    from pysuite.sheets import Sheets
+    assert pysuite.Sheets is Sheets
+    assert "Vision" in dir(pysuite)
+
+
+def test_unknown_attribute_raise_attribute_error():
+    with pytest.raises(AttributeError):
+        pysuite.NotAService
@@ -0,0 +1,153 @@
+import warnings
+from datetime import timedelta
+
+import pytest
+from google.oauth2.credentials import Credentials
+
+from pysuite.auth import Authentication, _utcnow
+from pysuite.drive import Drive
+from pysuite.instrumentation import CallEvent, HistogramCollector, Instrumentation, get_instrumentation, \
+    set_instrumentation, instrument
+from pysuite.utilities import retry_on_type_and_msg, RetryPolicy
+from tests.stub_server import StubGoogleApi
+
+
+class EventList(Instrumentation):
+    enabled = True
+
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event: CallEvent):
+        self.events.append(event)
+
+
+@pytest.fixture()
+def events():
+    instrumentation = EventList()
+    previous = set_instrumentation(instrumentation)
+    yield instrumentation.events
+    set_instrumentation(previous)
+
+
+@pytest.fixture()
+def drive():
+    with StubGoogleApi() as stub:
+        stub.add_file("id", "name", content=b"x" * 1000)
+        credential = Credentials(token="token", expiry=_utcnow() + timedelta(hours=1))
+        yield Drive(Authentication(credential=credential), api_endpoint=stub.drive_endpoint)
+
+
+class Flaky:
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.retry_policy = RetryPolicy(max_retry=3, sleep=0)
+
+    @retry_on_type_and_msg(exception=ValueError)
+    def call(self):
+        if self.failures > 0:
+            self.failures -= 1
+            raise ValueError("flaky")
+        return "done"
+
+    @instrument()
+    def plain(self):
+        return "plain"
+
+
+def test_default_instrumentation_is_noop():
+    assert type(get_instrumentation()) is Instrumentation
+    assert not get_instrumentation().enabled
+
+
+def test_set_instrumentation_none_restores_noop():
+    previous = set_instrumentation(HistogramCollector())
+    set_instrumentation(None)
+    assert type(get_instrumentation()) is Instrumentation
+    set_instrumentation(previous)
+
+
+def test_drive_call_emits_event_with_bytes(drive, events):
+    assert drive.get_name("id") == "name"
+    event = events[-1]
+    assert event.operation == "Drive.get_name"
+    assert event.attempt == 1
+    assert event.status == "ok"
+    assert event.status_code == 200
+    assert event.bytes_received > 0
+    assert 0 < event.network_time <= event.duration
+
+
+def test_drive_download_emits_payload_size(drive, events, tmpdir):
+    drive.download("id", tmpdir.join("file"))
+    event = events[-1]
+    assert event.operation == "Drive.download"
+    assert event.payload_size == 1000
+    assert event.bytes_received >= 1000
+
+
+def test_drive_upload_stream_emits_event_with_bytes(drive, events):
+    drive.upload_stream(iter([b"x" * 300000, b"y" * 300000]), name="stream.bin", chunk_size=256 * 1024)
+    event = events[-1]
+    assert event.operation == "Drive.upload_stream"
+    assert event.status == "ok"
+    assert event.payload_size == 600000
+    assert event.bytes_sent >= 600000
+
+
+def test_drive_error_emits_status_code(drive, events):
+    with pytest.raises(Exception):
+        drive.get_name("missing")
+
+    assert events[-1].status == "error"
+    assert events[-1].status_code == 404
+    assert events[-1].error == "HttpError"
+
+
+def test_each_retry_attempt_emits_event(events):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        assert Flaky(failures=2).call() == "done"
+
+    assert [(event.attempt, event.status, event.error) for event in events] == [
+        (1, "error", "ValueError"), (2, "error", "ValueError"), (3, "ok", None)
+    ]
+    assert {event.operation for event in events} == {"Flaky.call"}
+
+
+def test_instrument_decorator_emits_event(events):
+    assert Flaky(failures=0).plain() == "plain"
+    assert events[-1].operation == "Flaky.plain"
+
+
+def test_histogram_collector_summary():
+    collector = HistogramCollector(bounds=(0.1, 1))
+    for duration, status, attempt in [(0.05, "ok", 1), (0.5, "error", 1), (2, "ok", 2)]:
+        collector.emit(CallEvent(operation="op", attempt=attempt, duration=duration, status=status, status_code=None,
+                                 error=None, bytes_sent=1, bytes_received=10, network_time=0.01, payload_size=None))
+
+    summary = collector.summary()["op"]
+    assert summary["buckets"] == [1, 1, 1]
+    assert summary["count"] == 3
+    assert summary["errors"] == 1
+    assert summary["retries"] == 1
+    assert summary["bytes_received"] == 30
+    assert summary["max_time"] == 2
+    assert summary["p50"] == 1
+    assert summary["p99"] == 2
+
+    collector.reset()
+    assert collector.summary() == {}
+
+
+def test_histogram_collector_with_drive(drive):
+    collector = HistogramCollector()
+    previous = set_instrumentation(collector)
+    try:
+        for _ in range(5):
+            drive.get_name("id")
+    finally:
+        set_instrumentation(previous)
+
+    assert collector.summary()["Drive.get_name"]["count"] == 5
@@ -0,0 +1,46 @@
+import os
+import pickle
+import stat
+
+from pysuite import journal as journal_module
+from pysuite.journal import UploadJournal
+
+
+def test_journal_saves_and_removes_sessions(tmpdir):
+    local = tmpdir.join("file.bin")
+    local.write("content")
+    journal = UploadJournal(tmpdir.join("journal.json"))
+    assert journal.get("key", local) is None
+
+    journal.save("key", local, "http://uri", 256)
+    journal.save("key", local, "http://uri", 512)
+    assert journal.get("key", local)["offset"] == 512
+    assert UploadJournal(tmpdir.join("journal.json")).get("key", local)["uri"] == "http://uri"
+    assert stat.S_IMODE(os.stat(str(tmpdir.join("journal.json"))).st_mode) == 0o600
+
+    journal.remove("key")
+    assert journal.get("key", local) is None
+
+
+def test_journal_ignores_changed_files_and_expired_sessions(tmpdir, monkeypatch):
+    local = tmpdir.join("file.bin")
+    local.write("content")
+    journal = UploadJournal(tmpdir.join("journal.json"))
+    journal.save("key", local, "http://uri", 256)
+    local.write("changed content")
+    assert journal.get("key", local) is None
+
+    journal.save("key", local, "http://uri", 256)
+    now = journal_module.time.time()
+    monkeypatch.setattr(journal_module.time, "time", lambda: now + journal_module.SESSION_LIFETIME + 1)
+    assert journal.get("key", local) is None
+    journal.save("other", local, "http://other", 0)
+    assert list(journal._read()) == ["other"]  # expired sessions are dropped.
+
+
+def test_journal_can_be_pickled(tmpdir):
+    journal = pickle.loads(pickle.dumps(UploadJournal(tmpdir.join("journal.json"))))
+    local = tmpdir.join("file.bin")
+    local.write("content")
+    journal.save("key", local, "http://uri", 0)
+    assert journal.get("key", local) is not None
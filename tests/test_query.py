@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from pysuite import query
+from tests.stub_server import _parse_query
+
+
+@pytest.mark.parametrize(("q", "expected"), [
+    [query.name("it's"), r"name = 'it\'s'"],
+    [query.name_contains("a\\b"), r"name contains 'a\\b'"],
+    [~query.name_contains("a"), "not name contains 'a'"],
+    [~query.name("a"), "name != 'a'"],
+    [~~query.name("a"), "name = 'a'"],
+    [query.is_folder(), "mimeType = 'application/vnd.google-apps.folder'"],
+    [~query.in_parents("id"), "not 'id' in parents"],
+    [query.trashed(False), "trashed = false"],
+    [query.modified_after(datetime(2021, 1, 2, 3, 4, 5)), "modifiedTime > '2021-01-02T03:04:05'"],
+    [query.modified_before(datetime(2021, 1, 2, 3, tzinfo=timezone(timedelta(hours=1)))),
+     "modifiedTime < '2021-01-02T02:00:00'"],
+    [query.has_property("k", "v"), "properties has { key='k' and value='v' }"],
+    [query.name("a") & query.name("b") & query.name("c"), "name = 'a' and name = 'b' and name = 'c'"],
+    [query.any_of(query.name("a"), query.name("b"), query.name("c")), "name = 'a' or name = 'b' or name = 'c'"],
+    [query.trashed(False) & (query.name("a") | query.name("b")), "trashed = false and (name = 'a' or name = 'b')"],
+    [query.name("a") & query.name("b") | query.name("c"), "(name = 'a' and name = 'b') or name = 'c'"],
+    [~(query.name("a") | query.name("b")), "name != 'a' and name != 'b'"],
+    [query.in_parents("id") & ~(query.name("a") & ~query.trashed(True)),
+     "'id' in parents and (name != 'a' or trashed = true)"],
+])
+def test_query_compiles_to_exact_server_query(q, expected):
+    assert q.compile() == (expected, None)
+
+
+@pytest.mark.parametrize(("regex", "expected"), [
+    ["^report$", "name = 'report'"],
+    [r"report\.csv$", "name = 'report.csv'"],
+    [r"it's\$$", r"name = 'it\'s$'"],
+    ["^report", None],
+    [r"report_\d$", None],
+    ["report.csv$", None],
+    [r"report\$", None],
+])
+def test_name_matches_pushes_down_literal_names(regex, expected):
+    assert query.name_matches(regex).server == expected
+
+
+def test_client_predicates_are_applied_after_server_query():
+    q = query.in_parents("id") & query.name_matches("a+$") & query.trashed(False)
+    server, client = q.compile()
+    assert server == "'id' in parents and trashed = false"
+    assert client({"name": "aaa"})
+    assert not client({"name": "ab"})
+    assert "name" in q.fields
+
+
+def test_or_with_client_predicate_filters_whole_query():
+    q = query.name("b") | (query.name_contains("a") & query.where(lambda file: file["size"] == "1", ("size",)))
+    server, client = q.compile()
+    assert server == "name = 'b' or name contains 'a'"
+    assert client({"name": "b", "size": "2"})
+    assert client({"name": "a", "size": "1"})
+    assert not client({"name": "a", "size": "2"})
+
+    server, client = (query.name("b") | query.where(lambda file: True)).compile()
+    assert server is None
+
+
+def test_negated_client_predicate_is_applied_on_client():
+    server, client = (~query.name_matches("a")).compile()
+    assert server is None
+    assert client({"name": "b"}) and not client({"name": "a"})
+
+
+def test_negated_composite_query_keeps_server_conditions():
+    server, client = (query.in_parents("id") & ~(query.name_contains("a") & query.name_matches(".*b$"))).compile()
+    assert server == "'id' in parents"
+    assert client({"name": "cb"}) and client({"name": "x a"})
+    assert not client({"name": "ab"}) and not client({"name": "a b"})
+
+    server, client = (~(query.name_contains("a") | query.name_matches(".*b$"))).compile()
+    assert server == "not name contains 'a'"
+    assert client({"name": "c"}) and not client({"name": "cb"})
+
+
+@pytest.mark.parametrize(("name", "expected"), [
+    ["report", True], ["Report 2021", True], ["_report", True], ["monthly report", True], ["monthly_report", False],
+    ["reports", True], ["areport", False], ["rep", False],
+])
+def test_name_contains_matches_word_prefixes_like_server(name, expected):
+    q = query.name_contains("report")
+    assert q.match({"name": name}) is expected
+    assert _parse_query(q.server)({"name": name}) is expected
+
+
+def test_parse_time_accepts_fractional_seconds():
+    expected = datetime(2021, 6, 1, 1, 2, 3, 500000, tzinfo=timezone.utc)
+    assert query.parse_time("2021-06-01T01:02:03.500Z") == expected
+    assert query.parse_time("2021-06-01T01:02:03Z") == expected.replace(microsecond=0)
+
+
+def test_compiled_queries_are_parsed_by_stub_server():
+    file = {"name": "it's", "parents": ["id"], "trashed": False, "mimeType": "text/plain",
+            "modifiedTime": "2021-06-01T00:00:00.000000Z", "properties": {"k": "v"}}
+    q = query.in_parents("id") & ~query.is_folder() & query.name("it's") & query.modified_after(datetime(2021, 1, 1)) \
+        & query.has_property("k", "v") & (query.trashed(True) | query.trashed(False))
+    assert _parse_query(q.server)(file)
+    assert q.match(file)
@@ -0,0 +1,130 @@
+import asyncio
+import pickle
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import pytest
+from google.oauth2.credentials import Credentials
+
+from pysuite import ratelimit
+from pysuite.auth import Authentication, _utcnow
+from pysuite.drive import Drive
+from pysuite.ratelimit import TokenBucket, RateLimiter, get_rate_limiter, user_key, DEFAULT_QUOTAS
+from pysuite.sheets import Sheets
+from tests.stub_server import StubGoogleApi
+
+
+def make_auth(refresh_token=None) -> Authentication:
+    credential = Credentials(token="token", refresh_token=refresh_token, expiry=_utcnow() + timedelta(hours=1))
+    return Authentication(credential=credential)
+
+
+def test_token_bucket_allows_burst_up_to_capacity():
+    bucket = TokenBucket(rate=1, capacity=5)
+    assert [bucket.reserve() for _ in range(5)] == [0]*5
+    assert bucket.reserve() == pytest.approx(1, abs=0.05)
+    assert bucket.reserve() == pytest.approx(2, abs=0.05)
+
+
+def test_token_bucket_raise_error_on_invalid_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0, capacity=1)
+
+
+def test_token_bucket_acquire_paces_threads():
+    bucket = TokenBucket(rate=100, capacity=1)
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: bucket.acquire(), range(21)))
+
+    assert time.monotonic() - start >= 0.19
+
+
+def test_token_bucket_acquire_async_paces_tasks():
+    bucket = TokenBucket(rate=100, capacity=1)
+
+    async def run():
+        await asyncio.gather(*[bucket.acquire_async() for _ in range(21)])
+
+    loop = asyncio.new_event_loop()  # asyncio.run requires python 3.7.
+    start = time.monotonic()
+    try:
+        loop.run_until_complete(run())
+    finally:
+        loop.close()
+    assert time.monotonic() - start >= 0.19
+
+
+def test_rate_limiter_shares_bucket_by_service_user_and_operation():
+    limiter = RateLimiter()
+    assert limiter.get_bucket("sheets", "user", "read") is limiter.get_bucket("sheets", "user", "read")
+    assert limiter.get_bucket("sheets", "user", "read") is not limiter.get_bucket("sheets", "user", "write")
+    assert limiter.get_bucket("sheets", "user", "read") is not limiter.get_bucket("sheets", "other", "read")
+    assert limiter.get_bucket("sheets", "user", "unknown") is None
+
+    bucket = limiter.get_bucket("sheets", "user", "read")
+    limit, period = DEFAULT_QUOTAS[("sheets", "read")]
+    assert bucket.capacity == limit
+    assert bucket.rate == limit / period
+
+
+def test_rate_limiter_quotas_override_defaults():
+    limiter = RateLimiter(quotas={("sheets", "read"): (10, 1)})
+    assert limiter.get_bucket("sheets", "user", "read").rate == 10
+    assert limiter.quotas[("sheets", "write")] == DEFAULT_QUOTAS[("sheets", "write")]
+
+
+def test_user_key_is_shared_by_same_credential():
+    assert user_key(make_auth("refresh")) == user_key(make_auth("refresh"))
+    assert user_key(make_auth("refresh")) != user_key(make_auth("other"))
+
+
+def test_rate_limiter_pickle():
+    limiter = RateLimiter(quotas={("drive", "query"): (5, 1)})
+    limiter.acquire("drive", "user", "query")
+    unpickled = pickle.loads(pickle.dumps(limiter))
+    assert unpickled.quotas == limiter.quotas
+    assert pickle.loads(pickle.dumps(get_rate_limiter())) is get_rate_limiter()
+
+
+def test_services_acquire_rate_limiter_before_execute():
+    limiter = RateLimiter(quotas={("drive", "query"): (10, 1), ("sheets", "read"): (10, 1)})
+    with StubGoogleApi() as stub:
+        stub.add_file("id", "name")
+        auth = make_auth("refresh")
+        drive = Drive(auth, api_endpoint=stub.drive_endpoint, rate_limiter=limiter)
+        start = time.monotonic()
+        for _ in range(15):
+            assert drive.get_name("id") == "name"
+
+        assert time.monotonic() - start >= 0.45
+
+    assert Sheets(auth, rate_limiter=limiter).rate_limiter is limiter
+
+
+def test_get_rate_limiter_creates_one_limiter_across_threads(monkeypatch):
+    monkeypatch.setattr(ratelimit, "_DEFAULT_LIMITER", None)
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        limiters = list(executor.map(lambda _: get_rate_limiter(), range(64)))
+    assert all(limiter is limiters[0] for limiter in limiters)
+
+
+class RecordingRateLimiter(RateLimiter):
+    def __init__(self):
+        super().__init__()
+        self.operations = []
+
+    def acquire(self, service: str, user: str, operation: str, cost: float = 1):
+        self.operations.append(operation)
+        super().acquire(service, user, operation, cost)
+
+
+def test_drive_charges_media_chunks_to_separate_operation(tmpdir):
+    limiter = RecordingRateLimiter()
+    with StubGoogleApi() as stub:
+        stub.add_file("id", "name", b"x" * 1000)
+        drive = Drive(make_auth("refresh"), api_endpoint=stub.drive_endpoint, rate_limiter=limiter)
+        drive.download_parallel("id", tmpdir.join("file.bin"), chunk_size=100)
+    assert limiter.operations == ["query"] + ["media"] * 10
+    assert limiter.get_bucket("drive", user_key(make_auth("refresh")), "media") is None  # not limited by default.
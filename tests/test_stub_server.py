@@ -0,0 +1,662 @@
+import io
+import json
+import os
+import time
+from datetime import timedelta
+
+import pandas as pd
+import pytest
+from google.oauth2.credentials import Credentials
+from googleapiclient.errors import HttpError
+
+import pysuite.drive
+from pysuite import query
+from pysuite.auth import Authentication, _utcnow
+from pysuite.cache import MetadataCache
+from pysuite.drive import Drive, _StreamUpload
+from pysuite.hashcache import HashCache
+from pysuite.journal import UploadJournal
+from pysuite.sheets import Sheets
+from tests.stub_server import StubGoogleApi, _parse_query
+
+
+@pytest.fixture()
+def stub():
+    with StubGoogleApi() as stub:
+        yield stub
+
+
+@pytest.fixture()
+def auth():
+    return Authentication(credential=Credentials(token="token", expiry=_utcnow() + timedelta(hours=1)))
+
+
+@pytest.fixture()
+def drive(stub, auth):
+    return Drive(auth, api_endpoint=stub.drive_endpoint)
+
+
+@pytest.fixture()
+def sheets(stub, auth):
+    return Sheets(auth, api_endpoint=stub.sheets_endpoint)
+
+
+def test_drive_list_pages_through_folder(stub, drive):
+    stub.add_folder("folder", "folder")
+    for i in range(2500):
+        stub.add_file(f"file_{i:04}", f"name_{i}", parents=("folder",))
+    stub.add_file("other", "other")
+
+    result = drive.list("folder")
+    assert [file["id"] for file in result] == [f"file_{i:04}" for i in range(2500)]
+    assert result[0] == {"id": "file_0000", "name": "name_0", "parents": ["folder"]}
+    assert stub.request_count == 3
+
+
+@pytest.mark.parametrize("prefetch", [True, False])
+def test_drive_iter_list_yields_pages_lazily(stub, drive, prefetch):
+    stub.add_folder("folder", "folder")
+    for i in range(2500):
+        stub.add_file(f"file_{i:04}", f"name_{i}", content=b"x" * i, parents=("folder",))
+
+    files = drive.iter_list("folder", fields=["id", "size"], prefetch=prefetch)
+    assert stub.request_count == 0
+    assert next(files) == {"id": "file_0000", "size": "0"}
+    if not prefetch:
+        assert stub.request_count == 1
+    assert [file["id"] for file in files] == [f"file_{i:04}" for i in range(1, 2500)]
+    assert stub.request_count == 3
+
+
+def test_drive_iter_list_stops_early(stub, drive):
+    stub.add_folder("folder", "folder")
+    for i in range(1500):
+        stub.add_file(f"file_{i:04}", f"name_{i}", parents=("folder",))
+
+    for file in drive.iter_list("folder", prefetch=False):
+        break
+    assert stub.request_count == 1
+
+
+def test_drive_walk_descends_into_folders_only(stub, drive):
+    stub.add_folder("a", "a", parents=("root",))
+    stub.add_folder("b", "b", parents=("a",))
+    stub.add_file("c", "c.txt", parents=("b",))
+    stub.add_file("d", "d.txt", parents=("root",))
+    stub.add_folder("loop", "loop", parents=("b", "root"))  # reachable twice
+
+    result = drive.walk("root", fields=["size"])
+    assert sorted((file["depth"], file["path"]) for file in result) == [
+        (1, "a"), (1, "d.txt"), (1, "loop"), (2, "a/b"), (3, "a/b/c.txt"), (3, "a/b/loop")
+    ]
+    assert all("size" in file and "mimeType" in file for file in result)
+    # the root, the level of "a" and "loop", and the level of "b". files are never listed as parents.
+    assert stub.request_count == 3
+
+    assert [file["path"] for file in drive.walk("root", max_depth=1)] == ["a", "d.txt", "loop"]
+
+
+def test_drive_walk_batches_parents(stub, drive):
+    for i in range(120):
+        # long ids make queries exceed the max url length, so they are sent as POST requests with method override.
+        stub.add_folder(f"folder_{i:03}_{'x' * 30}", f"folder_{i:03}", parents=("root",))
+        stub.add_file(f"file_{i:03}", "file", parents=(f"folder_{i:03}_{'x' * 30}",))
+
+    result = drive.walk("root")
+    assert len(result) == 240
+    assert {file["path"] for file in result if file["depth"] == 2} == {f"folder_{i:03}/file" for i in range(120)}
+    assert stub.request_count == 4
+
+
+def test_drive_find_and_get_id_page_fully(stub, drive):
+    stub.add_folder("folder", "folder")
+    for i in range(1500):
+        stub.add_file(f"file_{i:04}", f"report {i}", parents=("folder",))
+    stub.add_file("quoted", "it's", parents=("folder",))
+    stub.add_file("trashed", "it's", parents=("folder",))["trashed"] = True
+
+    assert len(drive.find(name_contains="report", parent_id="folder")) == 1500
+    assert drive.find(name_not_contains="report", parent_id="folder") == [{"id": "quoted", "name": "it's"}]
+    assert drive.get_id("it's", parent_id="folder") == "quoted"
+    assert drive.get_id("missing", parent_id="folder") is None
+    stub.add_file("duplicate", "report 1", parents=("folder",))
+    with pytest.raises(RuntimeError):
+        drive.get_id("report 1", parent_id="folder")
+
+
+def test_drive_list_pushes_down_literal_regex(stub, drive):
+    stub.add_folder("folder", "folder")
+    for i in range(1500):
+        stub.add_file(f"file_{i:04}", f"file_{i}", parents=("folder",))
+
+    assert drive.list("folder", regex="^file_7$") == [{"id": "file_0007", "name": "file_7", "parents": ["folder"]}]
+    assert stub.request_count == 1
+    assert len(drive.list("folder", regex=r"file_7\d$")) == 10
+    assert stub.request_count == 3
+
+
+def test_drive_search_keeps_server_conditions_of_negated_queries(stub, drive):
+    stub.add_folder("folder", "folder")
+    for i in range(10):
+        stub.add_file(f"file_{i}", f"report {i}" if i % 2 else f"draft {i}", parents=("folder",))
+    for i in range(2500):
+        stub.add_file(f"other_{i:04}", f"other_{i}")
+
+    q = query.in_parents("folder") & ~(query.name_contains("draft") & query.name_matches(".*[0-4]$"))
+    assert sorted(file["id"] for file in drive.search(q, fields=["id"])) == [f"file_{i}" for i in (1, 3, 5, 6, 7, 8, 9)]
+    assert stub.request_count == 1
+
+
+def test_drive_search_applies_client_predicates(stub, drive):
+    for i in range(10):
+        stub.add_file(f"file_{i}", f"file_{i}", content=b"x" * i, parents=("folder",))
+
+    q = query.in_parents("folder") & query.where(lambda file: int(file["size"]) > 6, ("size",))
+    assert list(drive.search(q, fields=["id"])) == [{"id": "file_7"}, {"id": "file_8"}, {"id": "file_9"}]
+
+
+def test_drive_upload_update_copy_delete(stub, drive, tmpdir):
+    local = tmpdir.join("local.txt")
+    local.write_binary(b"content")
+    id = drive.upload(local, name="uploaded.txt", parent_id="root")
+    assert stub.files[id]["content"] == b"content"
+    assert drive.get_id("uploaded.txt", parent_id="root") == id
+
+    local.write_binary(b"new content")
+    drive.update(id, local)
+    assert stub.files[id]["content"] == b"new content"
+
+    copied = drive.copy(id, "copied.txt")
+    assert stub.files[copied]["content"] == b"new content"
+
+    drive.delete(id)
+    assert id not in stub.files
+
+
+def test_drive_create_folder_and_find(stub, drive):
+    folder = drive.create_folder("folder", parent_ids=["root"])
+    stub.add_file("a", "apple", parents=(folder,))
+    stub.add_file("b", "banana", parents=(folder,))
+    assert drive.find(name_contains="app", parent_id=folder) == [{"id": "a", "name": "apple"}]
+    assert [file["id"] for file in drive.find(name_not_contains="app", parent_id=folder)] == ["b"]
+
+
+def test_drive_cache_lookups_and_invalidation(stub, auth, tmpdir):
+    drive = Drive(auth, api_endpoint=stub.drive_endpoint, cache=MetadataCache())
+    stub.add_folder("folder", "folder")
+    stub.add_file("file", "file", parents=("folder",))
+
+    assert drive.get_id("file", parent_id="folder") == "file"
+    assert drive.get_id("file", parent_id="folder") == "file"
+    assert drive.get_name("file") == "file"
+    assert drive.get_name("folder") == "folder"
+    assert drive.get_name("folder") == "folder"
+    assert stub.request_count == 2
+    assert drive.cache.stats == {"hits": 3, "misses": 2, "evictions": 0, "size": 3}
+
+    local = tmpdir.join("local.txt")
+    local.write("content")
+    new_id = drive.upload(local, name="file", parent_id="folder")
+    assert drive.get_name(new_id) == "file"
+    assert stub.request_count == 4  # the resumable upload takes two requests.
+    with pytest.raises(RuntimeError):
+        drive.get_id("file", parent_id="folder")  # the name is no longer unique.
+
+    drive.delete(new_id)
+    assert drive.get_id("file", parent_id="folder") == "file"
+    drive.delete("folder")
+    count = stub.request_count
+    drive.get_id("file", parent_id="folder")
+    assert stub.request_count == count + 1  # names in the deleted folder are resolved again.
+
+
+def test_drive_delete_folder_invalidates_lookups_under_it(stub, auth):
+    drive = Drive(auth, api_endpoint=stub.drive_endpoint, cache=MetadataCache())
+    stub.add_folder("root", "My Drive")
+    stub.add_folder("folder", "folder", parents=("root",))
+    stub.add_folder("sub", "sub", parents=("folder",))
+    stub.add_file("a", "a", parents=("sub",))
+    stub.add_file("other", "other")
+    assert drive.resolve_path("folder/sub/a") == "a"
+    assert drive.get_name("a") == "a" and drive.get_name("other") == "other"
+
+    drive.delete("folder")
+    stub.files.pop("sub")
+    stub.files.pop("a")
+    assert drive.get_id("a", parent_id="sub") is None
+    assert drive.resolve_path("folder/sub/a") is None
+    count = stub.request_count
+    assert drive.get_name("other") == "other"
+    assert stub.request_count == count  # names of files outside the folder are kept.
+
+
+def test_drive_resolve_paths_batches_lookups(stub, drive):
+    stub.add_folder("root", "My Drive")
+    stub.add_folder("reports", "reports", parents=("root",))
+    stub.add_folder("2026", "2026", parents=("reports",))
+    stub.add_folder("10", "10", parents=("2026",))
+    for i in range(1000):
+        stub.add_file(f"summary_{i:03}", f"summary_{i}.csv", parents=("10",))
+    stub.add_file("quoted", "it's.csv", parents=("reports",))
+
+    paths = [f"reports/2026/10/summary_{i}.csv" for i in range(1000)]
+    resolved = drive.resolve_paths(paths + ["/reports/./it's.csv", "reports/missing/file.csv", ""])
+    assert [resolved[path] for path in paths] == [f"summary_{i:03}" for i in range(1000)]
+    assert resolved["/reports/./it's.csv"] == "quoted"
+    assert resolved["reports/missing/file.csv"] is None
+    assert resolved[""] == "root"
+    # the root id, one lookup for each folder level and 10 combined lookups of files.
+    assert stub.request_count == 14
+
+    with pytest.raises(ValueError):
+        drive.resolve_path("reports/../file.csv")
+    stub.add_file("duplicate", "summary_1.csv", parents=("10",))
+    with pytest.raises(RuntimeError):
+        drive.resolve_path("reports/2026/10/summary_1.csv")
+
+
+def test_drive_resolve_paths_reuses_cached_prefixes(stub, auth):
+    drive = Drive(auth, api_endpoint=stub.drive_endpoint, cache=MetadataCache())
+    stub.add_folder("folder", "folder")
+    stub.add_folder("sub", "sub", parents=("folder",))
+    stub.add_file("a", "a", parents=("sub",))
+    stub.add_file("b", "b", parents=("sub",))
+
+    assert drive.resolve_path("sub/a", root_id="folder") == "a"
+    assert stub.request_count == 2
+    assert drive.resolve_paths(["sub/a", "sub/b"], root_id="folder") == {"sub/a": "a", "sub/b": "b"}
+    assert stub.request_count == 3
+    assert drive.get_id("b", parent_id="sub") == "b"
+    assert stub.request_count == 3
+
+
+@pytest.mark.parametrize("memory_map", [False, True])
+def test_drive_download_parallel(stub, drive, tmpdir, memory_map):
+    content = os.urandom(1000000)
+    stub.add_file("id", "name", content)
+    to_file = tmpdir.join("file.bin")
+    drive.download_parallel("id", to_file, chunk_size=100000, workers=4, memory_map=memory_map)
+    assert to_file.read_binary() == content
+    assert stub.request_count == 11  # metadata and 10 chunks.
+    assert not tmpdir.join("file.bin.download").exists()
+
+
+def test_drive_download_parallel_resumes_after_failure(stub, drive, tmpdir):
+    content = os.urandom(1000000)
+    stub.add_file("id", "name", content)
+    to_file = tmpdir.join("file.bin")
+    download_range = drive._download_range
+
+    def fail_once(id, start, end):
+        if start == 500000:
+            raise ConnectionError("connection reset")
+        return download_range(id, start, end)
+
+    drive._download_range = fail_once
+    with pytest.raises(ConnectionError):
+        drive.download_parallel("id", to_file, chunk_size=100000, workers=1)
+    completed = json.loads(tmpdir.join("file.bin.download").read())["completed"]
+    assert 500000 not in completed and 0 in completed
+
+    drive._download_range = download_range
+    count = stub.request_count
+    drive.download_parallel("id", to_file, chunk_size=100000, workers=1)
+    assert to_file.read_binary() == content
+    assert stub.request_count - count == 1 + 10 - len(completed)  # metadata and the chunks not completed.
+
+
+def test_drive_download_parallel_stops_after_failure(stub, drive, tmpdir):
+    stub.add_file("id", "name", os.urandom(100000))
+    download_range = drive._download_range
+
+    def fail_first(id, start, end):
+        if start == 0:
+            raise ConnectionError("connection reset")
+        return download_range(id, start, end)
+
+    drive._download_range = fail_first
+    with pytest.raises(ConnectionError):
+        drive.download_parallel("id", tmpdir.join("file.bin"), chunk_size=1000, workers=2)
+    assert stub.request_count < 10  # chunks not started when the first one failed are not downloaded.
+    completed = json.loads(tmpdir.join("file.bin.download").read())["completed"]
+    assert len(completed) == stub.request_count - 1
+
+
+@pytest.mark.parametrize("memory_map", [False, True])
+def test_drive_download_parallel_saves_state_periodically(stub, drive, tmpdir, monkeypatch, memory_map):
+    content = os.urandom(1000000)
+    stub.add_file("id", "name", content)
+    saved = []
+    save_state = pysuite.drive._save_state
+
+    def record(path, state):
+        data = tmpdir.join("file.bin").read_binary()
+        saved.append(all(data[offset:offset + 1000] == content[offset:offset + 1000] for offset in state["completed"]))
+        save_state(path, state)
+
+    monkeypatch.setattr(pysuite.drive, "_save_state", record)
+    drive.download_parallel("id", tmpdir.join("file.bin"), chunk_size=1000, workers=4, memory_map=memory_map)
+    assert len(saved) < 10
+
+    monkeypatch.setattr(pysuite.drive, "DOWNLOAD_STATE_INTERVAL", 0)
+    drive.download_parallel("id", tmpdir.join("file.bin"), chunk_size=100000, workers=4, memory_map=memory_map)
+    assert len(saved) >= 10 and all(saved)  # chunks are flushed before they are recorded.
+
+
+def test_drive_download_parallel_verifies_checksum(stub, drive, tmpdir):
+    stub.add_file("id", "name", b"content")["md5Checksum"] = "0" * 32
+    with pytest.raises(RuntimeError):
+        drive.download_parallel("id", tmpdir.join("file.bin"), chunk_size=3)
+    assert not tmpdir.join("file.bin.download").exists()
+    assert not tmpdir.join("file.bin").exists()
+
+
+def test_drive_open_read_streams_ranges(stub, drive):
+    content = b"a,b\n" + b"".join(f"{i},{i * 2}\n".encode() for i in range(10000))
+    stub.add_file("id", "data.csv", content)
+    with drive.open_read("id", chunk_size=4096) as fp:
+        assert fp.read(4) == b"a,b\n"
+        fp.seek(-3, io.SEEK_END)
+        assert fp.read() == content[-3:]
+        fp.seek(0)
+        df = pd.read_csv(fp)
+    assert df.shape == (10000, 2) and df["b"].sum() == sum(range(0, 20000, 2))
+    assert b"".join(drive.iter_download("id", chunk_size=4096)) == content
+    assert b"".join(drive.iter_download("id", chunk_size=len(content) + 1)) == content
+
+
+def test_drive_open_read_reads_whole_file_in_chunks(stub, drive):
+    content = os.urandom(4 << 20)
+    stub.add_file("id", "data.bin", content)
+    with drive.open_read("id", chunk_size=1 << 20) as fp:
+        assert fp.read(10) == content[:10]
+        assert fp.read() == content[10:]
+    assert stub.request_count == 1 + 4  # metadata and 4 chunks, instead of one request per 8KB.
+
+
+@pytest.mark.parametrize("stream", [
+    lambda content: io.BytesIO(content),
+    lambda content: content,
+    lambda content: (content[i:i + 1000] for i in range(0, len(content), 1000)),
+    lambda content: iter([b"", content, b""]),
+])
+def test_drive_upload_stream(stub, drive, stream):
+    content = os.urandom(600000)
+    id = drive.upload_stream(stream(content), name="data.bin", parent_id="folder", chunk_size=256 << 10)
+    assert stub.files[id]["content"] == content
+    assert stub.files[id]["parents"] == ["folder"]
+    assert stub.request_count == 4  # the session and 3 chunks.
+
+    drive.update_stream(id, stream(content[:1000]), chunk_size=256 << 10)
+    assert stub.files[id]["content"] == content[:1000]
+
+
+def test_drive_upload_stream_of_empty_content(stub, drive):
+    id = drive.upload_stream(b"", name="empty")
+    assert stub.files[id]["content"] == b""
+
+
+def test_stream_upload_reuses_its_buffer():
+    media = _StreamUpload(io.BytesIO(b"0123456789"), "application/octet-stream", chunk_size=4)
+    first = media.getbytes(0, 4)
+    assert bytes(first) == b"0123"
+    second = media.getbytes(2, 4)  # the server received 2 bytes of the first chunk.
+    assert bytes(second) == b"2345" and second.obj is first.obj
+    assert bytes(media.getbytes(6, 4)) == b"6789" and bytes(media.getbytes(10, 4)) == b""
+    with pytest.raises(ValueError):
+        media.getbytes(0, 4)
+    with pytest.raises(TypeError):
+        media.to_json()
+
+
+class CrashingRateLimiter:
+    """Raises on the n-th request, as if the process crashed."""
+
+    def __init__(self, crash_at: int):
+        self.count = 0
+        self.crash_at = crash_at
+
+    def acquire(self, *args, **kwargs):
+        self.count += 1
+        if self.count == self.crash_at:
+            raise KeyboardInterrupt("crash")
+
+
+def test_drive_upload_resumes_from_journal(stub, auth, tmpdir):
+    content = os.urandom(1 << 20)
+    local = tmpdir.join("large.bin")
+    local.write_binary(content)
+    journal = UploadJournal(tmpdir.join("journal.json"))
+    drive = Drive(auth, api_endpoint=stub.drive_endpoint, upload_journal=journal,
+                  rate_limiter=CrashingRateLimiter(crash_at=3))
+    with pytest.raises(KeyboardInterrupt):
+        drive.upload(local, parent_id="folder", chunk_size=256 << 10)
+    assert stub.request_count == 3  # the session and two chunks.
+
+    drive = Drive(auth, api_endpoint=stub.drive_endpoint, upload_journal=journal)
+    id = drive.upload(local, parent_id="folder", chunk_size=256 << 10)
+    assert stub.files[id]["content"] == content
+    assert stub.request_count == 3 + 1 + 2  # the status query and the remaining chunks.
+    assert json.loads(tmpdir.join("journal.json").read()) == {}
+
+
+class CrashingJournal(UploadJournal):
+    """Raises when a complete upload is removed for the first time, as if the process crashed."""
+
+    crashed = False
+
+    def remove(self, key: str):
+        if not self.crashed:
+            self.crashed = True
+            raise KeyboardInterrupt("crash")
+        super().remove(key)
+
+
+def test_drive_upload_journal_handles_complete_and_changed_files(stub, auth, tmpdir):
+    stub.add_file("id", "name")
+    local = tmpdir.join("large.bin")
+    local.write_binary(os.urandom(1 << 20))
+    drive = Drive(auth, api_endpoint=stub.drive_endpoint, upload_journal=CrashingJournal(tmpdir.join("journal.json")))
+    with pytest.raises(KeyboardInterrupt):
+        drive.update("id", local, chunk_size=512 << 10)
+    # the upload was complete when the process crashed, so the server returns the file.
+    count = stub.request_count
+    drive.update("id", local, chunk_size=512 << 10)
+    assert stub.request_count - count == 1
+
+    local.write_binary(b"changed")  # the session of another content is not reused.
+    count = stub.request_count
+    drive.update("id", local)
+    assert stub.request_count - count == 2
+    assert stub.files["id"]["content"] == b"changed"
+
+
+def _write_tree(root, files: dict):
+    for path, content in files.items():
+        root.join(path).write_binary(content, ensure=True)
+
+
+def test_drive_upload_and_download_folder(stub, drive, tmpdir):
+    files = {"a.txt": b"a", "sub/b.txt": b"bb", "sub/deep/c.txt": b"ccc", "other/d.txt": b"dddd"}
+    _write_tree(tmpdir.join("reports"), files)
+    tmpdir.join("reports", "empty").ensure(dir=True)
+    reports = []
+    result = drive.upload_folder(tmpdir.join("reports"), parent_id="root", workers=3, progress=reports.append)
+
+    assert result["errors"] == {} and set(result["uploaded"]) == set(files)
+    assert (result["files"], result["bytes"], result["total_files"], result["total_bytes"]) == (4, 10, 4, 10)
+    assert [report["files"] for report in reports] == [1, 2, 3, 4]
+    assert stub.files[result["id"]]["name"] == "reports" and stub.files[result["id"]]["parents"] == ["root"]
+    for path, id in result["uploaded"].items():
+        assert stub.files[id]["content"] == files[path]
+    walked = {file["path"]: file for file in drive.walk(result["id"])}
+    assert set(walked) == set(files) | {"sub", "sub/deep", "other", "empty"}
+    assert stub.files[result["uploaded"]["sub/deep/c.txt"]]["parents"] == [walked["sub/deep"]["id"]]
+
+    reports.clear()
+    result = drive.download_folder(result["id"], tmpdir.join("copy"), workers=3, progress=reports.append)
+    assert result["errors"] == {} and result["skipped"] == [] and set(result["downloaded"]) == set(files)
+    assert (result["files"], result["bytes"]) == (4, 10) and len(reports) == 4
+    for path, content in files.items():
+        assert tmpdir.join("copy", path).read_binary() == content
+    assert tmpdir.join("copy", "empty").isdir()
+
+
+def test_drive_folder_transfer_continues_after_failures(stub, drive, tmpdir):
+    _write_tree(tmpdir.join("local"), {"bad.txt": b"x", "good.txt": b"y", "broken/inside.txt": b"z", "ok/e.txt": b"e"})
+    upload, create_folder = drive.upload, drive.create_folder
+    drive.upload = lambda from_file, **kwargs: upload(from_file, **kwargs) if "bad" not in str(from_file) else 1 / 0
+    drive.create_folder = lambda name, parent_ids=None: create_folder(name, parent_ids) if name != "broken" else 1 / 0
+    result = drive.upload_folder(tmpdir.join("local"))
+    assert set(result["uploaded"]) == {"good.txt", "ok/e.txt"}
+    assert set(result["errors"]) == {"bad.txt", "broken", "broken/inside.txt"}
+    assert isinstance(result["errors"]["broken/inside.txt"], ZeroDivisionError)
+    assert (result["files"], result["failed"], result["total_files"]) == (2, 2, 4)
+
+    stub.add_folder("folder", "folder")
+    stub.add_file("doc", "doc", parents=("folder",), mime_type="application/vnd.google-apps.document")
+    del stub.files["doc"]["size"]
+    stub.add_file("fine", "fine.txt", b"fine", parents=("folder",))
+    stub.add_file("fail", "fail.txt", b"fail", parents=("folder",))
+    stub.add_file("dots", "..", b"escape", parents=("folder",))
+    download = drive.download
+    drive.download = lambda id, to_file: download(id, to_file) if id != "fail" else 1 / 0
+    result = drive.download_folder("folder", tmpdir.join("copy"))
+    assert result["downloaded"] == {"fine.txt": "fine"} and set(result["errors"]) == {"fail.txt"}
+    assert sorted(result["skipped"]) == ["..", "doc"]
+    assert tmpdir.join("copy", "fine.txt").read_binary() == b"fine" and not tmpdir.join("copy", "fail.txt").exists()
+
+
+def _age(root, age: float = 60):
+    for path in root.visit(lambda path: path.isfile()):
+        os.utime(str(path), (time.time() - age, time.time() - age))
+
+
+def test_drive_sync_upload(stub, drive, tmpdir):
+    _write_tree(tmpdir.join("local"), {"same.txt": b"same", "size.txt": b"new size", "content.txt": b"new!",
+                                       "new.txt": b"new", "sub/deep/file.txt": b"deep"})
+    _age(tmpdir.join("local"))
+    stub.add_folder("folder", "folder")
+    stub.add_file("same", "same.txt", b"same", parents=("folder",))
+    stub.add_file("size", "size.txt", b"old", parents=("folder",))
+    stub.add_file("content", "content.txt", b"old!", parents=("folder",))
+    stub.add_file("extra", "extra.txt", b"extra", parents=("folder",))
+    stub.add_folder("old", "old", parents=("folder",))
+    stub.add_file("old_file", "file.txt", b"old", parents=("old",))
+    stub.add_file("doc", "doc", parents=("folder",), mime_type="application/vnd.google-apps.document")
+    del stub.files["doc"]["size"]
+
+    hashes = HashCache()
+    plan = drive.sync(tmpdir.join("local"), "folder", delete=True, dry_run=True, hash_cache=hashes)
+    assert plan == {"create": ["new.txt", "sub/deep/file.txt"], "update": ["content.txt", "size.txt"],
+                    "delete": ["extra.txt", "old"], "folders": ["sub", "sub/deep"], "unchanged": ["same.txt"],
+                    "conflicts": []}
+    assert hashes.stats == {"hits": 0, "misses": 2}  # files of different sizes are not hashed.
+    assert stub.files["size"]["content"] == b"old" and "extra" in stub.files
+
+    result = drive.sync(tmpdir.join("local"), "folder", delete=True, hash_cache=hashes)
+    assert result["errors"] == {} and (result["files"], result["bytes"]) == (4, 19)
+    assert stub.files["size"]["content"] == b"new size" and stub.files["content"]["content"] == b"new!"
+    assert "extra" not in stub.files and "old" not in stub.files and "doc" in stub.files
+    walked = {file["path"]: file for file in drive.walk("folder", fields=["md5Checksum"])}
+    assert stub.files[walked["sub/deep/file.txt"]["id"]]["content"] == b"deep"
+
+    count = stub.request_count
+    plan = drive.sync(tmpdir.join("local"), "folder", delete=True, hash_cache=hashes)
+    assert plan["unchanged"] == ["content.txt", "new.txt", "same.txt", "size.txt", "sub/deep/file.txt"]
+    assert plan["create"] == plan["update"] == plan["delete"] == plan["folders"] == [] and plan["files"] == 0
+    assert stub.request_count - count == 3  # one listing of each level of the tree.
+    assert hashes.stats["misses"] == 5
+
+
+def test_drive_sync_download(stub, drive, tmpdir):
+    stub.add_folder("folder", "folder")
+    stub.add_file("same", "same.txt", b"same", parents=("folder",))
+    stub.add_file("changed", "changed.txt", b"new!", parents=("folder",))
+    stub.add_file("no_md5", "no_md5.txt", b"abc", parents=("folder",))
+    del stub.files["no_md5"]["md5Checksum"]
+    stub.add_folder("sub", "sub", parents=("folder",))
+    stub.add_file("fail", "fail.txt", b"remote", parents=("sub",))
+    _write_tree(tmpdir.join("local"), {"same.txt": b"same", "changed.txt": b"old!", "no_md5.txt": b"xyz",
+                                       "sub/fail.txt": b"local", "extra.txt": b"extra", "old/file.txt": b"old"})
+    _age(tmpdir.join("local"))
+
+    download = drive.download
+    drive.download = lambda id, to_file: download(id, to_file) if id != "fail" else 1 / 0
+    result = drive.sync(tmpdir.join("local"), "folder", direction="download", delete=True)
+    assert (result["create"], result["update"], result["delete"]) == ([], ["changed.txt", "no_md5.txt", "sub/fail.txt"],
+                                                                      ["extra.txt", "old"])
+    assert set(result["errors"]) == {"sub/fail.txt"} and (result["files"], result["failed"]) == (2, 1)
+    assert tmpdir.join("local", "changed.txt").read_binary() == b"new!"
+    assert tmpdir.join("local", "no_md5.txt").read_binary() == b"abc"  # the google drive file is modified later.
+    assert tmpdir.join("local", "sub", "fail.txt").read_binary() == b"local"
+    assert not tmpdir.join("local", "extra.txt").exists() and not tmpdir.join("local", "old").exists()
+    assert sorted(os.listdir(str(tmpdir.join("local", "sub")))) == ["fail.txt"]
+
+    with pytest.raises(ValueError):
+        drive.sync(tmpdir.join("local"), "folder", direction="both")
+
+
+@pytest.mark.parametrize("direction", ["upload", "download"])
+def test_drive_sync_reports_file_and_folder_conflicts(stub, drive, tmpdir, direction):
+    _write_tree(tmpdir.join("local"), {"a": b"file", "b/file.txt": b"local", "c.txt": b"c"})
+    _age(tmpdir.join("local"))
+    stub.add_folder("folder", "folder")
+    stub.add_folder("a", "a", parents=("folder",))
+    stub.add_file("a_file", "file.txt", b"remote", parents=("a",))
+    stub.add_file("b", "b", b"file", parents=("folder",))
+    stub.add_file("c", "c.txt", b"c", parents=("folder",))
+
+    result = drive.sync(tmpdir.join("local"), "folder", direction=direction, delete=True)
+    assert result["conflicts"] == ["a", "b"]
+    assert result["create"] == result["update"] == result["delete"] == result["folders"] == []
+    assert sorted(result["errors"]) == ["a", "b"] and isinstance(result["errors"]["a"], FileExistsError)
+    assert tmpdir.join("local", "a").read_binary() == b"file"
+    assert tmpdir.join("local", "b", "file.txt").read_binary() == b"local"
+    assert {"a", "a_file", "b", "c"} <= set(stub.files)
+    assert len(drive.list("folder")) == 3
+
+
+def test_drive_download_range(stub):
+    stub.add_file("id", "name", b"0123456789")
+    assert stub.handle("GET", "/drive/v3/files/id", {"alt": "media"}, b"", {"range": "bytes=2-4"})[2] == b"234"
+
+
+def test_parse_query():
+    file = {"name": "it's", "parents": ["a"], "trashed": False, "mimeType": "text/plain"}
+    assert _parse_query(r"name = 'it\'s' and trashed = false")(file)
+    assert _parse_query("('b' in parents or 'a' in parents) and not mimeType = 'folder'")(file)
+    assert not _parse_query("'b' in parents")(file)
+
+
+def test_sheets_round_trip(stub, sheets):
+    id = sheets.create_spreadsheet("spreadsheet")
+    tab = sheets.create_tab(id, "tab")
+    assert tab["title"] == "tab"
+
+    df = pd.DataFrame({"a": ["1", "2"], "b": ["x", None]})
+    sheets.write_sheet(df, id, "tab!A1:B")
+    assert stub.get_values(id, "tab") == [["a", "b"], ["1", "x"], ["2"]]
+    assert sheets.download(id, "tab!A1:B", fill_row=True) == [["a", "b"], ["1", "x"], ["2", ""]]
+    assert sheets.download(id, "tab!A2:B", dimension="COLUMNS") == [["1", "2"], ["x"]]
+    pd.testing.assert_frame_equal(sheets.read_sheet(id, "tab!A1:B"), df.fillna(""))
+
+    sheets.clear(id, "tab!A2:A")
+    assert stub.get_values(id, "tab") == [["a", "b"], ["", "x"]]
+
+    sheets.rename_tab(id, tab["sheetId"], "renamed")
+    sheets.delete_tab(id, 0)
+    assert [sheet["title"] for sheet in stub.spreadsheets[id]["sheets"]] == ["renamed"]
+
+
+def test_stub_injects_quota_errors(auth):
+    with StubGoogleApi(quota=2) as stub:
+        stub.add_file("id", "name")
+        drive = Drive(auth, api_endpoint=stub.drive_endpoint)
+        drive.get_name("id")
+        drive.get_name("id")
+        with pytest.raises(HttpError) as error:
+            drive.get_name("id")
+
+    assert error.value.resp.status == 429
+    assert stub.throttled_count == 1
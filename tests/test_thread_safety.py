@@ -0,0 +1,50 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+from google.oauth2.credentials import Credentials
+
+from pysuite.auth import Authentication, _utcnow
+from pysuite.drive import Drive
+from tests.stub_server import StubGoogleApi
+
+FILE_COUNT = 50
+
+
+@pytest.fixture(scope="module")
+def stub():
+    with StubGoogleApi() as stub:
+        for i in range(FILE_COUNT):
+            stub.add_file(f"id_{i}", f"name_{i}", content=f"content of file {i}\n".encode()*100)
+        yield stub
+
+
+@pytest.fixture()
+def shared_drive(stub):
+    credential = Credentials(token="token", expiry=_utcnow() + timedelta(hours=1))
+    auth = Authentication(credential=credential, connections_per_host=8)
+    return Drive(auth, api_endpoint=stub.drive_endpoint)
+
+
+def test_shared_drive_get_name_from_many_threads(shared_drive):
+    ids = [f"id_{i % FILE_COUNT}" for i in range(500)]
+    with ThreadPoolExecutor(max_workers=64) as executor:
+        result = list(executor.map(shared_drive.get_name, ids))
+
+    assert result == [f"name_{i % FILE_COUNT}" for i in range(500)]
+    stats = shared_drive._auth.transport.stats
+    assert stats["requests"] == 500
+    assert stats["new_connections"] <= 8
+
+
+def test_shared_drive_download_from_many_threads(shared_drive, tmpdir):
+    def download(i: int) -> bytes:
+        to_file = Path(tmpdir.join(f"download_{i}"))
+        shared_drive.download(id=f"id_{i % FILE_COUNT}", to_file=to_file)
+        return to_file.read_bytes()
+
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        result = list(executor.map(download, range(200)))
+
+    assert result == [f"content of file {i % FILE_COUNT}\n".encode()*100 for i in range(200)]
@@ -0,0 +1,63 @@
+import multiprocessing
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from google.oauth2.credentials import Credentials
+
+from pysuite.auth import Authentication, _utcnow
+from pysuite.token_cache import TokenCache
+
+
+class LoggingCredentials(Credentials):
+    """Credentials whose refresh appends a line to `log_file` instead of calling the token endpoint."""
+
+    log_file = None
+
+    def refresh(self, request):
+        time.sleep(0.2)
+        with open(self.log_file, "a") as fp:
+            fp.write("refresh\n")
+        self.token = "refreshed_token"
+        self.expiry = _utcnow() + timedelta(hours=1)
+
+
+def test_token_cache_save_and_load_correctly(tmpdir):
+    cache = TokenCache(Path(tmpdir.join("cache.json")))
+    expiry = datetime(2030, 1, 2, 3, 4, 5)
+    cache.save("token", expiry, refresh_token="refresh_token")
+    assert cache.load(refresh_token="refresh_token") == ("token", expiry)
+    assert cache.load(refresh_token="other_refresh_token") is None
+
+
+def test_token_cache_load_return_none_when_missing(tmpdir):
+    assert TokenCache(Path(tmpdir.join("missing.json"))).load() is None
+
+
+def test_token_cache_for_credential_file_place_cache_next_to_credential(tmpdir):
+    result = TokenCache.for_credential_file(Path(tmpdir.join("credential.json")))
+    assert result.path == Path(tmpdir.join("credential.json.token_cache"))
+
+
+def test_authentication_token_cache_true_require_credential_file():
+    with pytest.raises(ValueError):
+        Authentication(credential={"token": "token"}, token_cache=True)
+
+
+def _authenticate(cache_path: str, log_file: str) -> str:
+    LoggingCredentials.log_file = log_file
+    credential = LoggingCredentials(token=None, refresh_token="refresh_token")
+    return Authentication(credential=credential, token_cache=cache_path).credential.token
+
+
+def test_authentication_token_cache_refresh_once_across_processes(tmpdir):
+    cache_path = str(tmpdir.join("cache.json"))
+    log_file = str(tmpdir.join("refresh.log"))
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(8) as pool:
+        results = pool.starmap(_authenticate, [(cache_path, log_file)]*8)
+
+    assert results == ["refreshed_token"]*8
+    with open(log_file) as fp:
+        assert fp.readlines() == ["refresh\n"]
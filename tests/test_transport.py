@@ -0,0 +1,67 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import pytest
+
+from pysuite.transport import PooledHttp
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        time.sleep(0.01)
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture(scope="module")
+def server_url():
+    server = ThreadingServer(("127.0.0.1", 0), KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+def test_pooled_http_reuse_connection_for_sequential_requests(server_url):
+    http = PooledHttp()
+    for _ in range(3):
+        response, content = http.request(server_url)
+        assert response.status == 200
+        assert content == b"ok"
+
+    assert http.stats == {"requests": 3, "new_connections": 1, "reused_connections": 2}
+    http.close()
+
+
+def test_pooled_http_limit_concurrent_connections_per_host(server_url):
+    http = PooledHttp(connections_per_host=2)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: http.request(server_url)[1], range(40)))
+
+    assert results == [b"ok"]*40
+    stats = http.stats
+    assert stats["requests"] == 40
+    assert stats["new_connections"] <= 2
+    assert stats["reused_connections"] == 40 - stats["new_connections"]
+    http.close()
+
+
+def test_pooled_http_raise_error_with_non_positive_connections():
+    with pytest.raises(ValueError):
+        PooledHttp(connections_per_host=0)
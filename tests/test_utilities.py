@@ -1,8 +1,15 @@
+import copy
+import os
+import pickle
+import stat
+
+import httplib2
 import pytest
 
 from googleapiclient.errors import HttpError
 
-from pysuite.utilities import retry_on_out_of_quota, MAX_RETRY_ATTRIBUTE, SLEEP_ATTRIBUTE
+from pysuite.utilities import retry_on_out_of_quota, retry_on_type_and_msg, get_retry_policy, RetryPolicy, \
+    MAX_RETRY_ATTRIBUTE, SLEEP_ATTRIBUTE, atomic_write
 
 
 class DummyClass:
@@ -68,3 +75,190 @@ def test_retry_on_out_of_quota_mismatch_error_raise_error_correctly():
         test_class.foo("mismatching error msg")
 
     assert len(record) == 0
+
+
+def make_http_error(status: int, headers: dict = None) -> HttpError:
+    resp = httplib2.Response(dict({"status": status}, **(headers or {})))
+    resp.reason = "dummy reason"
+    return HttpError(resp, b'{"error": {"message": "dummy"}}')
+
+
+class FailingCall:
+
+    def __init__(self, errors: list):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "done"
+
+
+@pytest.mark.parametrize("error",
+                         [
+                             make_http_error(429),
+                             make_http_error(500),
+                             make_http_error(503),
+                             ConnectionResetError("connection reset by peer"),
+                         ])
+def test_retry_policy_retry_transient_errors(error):
+    policy = RetryPolicy(max_retry=2, sleep=0.01)
+    func = FailingCall([error])
+
+    with pytest.warns(UserWarning):
+        result = policy.call(func)
+
+    assert result == "done"
+    assert policy.stats["retries"] == 1
+
+
+@pytest.mark.parametrize("error", [make_http_error(404), make_http_error(403), ValueError("bad value")])
+def test_retry_policy_not_retry_permanent_errors(error):
+    policy = RetryPolicy(max_retry=2, sleep=0.01)
+    func = FailingCall([error])
+
+    with pytest.raises(type(error)):
+        policy.call(func)
+
+    assert func.calls == 1
+    assert policy.stats == {"calls": 1, "retries": 0, "failures": 1, "sleep_seconds": 0.0}
+
+
+def test_retry_policy_jitter_within_range():
+    policy = RetryPolicy(sleep=1, multiplier=2, jitter=0.5)
+    delays = [policy.get_delay(3) for _ in range(100)]
+    assert all(2 <= delay <= 4 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_retry_policy_cap_delay_with_max_sleep():
+    policy = RetryPolicy(sleep=1, multiplier=10, jitter=0, max_sleep=5)
+    assert policy.get_delay(4) == 5
+
+
+@pytest.mark.parametrize("retry_after", ["7", "Wed, 21 Oct 2099 07:28:00 GMT"])
+def test_retry_policy_respect_retry_after(retry_after):
+    policy = RetryPolicy(sleep=0.01, jitter=0)
+    assert policy.get_delay(1, make_http_error(429, {"retry-after": retry_after})) >= 7
+
+
+def test_retry_policy_stop_at_max_elapsed():
+    policy = RetryPolicy(max_retry=10, sleep=1, jitter=0, max_elapsed=0.5)
+    func = FailingCall([make_http_error(503)]*3)
+
+    with pytest.raises(HttpError):
+        policy.call(func)
+
+    assert func.calls == 1
+
+
+def test_retry_policy_pickle_without_stats():
+    policy = RetryPolicy(max_retry=3, sleep=0.01)
+    with pytest.warns(UserWarning):
+        policy.call(FailingCall([make_http_error(503)]))
+
+    result = pickle.loads(pickle.dumps(policy))
+    assert result.max_retry == 3
+    assert result.stats["calls"] == 0
+
+
+class PolicyClass:
+
+    def __init__(self, fail_times: int, retry_policy: RetryPolicy):
+        self.fail_times = fail_times
+        self.retry_policy = retry_policy
+
+    @retry_on_out_of_quota()
+    def foo(self):
+        while self.fail_times > 0:
+            self.fail_times -= 1
+            raise make_http_error(503)
+
+    @retry_on_type_and_msg(KeyError, msg_pattern=".*retry me.*")
+    def bar(self, msg: str):
+        while self.fail_times > 0:
+            self.fail_times -= 1
+            raise KeyError(msg)
+
+
+def test_retry_on_out_of_quota_use_retry_policy_attribute():
+    test_class = PolicyClass(fail_times=2, retry_policy=RetryPolicy(max_retry=2, sleep=0.01))
+
+    with pytest.warns(UserWarning):
+        test_class.foo()
+
+    assert test_class.retry_policy.stats["retries"] == 2
+
+
+def test_retry_on_type_and_msg_only_retry_matching_message():
+    test_class = PolicyClass(fail_times=1, retry_policy=RetryPolicy(max_retry=2, sleep=0.01))
+
+    with pytest.warns(UserWarning):
+        test_class.bar("please retry me")
+
+    test_class.fail_times = 1
+    with pytest.raises(KeyError):
+        test_class.bar("do not retry")
+
+
+def test_retry_on_out_of_quota_follow_changed_max_retry():
+    test_class = DummyClass(fail_times=2, max_retry=0, sleep=0.01)
+    with pytest.raises(HttpError):
+        test_class.foo("User Rate Limit Exceeded")
+
+    test_class.fail_times = 2
+    setattr(test_class, MAX_RETRY_ATTRIBUTE, 2)
+    with pytest.warns(UserWarning) as record:
+        test_class.foo("User Rate Limit Exceeded")
+    assert len(record) == 2
+    assert get_retry_policy(test_class) is get_retry_policy(test_class)
+    assert get_retry_policy(test_class).stats["retries"] == 2
+
+
+class CreatingClass:
+
+    def __init__(self, errors: list):
+        self.create = FailingCall(errors)
+        self.retry_policy = RetryPolicy(max_retry=2, sleep=0.01)
+
+    @retry_on_out_of_quota(idempotent=False)
+    def create_file(self):
+        return self.create()
+
+
+@pytest.mark.parametrize("error", [make_http_error(500), make_http_error(503), ConnectionResetError("reset")])
+def test_retry_on_out_of_quota_not_retry_non_idempotent_call_on_transient_errors(error):
+    test_class = CreatingClass([error])
+    with pytest.raises(type(error)):
+        test_class.create_file()
+    assert test_class.create.calls == 1
+
+
+def test_retry_on_out_of_quota_retry_non_idempotent_call_on_quota_errors():
+    test_class = CreatingClass([make_http_error(429)])
+    with pytest.warns(UserWarning):
+        assert test_class.create_file() == "done"
+    assert test_class.retry_policy.stats["retries"] == 1
+
+
+def test_retry_policy_copy_has_own_stats():
+    policy = RetryPolicy(max_retry=2, sleep=0.01)
+    with pytest.warns(UserWarning):
+        policy.call(FailingCall([make_http_error(503)]))
+
+    copied = copy.copy(policy)
+    copied.call(FailingCall([]))
+    assert copied.stats["calls"] == 2 and policy.stats["calls"] == 1
+    assert copied._lock is not policy._lock
+
+
+def test_atomic_write_replace_file_with_owner_only_permission(tmpdir):
+    path = tmpdir.join("state.json")
+    path.write("old")
+    atomic_write(path, "new")
+    atomic_write(tmpdir.join("data.bin"), b"\x00\x01")
+    assert path.read() == "new" and tmpdir.join("data.bin").read_binary() == b"\x00\x01"
+    assert stat.S_IMODE(os.stat(str(path)).st_mode) == 0o600
+    assert sorted(os.listdir(str(tmpdir))) == ["data.bin", "state.json"]